@@ -0,0 +1,75 @@
+"""
+Benchmark for the local knowledge index
+Measures index build time and query latency on a synthetic corpus.
+
+Usage:
+    python benchmarks/bench_knowledge.py --docs 10000 --queries 1000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add repository root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_providers.knowledge import Document, KnowledgeIndex
+
+
+def make_corpus(n_docs: int, vocab_size: int, doc_words: int, seed: int = 42):
+    """Generate documents drawn from a Zipf-like vocabulary."""
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(vocab_size)]
+    weights = [1.0 / (rank + 1) for rank in range(vocab_size)]
+    return [
+        Document(id=str(i), text=" ".join(rng.choices(vocab, weights, k=doc_words)))
+        for i in range(n_docs)
+    ], vocab, weights
+
+
+def percentile(values, fraction):
+    """Percentile of a list of numbers."""
+    values = sorted(values)
+    return values[int(fraction * (len(values) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the knowledge index")
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--vocab", type=int, default=20000)
+    parser.add_argument("--doc-words", type=int, default=80)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+    
+    documents, vocab, weights = make_corpus(args.docs, args.vocab, args.doc_words)
+    rng = random.Random(7)
+    queries = [" ".join(rng.choices(vocab, weights, k=rng.randint(2, 8))) for _ in range(args.queries)]
+    
+    index = KnowledgeIndex()
+    started = time.perf_counter()
+    index.add_documents(documents)
+    ingest_ms = (time.perf_counter() - started) * 1000
+    
+    started = time.perf_counter()
+    index.bm25_scores("warm up")  # Freezes postings into NumPy arrays
+    freeze_ms = (time.perf_counter() - started) * 1000
+    
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, k=args.top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    
+    print(f"Documents:        {args.docs} ({args.doc_words} words each, vocabulary {args.vocab})")
+    print(f"Ingest:           {ingest_ms:.1f} ms")
+    print(f"Freeze to arrays: {freeze_ms:.1f} ms")
+    print(f"Query latency:    p50 {percentile(latencies, 0.5):.3f} ms, "
+          f"p95 {percentile(latencies, 0.95):.3f} ms, "
+          f"max {max(latencies):.3f} ms over {len(latencies)} queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmark for chat request parsing and response encoding
+Compares the previous path (untyped history checked by validate_messages,
+standard-library JSON, uncompressed) with the current one (typed history
+validated once, orjson, gzip/Brotli) in bytes and CPU time per request.
+
+Usage:
+    python benchmarks/bench_serialization.py --history 0,10,50 --iterations 2000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from typing import List, Literal
+
+# Add repository root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
+from typing_extensions import TypedDict
+
+from llm_providers.base import BaseLLMProvider, ValidatedMessages
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class LegacyChatRequest(BaseModel):
+    """ChatRequest as it was: history is an untyped list"""
+    message: str
+    conversation_history: list = []
+    priority: Literal["interactive", "batch"] = "interactive"
+
+
+class ChatMessage(TypedDict):
+    role: Literal["system", "user", "assistant"]
+    content: str
+
+
+class ChatRequest(BaseModel):
+    message: str
+    conversation_history: List[ChatMessage] = []
+    priority: Literal["interactive", "batch"] = "interactive"
+
+
+class ChatResponse(BaseModel):
+    reply: str
+    success: bool
+    error: str = None
+
+
+class _Checker(BaseLLMProvider):
+    """Provider stub exposing the base validate_messages()"""
+    
+    def generate_response(self, messages, max_tokens=None, temperature=None, **kwargs):
+        return ""
+    
+    def get_provider_name(self):
+        return "Checker"
+    
+    def is_available(self):
+        return True
+
+
+def make_body(turns: int) -> bytes:
+    """Request body with a history of the given number of messages."""
+    history = [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message {i}: " + "could you tell me more about your pricing and support plans? " * 3
+        }
+        for i in range(turns)
+    ]
+    return json.dumps({"message": "And what about enterprise plans?", "conversation_history": history}).encode()
+
+
+def legacy_request(body: bytes, checker: _Checker) -> list:
+    """Parse as before: untyped list, checked again by the provider."""
+    request = LegacyChatRequest.model_validate(json.loads(body))
+    messages = [{"role": "system", "content": "prompt"}] + list(request.conversation_history)
+    messages.append({"role": "user", "content": request.message})
+    checker.validate_messages(messages)
+    return messages
+
+
+def typed_request(body: bytes, checker: _Checker) -> list:
+    """Parse as now: typed history validated once at the edge."""
+    request = ChatRequest.model_validate(json.loads(body))
+    messages = [{"role": "system", "content": "prompt"}]
+    messages.extend(request.conversation_history)
+    messages.append({"role": "user", "content": request.message})
+    messages = ValidatedMessages(messages)
+    checker.validate_messages(messages)
+    return messages
+
+
+def cpu_us(func, iterations: int) -> float:
+    """CPU microseconds per call."""
+    started = time.process_time()
+    for _ in range(iterations):
+        func()
+    return (time.process_time() - started) / iterations * 1e6
+
+
+def compressed_sizes(data: bytes) -> str:
+    """Raw, gzip and (if available) Brotli sizes of a payload."""
+    sizes = f"{len(data)} B raw, {len(gzip.compress(data, compresslevel=6))} B gzip"
+    if brotli:
+        sizes += f", {len(brotli.compress(data, quality=4))} B br"
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat request parsing and response encoding")
+    parser.add_argument("--history", default="0,10,50", help="Comma-separated history lengths")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--reply-chars", type=int, default=1200)
+    args = parser.parse_args()
+    
+    checker = _Checker("key", "model")
+    
+    print("Request parsing (CPU per request):")
+    for turns in [int(t) for t in args.history.split(",")]:
+        body = make_body(turns)
+        before = cpu_us(lambda: legacy_request(body, checker), args.iterations)
+        after = cpu_us(lambda: typed_request(body, checker), args.iterations)
+        print(f"  history {turns:>3}: {len(body):>6} B body   before {before:8.1f} us   after {after:8.1f} us")
+    
+    reply = ChatResponse(reply=("We offer three plans. " * 200)[:args.reply_chars], success=True)
+    before = cpu_us(lambda: JSONResponse(jsonable_encoder(reply)).body, args.iterations)
+    after = cpu_us(lambda: ORJSONResponse(jsonable_encoder(reply)).body, args.iterations)
+    body = ORJSONResponse(jsonable_encoder(reply)).body
+    print("\nResponse encoding (CPU per response):")
+    print(f"  ChatResponse:  before {before:8.1f} us   after {after:8.1f} us")
+    print(f"  Size:          {compressed_sizes(body)}"
+          + ("" if brotli else " (install brotli for br sizes)"))
+    
+    metrics = {
+        "overall": {"total_requests": 10000, "average_latency_ms": 812.4, "p95_latency_ms": 1710.2},
+        "tenants": {
+            f"tenant-{i}": {"latency": {"total_requests": i * 10, "average_latency_ms": 800.0 + i},
+                            "limits": {"requests": i * 11, "rate_limited": i, "in_flight": 0}}
+            for i in range(50)
+        }
+    }
+    before = cpu_us(lambda: JSONResponse(metrics).body, args.iterations)
+    after = cpu_us(lambda: ORJSONResponse(metrics).body, args.iterations)
+    print(f"  /api/metrics:  before {before:8.1f} us   after {after:8.1f} us")
+    print(f"  Size:          {compressed_sizes(ORJSONResponse(metrics).body)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+"""
+Offline benchmark suite for the serving path
+Times request parsing, prompt assembly, message validation, monitoring and
+full /api/chat round-trips against a fake provider, stores the results as
+JSON and compares them with a baseline so regressions fail the run.
+
+Usage:
+    python benchmarks/run.py --save-baseline              # record a baseline
+    python benchmarks/run.py                              # compare against it
+    python benchmarks/run.py --filter api_chat --threshold 0.15
+    python benchmarks/run.py --case-threshold api_chat_roundtrip=0.5
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Add repository root (and this directory, for the standalone benchmarks) to path
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Offline, quiet and deterministic: no provider keys, ledger, cache, scheduler
+# queueing limits or startup side effects beyond building the app
+for name in ("OPENAI_API_KEY", "GROQ_API_KEY", "WATSONX_API_KEY", "LEDGER_PATH", "TENANTS_FILE", "KNOWLEDGE_PATH", "SHADOW_PROVIDER"):
+    os.environ[name] = ""
+os.environ["CACHE_ENABLED"] = "false"
+os.environ["HEALTH_PROBE_INTERVAL"] = "0"
+os.environ["HEARTBEAT_INTERVAL"] = "0"
+logging.disable(logging.WARNING)
+
+
+@dataclass
+class Case:
+    """A benchmark: setup() returns the function to time (sync or async)"""
+    name: str
+    setup: Callable[[], Callable]
+    description: str = ""
+
+
+CASES: List[Case] = []
+
+
+def case(name: str, description: str = ""):
+    """Register a benchmark case."""
+    def register(setup):
+        CASES.append(Case(name, setup, description))
+        return setup
+    return register
+
+
+def make_history(turns: int) -> List[Dict[str, str]]:
+    """A realistic widget conversation history."""
+    return [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message {i}: could you tell me more about your pricing and support plans for teams?"
+        }
+        for i in range(turns)
+    ]
+
+
+def load_app():
+    """Import the FastAPI app with a zero-latency fake provider active."""
+    import main
+    from llm_providers.base import BaseLLMProvider
+    from llm_providers.reload import ProviderGeneration
+    
+    class FakeProvider(BaseLLMProvider):
+        """Replies instantly so only our own code is measured"""
+        
+        def generate_response(self, messages, max_tokens=None, temperature=None, **kwargs):
+            self.validate_messages(messages)
+            return "We offer three plans: Starter, Team and Enterprise. Which one would you like to know more about?"
+        
+        def get_provider_name(self):
+            return "Fake"
+        
+        def is_available(self):
+            return True
+    
+    main.provider_manager.activate(ProviderGeneration(main.settings, FakeProvider("key", "fake-model")))
+    return main
+
+
+# Request parsing and prompt assembly
+
+for _turns in (0, 10, 50):
+    @case(f"chat_request_parse[h={_turns}]", "json.loads + ChatRequest validation of a request body")
+    def _parse(turns=_turns):
+        main = load_app()
+        body = json.dumps({"message": "And enterprise plans?", "conversation_history": make_history(turns)})
+        return lambda: main.ChatRequest.model_validate(json.loads(body))
+
+
+for _turns in (10, 50):
+    @case(f"build_messages[h={_turns}]", "Prompt assembly in main.build_messages")
+    def _build(turns=_turns):
+        main = load_app()
+        request = main.ChatRequest(message="And enterprise plans?", conversation_history=make_history(turns))
+        return lambda: main.build_messages(request.message, request.conversation_history, main.settings)
+
+
+@case("validate_messages[n=50]", "BaseLLMProvider.validate_messages on an unvalidated list")
+def _validate():
+    main = load_app()
+    provider = main.provider_manager.current.provider
+    messages = [{"role": "system", "content": "prompt"}] + make_history(49)
+    return lambda: provider.validate_messages(messages)
+
+
+@case("validate_messages_prevalidated[n=50]", "validate_messages on ValidatedMessages from build_messages")
+def _validate_prevalidated():
+    main = load_app()
+    provider = main.provider_manager.current.provider
+    _, messages = main.build_messages("And enterprise plans?", make_history(48), main.settings)
+    return lambda: provider.validate_messages(messages)
+
+
+@case("watsonx_messages_to_prompt[n=20]", "WatsonXProvider._messages_to_prompt")
+def _watsonx():
+    from llm_providers.watsonx_provider import WatsonXProvider
+    provider = WatsonXProvider(api_key=None, model="ibm/granite-13b-chat-v2")
+    messages = [{"role": "system", "content": "prompt"}] + make_history(19)
+    return lambda: provider._messages_to_prompt(messages)
+
+
+# Monitoring
+
+@case("monitor_record_request", "PerformanceMonitor.record_request with a full history")
+def _record():
+    from llm_providers.monitoring import PerformanceMonitor, RequestMetrics
+    monitor = PerformanceMonitor()
+    metrics = RequestMetrics(provider="Fake", model="fake-model", latency_ms=800.0, tokens_used=40)
+    for _ in range(monitor.max_history):
+        monitor.record_request(metrics)
+    return lambda: monitor.record_request(metrics)
+
+
+@case("monitor_get_stats[n=1000]", "PerformanceMonitor.get_stats over a full history")
+def _stats():
+    from llm_providers.monitoring import PerformanceMonitor, RequestMetrics
+    monitor = PerformanceMonitor()
+    for i in range(monitor.max_history):
+        monitor.record_request(RequestMetrics(
+            provider="Fake", model="fake-model", latency_ms=500.0 + i % 700, tokens_used=40, success=i % 50 != 0
+        ))
+    return lambda: monitor.get_stats(source="primary")
+
+
+# Full round-trips through the ASGI app
+
+for _turns in (0, 20):
+    @case(f"api_chat_roundtrip[h={_turns}]", "POST /api/chat through an in-process ASGI client")
+    def _roundtrip(turns=_turns):
+        import httpx
+        main = load_app()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench")
+        body = {"message": "And enterprise plans?", "conversation_history": make_history(turns)}
+        
+        async def roundtrip():
+            response = await client.post("/api/chat", json=body)
+            assert response.status_code == 200 and response.json()["success"], response.text
+        return roundtrip
+
+
+@case("api_metrics", "GET /api/metrics through an in-process ASGI client")
+def _metrics():
+    import httpx
+    main = load_app()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench")
+    
+    async def metrics():
+        response = await client.get("/api/metrics")
+        assert response.status_code == 200, response.text
+    return metrics
+
+
+@case("health_ready", "GET /health/ready through an in-process ASGI client")
+def _health():
+    import httpx
+    main = load_app()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench")
+    
+    async def health():
+        response = await client.get("/health/ready")
+        assert response.status_code in (200, 503), response.text
+    return health
+
+
+# Folded in from the standalone benchmarks
+
+@case("knowledge_search[docs=2000]", "KnowledgeIndex.search (see bench_knowledge.py)")
+def _knowledge():
+    import random
+    from bench_knowledge import make_corpus
+    from llm_providers.knowledge import KnowledgeIndex
+    documents, vocab, weights = make_corpus(2000, 5000, 60)
+    index = KnowledgeIndex()
+    index.add_documents(documents)
+    rng = random.Random(7)
+    queries = [" ".join(rng.choices(vocab, weights, k=5)) for _ in range(64)]
+    state = {"i": 0}
+    
+    def search():
+        state["i"] = (state["i"] + 1) % len(queries)
+        index.search(queries[state["i"]], k=3)
+    return search
+
+
+@case("chat_response_encode", "ChatResponse encoding with the app's response class (see bench_serialization.py)")
+def _encode():
+    from fastapi.encoders import jsonable_encoder
+    main = load_app()
+    reply = main.ChatResponse(reply="We offer three plans. " * 50, success=True)
+    response_class = main.app.router.default_response_class
+    return lambda: response_class(jsonable_encoder(reply)).body
+
+
+@case("prefilter_check", "PreFilter.check on a mix of ordinary, long and junk messages")
+def _prefilter():
+    from llm_providers.prefilter import GibberishModel, PreFilter
+    prefilter = PreFilter(gibberish=GibberishModel())
+    messages = [
+        "What is the difference between the basic and the premium plan?",
+        "hi",
+        "asdkjh qweoiu zxcmnb lkjhg",
+        "Could you walk me through exporting my data? " * 20
+    ]
+    state = {"i": 0}
+    
+    def check():
+        state["i"] = (state["i"] + 1) % len(messages)
+        prefilter.check(messages[state["i"]])
+    return check
+
+
+@case("near_duplicate_lookup", "NearDuplicateIndex.lookup of a paraphrase in a full 10,000-entry index")
+def _near_duplicate():
+    from llm_providers.near_duplicate import NearDuplicateIndex
+    import random
+    rng = random.Random(0)
+    vocabulary = [f"word{i}" for i in range(2000)]
+    index = NearDuplicateIndex(capacity=10000)
+    context = "0" * 64
+    questions = [" ".join(rng.sample(vocabulary, 8)) for _ in range(10000)]
+    for i, question in enumerate(questions):
+        index.add(question, context, f"{i:064x}")
+    return lambda: index.lookup(questions[4242] + " please", context)
+
+
+def time_case(func: Callable, rounds: int, min_round_time: float) -> Dict[str, float]:
+    """
+    Time a function: calibrate loops per round, then take per-op timings of several rounds.
+    
+    Returns:
+        median, min and stdev of microseconds per operation, and loops per round
+    """
+    if asyncio.iscoroutinefunction(func):
+        return asyncio.run(_time_async(func, rounds, min_round_time))
+    
+    func()
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_round_time:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_round_time / elapsed * 1.2))
+    
+    samples = [elapsed / number]
+    for _ in range(rounds - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number)
+    return _summary(samples, number)
+
+
+async def _time_async(func: Callable, rounds: int, min_round_time: float) -> Dict[str, float]:
+    """time_case for coroutine functions, all on one event loop."""
+    await func()
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            await func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_round_time:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_round_time / elapsed * 1.2))
+    
+    samples = [elapsed / number]
+    for _ in range(rounds - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            await func()
+        samples.append((time.perf_counter() - started) / number)
+    return _summary(samples, number)
+
+
+def _summary(samples: List[float], number: int) -> Dict[str, float]:
+    micros = [s * 1e6 for s in samples]
+    return {
+        "median_us": round(statistics.median(micros), 3),
+        "min_us": round(min(micros), 3),
+        "stdev_us": round(statistics.stdev(micros), 3) if len(micros) > 1 else 0.0,
+        "loops": number
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Current commit, if this is a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results: Dict, baseline: Dict, threshold: float, case_thresholds: Dict[str, float]) -> List[Dict]:
+    """
+    Compare median timings with a baseline.
+    
+    Args:
+        results: Current results by case
+        baseline: Baseline results by case
+        threshold: Allowed slowdown as a fraction (0.25 = 25% slower)
+        case_thresholds: Per-case overrides, matched by case name or name prefix
+    
+    Returns:
+        One row per case present in both, with ratio and regression flag
+    """
+    rows = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before or "median_us" not in current or "median_us" not in before:
+            continue
+        limit = next(
+            (value for key, value in sorted(case_thresholds.items(), key=lambda kv: -len(kv[0]))
+             if name == key or name.startswith(key)),
+            threshold
+        )
+        ratio = current["median_us"] / before["median_us"] if before["median_us"] else 1.0
+        rows.append({
+            "name": name,
+            "baseline_us": before["median_us"],
+            "current_us": current["median_us"],
+            "ratio": round(ratio, 3),
+            "threshold": limit,
+            "regressed": ratio > 1 + limit
+        })
+    return rows
+
+
+def parse_case_thresholds(values: List[str]) -> Dict[str, float]:
+    """Parse repeated NAME=FRACTION options."""
+    thresholds = {}
+    for value in values:
+        name, _, fraction = value.partition("=")
+        if not name or not fraction:
+            raise ValueError(f"Expected NAME=FRACTION, got '{value}'")
+        thresholds[name] = float(fraction)
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite with baseline comparison")
+    parser.add_argument("--filter", action="append", default=[], help="Only run cases containing this text (repeatable)")
+    parser.add_argument("--list", action="store_true", help="List cases and exit")
+    parser.add_argument("--rounds", type=int, default=7, help="Timed rounds per case")
+    parser.add_argument("--min-round-time", type=float, default=0.05, help="Seconds per round")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "latest.json"))
+    parser.add_argument("--baseline", default=os.path.join(RESULTS_DIR, "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed median slowdown (0.25 = 25%%)")
+    parser.add_argument("--case-threshold", action="append", default=[], metavar="NAME=FRACTION",
+                        help="Per-case (or case-prefix) threshold override (repeatable)")
+    args = parser.parse_args()
+    
+    try:
+        case_thresholds = parse_case_thresholds(args.case_threshold)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    cases = [c for c in CASES if not args.filter or any(f in c.name for f in args.filter)]
+    if args.list:
+        for c in cases:
+            print(f"{c.name:<40} {c.description}")
+        return
+    
+    results = {}
+    for c in cases:
+        try:
+            func = c.setup()
+        except ImportError as e:
+            results[c.name] = {"skipped": f"missing dependency: {e.name or str(e)}"}
+            print(f"{c.name:<40} skipped ({results[c.name]['skipped']})")
+            continue
+        results[c.name] = time_case(func, args.rounds, args.min_round_time)
+        r = results[c.name]
+        print(f"{c.name:<40} {r['median_us']:>12.2f} us  (min {r['min_us']:.2f}, stdev {r['stdev_us']:.2f}, {r['loops']} loops)")
+    
+    document = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine()
+        },
+        "results": results
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+    
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    rows = compare(results, baseline.get("results", {}), args.threshold, case_thresholds)
+    
+    print(f"\nCompared with baseline from {baseline['meta'].get('timestamp')} (commit {baseline['meta'].get('commit')}):")
+    for row in rows:
+        flag = "REGRESSED" if row["regressed"] else "ok"
+        print(f"{row['name']:<40} {row['baseline_us']:>10.2f} -> {row['current_us']:>10.2f} us  "
+              f"x{row['ratio']:.2f} (limit x{1 + row['threshold']:.2f})  {flag}")
+    
+    regressions = [r for r in rows if r["regressed"]]
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed beyond their threshold")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,9 @@
  * 
  * Usage:
  * <script src="antigravity-widget.js"></script>
+ *
+ * Or load the minified, versioned bundle served by the backend:
+ * <script src="https://your-backend/widget/embed.js" defer></script>
  */
 
 (function () {
@@ -24,24 +27,66 @@
         primaryColor: window.antigravityConfig?.primaryColor || '#06d6a0',
         secondaryColor: window.antigravityConfig?.secondaryColor || '#118ab2',
         accentColor: window.antigravityConfig?.accentColor || '#ef476f',
-        position: window.antigravityConfig?.position || 'right'
+        position: window.antigravityConfig?.position || 'right',
+        widgetId: window.antigravityConfig?.widgetId || null,
+        // 'auto' prefers the WebSocket transport and falls back to HTTP; 'http' never uses it
+        transport: window.antigravityConfig?.transport || 'auto',
+        wsEndpoint: window.antigravityConfig?.wsEndpoint || null,
+        // History sent with each message is capped to this many messages and characters
+        historyMessages: window.antigravityConfig?.historyMessages ?? 20,
+        historyChars: window.antigravityConfig?.historyChars ?? 6000,
+        // Retries of rate-limited or failed requests, with jittered backoff
+        maxRetries: window.antigravityConfig?.maxRetries ?? 3,
+        // Messages sent within this many milliseconds of a request are sent together
+        debounceMs: window.antigravityConfig?.debounceMs ?? 300,
+        // Keep the conversation in sessionStorage so a page reload continues it
+        persistHistory: window.antigravityConfig?.persistHistory ?? true
     };
 
+    // Older messages longer than this are shortened when history is compacted
+    const COMPACT_MESSAGE_CHARS = 500;
+    // Messages kept in sessionStorage
+    const STORED_MESSAGES = 100;
+    // Statuses worth retrying, and the backoff bounds
+    const RETRY_STATUSES = new Set([429, 502, 503, 504]);
+    const RETRY_BASE_MS = 500;
+    const RETRY_MAX_MS = 8000;
+    const MAX_RETRY_AFTER_MS = 20000;
+
     // State
     let isOpen = false;
     let isFullscreen = false;
     let currentScreen = 'connect'; // 'connect', 'voice', 'text', 'chat'
     let conversationHistory = [];
     let isTyping = false;
+
+    // The request in flight: a newer message waits for a reply that is
+    // already generating, and only aborts a request still waiting to send
+    let activeRequest = null;
+    let sendTimer = null;
+    let lastSendAt = 0;
     let isAuthenticated = false;
     let userPhone = '';
 
+    // WebSocket state: the server keeps the history, and the session id and
+    // last received seq let a reconnect resume an in-progress reply
+    const chatSocket = {
+        socket: null,
+        connecting: null,
+        sessionId: null,
+        lastSeq: 0,
+        pending: null,
+        failures: 0,
+        // A new session has no history; the first message seeds it
+        needsHistory: true
+    };
+
     // Voice state
     let isRecording = false;
     let mediaRecorder = null;
     let audioChunks = [];
 
-    // CSS Styles
+    // Launcher styles (button and tooltip), injected on load
     const styles = `
         .antigravity-widget * {
             box-sizing: border-box;
@@ -116,6 +161,21 @@
             color: rgba(255, 255, 255, 0.85);
         }
         
+        /* Panel stays hidden until its styles are injected on first open */
+        .antigravity-modal {
+            display: none;
+        }
+        
+        @media (max-width: 768px) {
+            .antigravity-tooltip {
+                max-width: 220px;
+                ${config.position}: 86px;
+            }
+        }
+    `;
+
+    // Panel styles, injected the first time the widget opens
+    const panelStyles = `
         /* Modal Container */
         .antigravity-modal {
             position: fixed;
@@ -654,11 +714,6 @@
                 width: calc(100vw - 32px);
                 max-width: 400px;
             }
-            
-            .antigravity-tooltip {
-                max-width: 220px;
-                ${config.position}: 86px;
-            }
         }
     `;
 
@@ -794,6 +849,8 @@
 
         // Add event listeners
         initEventListeners();
+
+        restoreConversation();
     }
 
     // Initialize event listeners
@@ -840,6 +897,17 @@
         });
     }
 
+    // Inject the panel styles once, when the widget is first opened
+    let panelStylesInjected = false;
+
+    function injectPanelStyles() {
+        if (panelStylesInjected) return;
+        const styleElement = document.createElement('style');
+        styleElement.textContent = panelStyles;
+        document.head.appendChild(styleElement);
+        panelStylesInjected = true;
+    }
+
     // Toggle modal
     function toggleModal() {
         isOpen = !isOpen;
@@ -847,6 +915,7 @@
         const tooltip = document.getElementById('antigravity-tooltip');
 
         if (isOpen) {
+            injectPanelStyles();
             modal.classList.add('open');
             tooltip.classList.remove('show');
         } else {
@@ -990,6 +1059,7 @@
 
         messagesContainer.appendChild(messageElement);
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        return messageElement.querySelector('.chat-message-content');
     }
 
     function addUserMessage(message) {
@@ -1006,47 +1076,414 @@
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
     }
 
-    async function sendChatMessage() {
+    function sendChatMessage() {
         const input = document.getElementById('chat-input');
         const message = input.value.trim();
 
-        if (!message || isTyping) return;
+        if (!message) return;
 
         addUserMessage(message);
         input.value = '';
-        isTyping = true;
 
         // Add to conversation history
         conversationHistory.push({ role: 'user', content: message });
+        saveConversation();
 
-        try {
-            // Call your API
-            const response = await fetch(config.apiEndpoint, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({
-                    message: message,
-                    conversation_history: conversationHistory
-                })
-            });
+        // Coalesce rapid sends: the first message goes out at once, and
+        // messages sent within debounceMs of a request join the next one
+        clearTimeout(sendTimer);
+        sendTimer = setTimeout(dispatchChat, Math.max(0, lastSendAt + config.debounceMs - Date.now()));
+    }
+
+    function dispatchChat() {
+        sendTimer = null;
+        lastSendAt = Date.now();
 
-            if (!response.ok) throw new Error('API error');
+        const previous = activeRequest;
+        const request = { controller: new AbortController(), done: null };
+        activeRequest = request;
+        request.done = (async () => {
+            if (previous) {
+                previous.controller.abort();
+                await previous.done;
+            }
+            // Superseded while waiting for the previous request
+            if (request.controller.signal.aborted) return;
+            await runChat(request);
+        })();
+    }
+
+    async function runChat(request) {
+        // Every user message since the last reply is answered together
+        let start = conversationHistory.length;
+        while (start > 0 && conversationHistory[start - 1].role === 'user') start--;
+        const answered = conversationHistory.length;
+        if (start === answered) return;
+
+        const message = conversationHistory.slice(start).map(m => m.content).join('\n');
+        const history = compactHistory(conversationHistory.slice(0, start));
+        const signal = request.controller.signal;
 
-            const data = await response.json();
+        // One key per request: if it is resent, the server replays the first
+        // reply instead of generating a new one
+        const idempotencyKey = createIdempotencyKey();
+        isTyping = true;
+
+        try {
+            let reply = null;
+            try {
+                reply = await sendOverSocket(message, idempotencyKey, history, signal);
+            } catch (error) {
+                if (!error.transport) throw error;
+                reply = await sendOverHttp(message, idempotencyKey, history, signal);
+            }
 
-            if (data.success && data.reply) {
-                addBotMessage(data.reply);
-                conversationHistory.push({ role: 'assistant', content: data.reply });
+            if (reply) {
+                // After the messages it answers; later ones wait for the next request
+                conversationHistory.splice(answered, 0, { role: 'assistant', content: reply });
+                saveConversation();
             }
         } catch (error) {
+            // Superseded by a newer message, which now answers this one too
+            if (error.name === 'AbortError') return;
             console.error('Chat error:', error);
             addBotMessage('Sorry, I\'m having trouble connecting. Please try again.');
         } finally {
-            isTyping = false;
+            if (activeRequest === request) {
+                activeRequest = null;
+                isTyping = false;
+            }
+        }
+    }
+
+    // Keep the most recent messages within the message and character
+    // budgets, shortening long older messages first so more turns fit
+    function compactHistory(history) {
+        const kept = [];
+        let chars = 0;
+
+        for (let i = history.length - 1; i >= 0 && kept.length < config.historyMessages; i--) {
+            let content = history[i].content;
+            if (kept.length >= 2 && content.length > COMPACT_MESSAGE_CHARS) {
+                content = content.slice(0, COMPACT_MESSAGE_CHARS) + '…';
+            }
+            if (kept.length && chars + content.length > config.historyChars) break;
+            chars += content.length;
+            kept.push({ role: history[i].role, content: content });
+        }
+        return kept.reverse();
+    }
+
+    async function sendOverHttp(message, idempotencyKey, history, signal) {
+        const body = JSON.stringify({
+            message: message,
+            conversation_history: history
+        });
+
+        // Call your API
+        const response = await postChat(body, idempotencyKey, signal);
+
+        if (!response.ok) throw new Error('API error');
+
+        const data = await response.json();
+
+        if (data.success && data.reply) {
+            addBotMessage(data.reply);
+            return data.reply;
+        }
+        return null;
+    }
+
+    // WebSocket transport
+    function socketUrl() {
+        const url = new URL(config.wsEndpoint || config.apiEndpoint.replace(/\/api\/chat\/?$/, '/ws/chat'), window.location.href);
+        url.protocol = url.protocol === 'https:' || url.protocol === 'wss:' ? 'wss:' : 'ws:';
+        if (config.widgetId) url.searchParams.set('widget_id', config.widgetId);
+        if (chatSocket.sessionId) {
+            url.searchParams.set('session_id', chatSocket.sessionId);
+            url.searchParams.set('last_seq', chatSocket.lastSeq);
+        }
+        return url.toString();
+    }
+
+    function transportError(message) {
+        const error = new Error(message);
+        error.transport = true;
+        return error;
+    }
+
+    function connectSocket() {
+        if (chatSocket.socket && chatSocket.socket.readyState === WebSocket.OPEN) {
+            return Promise.resolve(chatSocket.socket);
+        }
+        if (chatSocket.connecting) return chatSocket.connecting;
+
+        chatSocket.connecting = new Promise((resolve, reject) => {
+            let socket;
+            try {
+                socket = new WebSocket(socketUrl());
+            } catch (error) {
+                reject(transportError('WebSocket unavailable'));
+                return;
+            }
+            let ready = false;
+
+            socket.onmessage = (event) => {
+                const frame = JSON.parse(event.data);
+                if (frame.type === 'ready') {
+                    if (!frame.resumed) {
+                        // The old session expired; a reply in progress on it is lost
+                        chatSocket.lastSeq = 0;
+                        failPending(transportError('Session expired'));
+                    }
+                    chatSocket.needsHistory = !frame.resumed;
+                    chatSocket.sessionId = frame.session_id;
+                    chatSocket.failures = 0;
+                    saveConversation();
+                    ready = true;
+                    resolve(socket);
+                    return;
+                }
+                handleSocketFrame(frame);
+            };
+
+            socket.onclose = () => {
+                chatSocket.socket = null;
+                chatSocket.connecting = null;
+                if (!ready) {
+                    chatSocket.failures++;
+                    reject(transportError('WebSocket connection failed'));
+                    return;
+                }
+                // Resume an in-progress reply on a new connection
+                if (chatSocket.pending) {
+                    setTimeout(() => {
+                        connectSocket().catch(() => failPending(transportError('WebSocket connection lost')));
+                    }, retryDelay(chatSocket.failures, null));
+                }
+            };
+
+            chatSocket.socket = socket;
+        });
+        chatSocket.connecting.then(() => { chatSocket.connecting = null; }, () => {});
+        return chatSocket.connecting;
+    }
+
+    function handleSocketFrame(frame) {
+        if (frame.seq) chatSocket.lastSeq = Math.max(chatSocket.lastSeq, frame.seq);
+        const pending = chatSocket.pending;
+
+        if (frame.type === 'ping') {
+            chatSocket.socket?.send(JSON.stringify({ type: 'pong' }));
+        } else if (frame.type === 'history') {
+            // Missed frames are gone; take the reply from the server's history
+            const last = frame.messages[frame.messages.length - 1];
+            if (pending && last && last.role === 'assistant') {
+                finishPending(last.content);
+            } else {
+                failPending(transportError('Reply lost while reconnecting'));
+            }
+        } else if (pending && frame.id === pending.id) {
+            if (frame.type === 'delta') {
+                pending.text += frame.text;
+                if (!pending.element) pending.element = addBotMessage('');
+                pending.element.textContent = pending.text;
+                scrollToBottom();
+            } else if (frame.type === 'done') {
+                if (frame.success && frame.reply) {
+                    finishPending(frame.reply);
+                } else {
+                    failPending(new Error(frame.error || 'Chat error'));
+                }
+            } else if (frame.type === 'error') {
+                const error = new Error(frame.detail || 'Chat error');
+                error.status = frame.status;
+                error.retryAfter = frame.retry_after ?? null;
+                failPending(error);
+            }
+        }
+    }
+
+    function finishPending(reply) {
+        const pending = chatSocket.pending;
+        chatSocket.pending = null;
+        chatSocket.needsHistory = false;
+        if (pending.element) {
+            pending.element.textContent = reply;
+        } else {
+            addBotMessage(reply);
+        }
+        pending.resolve(reply);
+    }
+
+    function failPending(error) {
+        const pending = chatSocket.pending;
+        if (!pending) return;
+        chatSocket.pending = null;
+        // Fall back to HTTP only if nothing has been shown for this reply yet
+        if (pending.element) error.transport = false;
+        pending.reject(error);
+    }
+
+    async function sendOverSocket(message, id, history, signal) {
+        if (config.transport === 'http' || typeof WebSocket === 'undefined' || chatSocket.failures >= 3) {
+            throw transportError('WebSocket transport disabled');
+        }
+
+        for (let attempt = 0; ; attempt++) {
+            const socket = await connectSocket();
+            // Once sent, a reply is generated anyway, so it is awaited rather than aborted
+            if (signal.aborted) throw abortError();
+
+            try {
+                return await new Promise((resolve, reject) => {
+                    chatSocket.pending = { id: id, text: '', element: null, resolve: resolve, reject: reject };
+                    const frame = { type: 'message', id: id, message: message };
+                    // A new session continues the conversation kept by the widget
+                    if (chatSocket.needsHistory && history.length) frame.history = history;
+                    socket.send(JSON.stringify(frame));
+                });
+            } catch (error) {
+                // Rate limited before the reply started: wait as told, then resend
+                const delay = error.status === 429 && attempt < config.maxRetries
+                    ? retryDelay(attempt, error.retryAfter)
+                    : null;
+                if (delay === null) throw error;
+                await sleep(delay, signal);
+            }
+        }
+    }
+
+    function scrollToBottom() {
+        const messagesContainer = document.getElementById('chat-messages');
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+    }
+
+    async function postChat(body, idempotencyKey, signal) {
+        const headers = {
+            'Content-Type': 'application/json',
+            'Idempotency-Key': idempotencyKey
+        };
+        if (config.widgetId) {
+            headers['X-Widget-Id'] = config.widgetId;
+        }
+
+        for (let attempt = 0; ; attempt++) {
+            // Once sent, a reply is generated anyway, so it is awaited rather
+            // than aborted; signal only cancels the wait before a retry
+            if (signal.aborted) throw abortError();
+            let response = null;
+            try {
+                response = await fetch(config.apiEndpoint, {
+                    method: 'POST',
+                    headers: headers,
+                    body: body
+                });
+            } catch (error) {
+                // Network failure: the attempt may still have reached the
+                // server, so retry with the same key
+                if (attempt >= config.maxRetries) throw error;
+            }
+
+            if (response && (!RETRY_STATUSES.has(response.status) || attempt >= config.maxRetries)) {
+                return response;
+            }
+            const delay = retryDelay(attempt, response ? parseRetryAfter(response.headers.get('Retry-After')) : null);
+            if (delay === null) return response;
+            await sleep(delay, signal);
+        }
+    }
+
+    // Milliseconds before retry number attempt: the server's Retry-After if
+    // given (null if that is too long to wait), otherwise exponential
+    // backoff with full jitter so clients don't retry in lockstep
+    function retryDelay(attempt, retryAfterSeconds) {
+        if (retryAfterSeconds !== null && retryAfterSeconds !== undefined) {
+            const wait = retryAfterSeconds * 1000;
+            return wait > MAX_RETRY_AFTER_MS ? null : wait + Math.random() * RETRY_BASE_MS;
+        }
+        return RETRY_BASE_MS / 2 + Math.random() * Math.min(RETRY_MAX_MS, RETRY_BASE_MS * 2 ** attempt);
+    }
+
+    function parseRetryAfter(value) {
+        if (!value) return null;
+        const seconds = Number(value);
+        if (!Number.isNaN(seconds)) return Math.max(0, seconds);
+        const date = Date.parse(value);
+        return Number.isNaN(date) ? null : Math.max(0, (date - Date.now()) / 1000);
+    }
+
+    function sleep(ms, signal) {
+        return new Promise((resolve, reject) => {
+            if (signal.aborted) {
+                reject(abortError());
+                return;
+            }
+            const timer = setTimeout(resolve, ms);
+            signal.addEventListener('abort', () => {
+                clearTimeout(timer);
+                reject(abortError());
+            }, { once: true });
+        });
+    }
+
+    function abortError() {
+        const error = new Error('Superseded by a newer message');
+        error.name = 'AbortError';
+        return error;
+    }
+
+    // Conversation persistence (per tab, so a reload continues the chat)
+    const storageKey = `antigravity:${config.widgetId || 'default'}`;
+
+    function saveConversation() {
+        if (!config.persistHistory) return;
+        try {
+            sessionStorage.setItem(storageKey, JSON.stringify({
+                history: conversationHistory.slice(-STORED_MESSAGES),
+                sessionId: chatSocket.sessionId,
+                lastSeq: chatSocket.lastSeq
+            }));
+        } catch (error) {
+            // Storage full or unavailable: the conversation is just not kept
+        }
+    }
+
+    function restoreConversation() {
+        if (!config.persistHistory) return;
+        let saved = null;
+        try {
+            saved = JSON.parse(sessionStorage.getItem(storageKey));
+        } catch (error) {
+            return;
         }
+        if (!saved || !Array.isArray(saved.history)) return;
+
+        conversationHistory = saved.history.filter(m =>
+            m && (m.role === 'user' || m.role === 'assistant') && typeof m.content === 'string'
+        );
+        chatSocket.sessionId = saved.sessionId || null;
+        chatSocket.lastSeq = saved.lastSeq || 0;
+        if (!conversationHistory.length) return;
+
+        conversationHistory.forEach(m => {
+            if (m.role === 'user') {
+                addUserMessage(m.content);
+            } else {
+                addBotMessage(m.content);
+            }
+        });
+        showScreen('chat');
     }
 
     // Utility
+    function createIdempotencyKey() {
+        if (window.crypto && typeof window.crypto.randomUUID === 'function') {
+            return window.crypto.randomUUID();
+        }
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+    }
+
     function escapeHtml(text) {
         const div = document.createElement('div');
         div.textContent = text;
@@ -0,0 +1,133 @@
+"""
+Cost and latency rollups from the usage ledger
+Streams the compressed JSONL files written by the server (LEDGER_PATH) and
+prints request counts, tokens, cost and latency percentiles per group.
+
+Usage:
+    python ledger_report.py ledger/ --since 7d --group-by day,model
+    python ledger_report.py ledger/ --since 2024-06-01 --group-by source --format json
+"""
+
+import argparse
+import json
+import re
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from llm_providers.ledger import read_events
+
+GROUP_FIELDS = ("tenant", "provider", "model", "source", "priority", "day", "hour", "success")
+
+
+def parse_since(value: Optional[str]) -> Optional[float]:
+    """Parse a relative ("30m", "24h", "7d") or ISO date/time into a Unix timestamp."""
+    if not value:
+        return None
+    match = re.fullmatch(r"(\d+)([mhd])", value)
+    if match:
+        seconds = {"m": 60, "h": 3600, "d": 86400}[match.group(2)]
+        return time.time() - int(match.group(1)) * seconds
+    return datetime.fromisoformat(value).timestamp()
+
+
+def group_value(event: Dict, name: str) -> str:
+    """Value of a grouping field for an event."""
+    if name == "day":
+        return datetime.fromtimestamp(event["timestamp"]).strftime("%Y-%m-%d")
+    if name == "hour":
+        return datetime.fromtimestamp(event["timestamp"]).strftime("%Y-%m-%d %H:00")
+    return str(event.get(name))
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Percentile of a sorted list."""
+    return values[int(fraction * (len(values) - 1))] if values else 0.0
+
+
+def rollup(events, group_by: List[str]) -> List[Dict]:
+    """
+    Aggregate events into one row per group.
+    
+    Args:
+        events: Iterable of ledger events
+        group_by: Grouping fields
+    
+    Returns:
+        Rows sorted by group
+    """
+    groups = defaultdict(lambda: {
+        "requests": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0,
+        "cost_usd": 0.0, "unpriced": 0, "latencies": []
+    })
+    
+    for event in events:
+        row = groups[tuple(group_value(event, name) for name in group_by)]
+        row["requests"] += 1
+        row["errors"] += 0 if event.get("success", True) else 1
+        row["prompt_tokens"] += event.get("prompt_tokens") or 0
+        row["completion_tokens"] += event.get("completion_tokens") or 0
+        if event.get("cost_usd") is not None:
+            row["cost_usd"] += event["cost_usd"]
+        elif event.get("source") == "llm":
+            row["unpriced"] += 1
+        row["latencies"].append(event.get("latency_ms") or 0.0)
+    
+    rows = []
+    for key in sorted(groups):
+        row = groups[key]
+        latencies = sorted(row.pop("latencies"))
+        rows.append({
+            **dict(zip(group_by, key)),
+            **row,
+            "cost_usd": round(row["cost_usd"], 6),
+            "p50_latency_ms": round(percentile(latencies, 0.5), 1),
+            "p95_latency_ms": round(percentile(latencies, 0.95), 1),
+            "max_latency_ms": round(latencies[-1], 1) if latencies else 0.0
+        })
+    return rows
+
+
+def print_table(rows: List[Dict], group_by: List[str]):
+    """Print rows as an aligned text table."""
+    columns = group_by + [
+        "requests", "errors", "prompt_tokens", "completion_tokens", "cost_usd",
+        "p50_latency_ms", "p95_latency_ms", "max_latency_ms"
+    ]
+    cells = [[f"{row[c]:.6f}" if c == "cost_usd" else str(row.get(c, "")) for c in columns] for row in rows]
+    widths = [max([len(c)] + [len(r[i]) for r in cells]) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for r in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost and latency rollups from the usage ledger")
+    parser.add_argument("path", help="Ledger directory (LEDGER_PATH)")
+    parser.add_argument("--since", help='Only events after this time: "24h", "7d" or an ISO date')
+    parser.add_argument("--group-by", default="provider,model", help=f"Comma-separated fields: {', '.join(GROUP_FIELDS)}")
+    parser.add_argument("--format", choices=["table", "json"], default="table")
+    args = parser.parse_args()
+    
+    group_by = [g.strip() for g in args.group_by.split(",") if g.strip()]
+    unknown = [g for g in group_by if g not in GROUP_FIELDS]
+    if unknown:
+        parser.error(f"Unknown group field(s): {', '.join(unknown)}")
+    
+    rows = rollup(read_events(args.path, since=parse_since(args.since)), group_by)
+    
+    if args.format == "json":
+        print(json.dumps(rows, indent=2))
+    elif rows:
+        print_table(rows, group_by)
+        total = sum(r["cost_usd"] for r in rows)
+        unpriced = sum(r["unpriced"] for r in rows)
+        print(f"\nTotal: {sum(r['requests'] for r in rows)} requests, ${total:.6f}"
+              + (f" ({unpriced} LLM request(s) with no known price)" if unpriced else ""))
+    else:
+        print("No ledger events found")
+
+
+if __name__ == "__main__":
+    main()
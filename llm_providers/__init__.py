@@ -3,16 +3,22 @@ LLM Providers Package
 Abstract Factory pattern implementation for multi-LLM support
 """
 
-from .base import BaseLLMProvider
+from .base import BaseLLMProvider, GenerationResult, ValidatedMessages
 from .openai_provider import OpenAIProvider
 # from .groq_provider import GroqProvider
 # from .watsonx_provider import WatsonXProvider
+from .cascade_provider import CascadeProvider
+from .local_provider import LocalProvider
 from .factory import LLMProviderFactory
 
 __all__ = [
     'BaseLLMProvider',
+    'GenerationResult',
+    'ValidatedMessages',
     'OpenAIProvider',
     'GroqProvider',
     # 'WatsonXProvider',
+    'CascadeProvider',
+    'LocalProvider',
     'LLMProviderFactory'
 ]
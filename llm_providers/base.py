@@ -3,14 +3,73 @@ Abstract Base Class for LLM Providers
 Defines the interface that all LLM providers must implement
 """
 
+import time
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional
+from dataclasses import dataclass, fields
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
+from .monitoring import monitor, RequestMetrics, estimate_tokens
+
+
+class ValidatedMessages(list):
+    """
+    A message list whose format has already been checked.
+    
+    The server builds these from validated request models, so
+    validate_messages() accepts them without checking every message again.
+    """
+    pass
+
+
+@dataclass
+class GenerationResult:
+    """
+    A generated reply with its usage and timing.
+    
+    Returned by BaseLLMProvider.generate(). str(result) is the reply text,
+    so it can stand in where a plain string used to be expected.
+    """
+    text: str
+    provider: str = ""  # Provider that served the reply (the tier, for composite providers)
+    model: str = ""
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    finish_reason: Optional[str] = None  # As reported by the provider: "stop", "length", ...
+    ttft_ms: Optional[float] = None  # Time to first token (streamed replies only)
+    latency_ms: float = 0.0
+    attempts: int = 1  # HTTP requests sent, including client retries
+    usage_estimated: bool = False  # True if token counts were estimated locally
+    
+    @property
+    def total_tokens(self) -> int:
+        return (self.prompt_tokens or 0) + (self.completion_tokens or 0)
+    
+    @property
+    def truncated(self) -> bool:
+        """Whether the provider stopped at the max_tokens limit."""
+        return self.finish_reason == "length"
+    
+    def __str__(self) -> str:
+        return self.text
+
+
+def usage_tokens(usage) -> Tuple[Optional[int], Optional[int]]:
+    """Prompt and completion tokens of an OpenAI-style usage object (None if absent)."""
+    if usage is None:
+        return None, None
+    return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
 
 
 class BaseLLMProvider(ABC):
     """
     Abstract base class for LLM providers.
     All LLM provider implementations must inherit from this class.
+    
+    Providers implement _generate() (and _stream() if they can stream),
+    returning a GenerationResult with whatever usage the API reports.
+    Callers use generate(), which times the call, fills in anything the
+    provider did not report and records it in the performance monitor.
+    generate_response() and stream_response() remain as string-returning
+    wrappers for older callers.
     """
     
     def __init__(self, api_key: str, model: str, **config):
@@ -26,7 +85,129 @@ class BaseLLMProvider(ABC):
         self.model = model
         self.config = config
     
-    @abstractmethod
+    def generate(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        on_delta: Optional[Callable[[str], None]] = None,
+        record: bool = True,
+        source: str = "primary",
+        tenant: str = "default",
+        **kwargs
+    ) -> GenerationResult:
+        """
+        Generate a response with its usage and timing.
+        
+        Token counts the provider does not report are estimated (and the
+        result is marked usage_estimated). Successful and failed calls are
+        recorded in the performance monitor unless record is False.
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature (0-1)
+            on_delta: If given, the response is streamed and each text
+                delta is passed to it as it arrives
+            record: Record the call in the performance monitor
+            source: Traffic source recorded with the call ("primary" or "shadow")
+            tenant: Tenant id recorded with the call
+            **kwargs: Additional provider-specific parameters
+        
+        Returns:
+            GenerationResult
+        
+        Raises:
+            Exception: If API call fails
+        """
+        started = time.perf_counter()
+        try:
+            if on_delta is None:
+                result = self._generate(messages, max_tokens=max_tokens, temperature=temperature, **kwargs)
+            else:
+                result = GenerationResult(text="")
+                pieces = []
+                for piece in self._stream(messages, max_tokens, temperature, result, **kwargs):
+                    if not pieces:
+                        result.ttft_ms = (time.perf_counter() - started) * 1000
+                    pieces.append(piece)
+                    on_delta(piece)
+                result.text = "".join(pieces)
+        except Exception as e:
+            if record:
+                monitor.record_request(RequestMetrics(
+                    provider=self.get_provider_name(),
+                    model=self.model,
+                    latency_ms=(time.perf_counter() - started) * 1000,
+                    success=False,
+                    error=str(e),
+                    source=source,
+                    tenant=tenant
+                ))
+            raise
+        
+        result.latency_ms = (time.perf_counter() - started) * 1000
+        result.provider = result.provider or self.get_provider_name()
+        result.model = result.model or self.model
+        if result.prompt_tokens is None:
+            result.prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+            result.usage_estimated = True
+        if result.completion_tokens is None:
+            result.completion_tokens = estimate_tokens(result.text)
+            result.usage_estimated = True
+        
+        if record:
+            monitor.record_result(result, source=source, tenant=tenant)
+        return result
+    
+    def _generate(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        **kwargs
+    ) -> GenerationResult:
+        """
+        Call the provider (implemented by each provider).
+        
+        The default supports older subclasses that only override
+        generate_response(), wrapping the text it returns.
+        
+        Returns:
+            GenerationResult with the text and whatever the API reports
+        
+        Raises:
+            NotImplementedError: If the subclass implements neither method
+        """
+        if type(self).generate_response is BaseLLMProvider.generate_response:
+            raise NotImplementedError(f"{type(self).__name__} must implement _generate()")
+        return GenerationResult(
+            text=self.generate_response(messages, max_tokens=max_tokens, temperature=temperature, **kwargs)
+        )
+    
+    def _stream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int],
+        temperature: Optional[float],
+        result: GenerationResult,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        Stream the provider's reply as text deltas, filling in result.
+        
+        Providers with a streaming API override this and set whatever
+        they learn along the way (finish reason, usage) on result. The
+        default yields the whole reply from _generate() as a single delta.
+        
+        Yields:
+            Pieces of the response text, in order
+        """
+        full = self._generate(messages, max_tokens=max_tokens, temperature=temperature, **kwargs)
+        for f in fields(full):
+            setattr(result, f.name, getattr(full, f.name))
+        yield full.text
+    
     def generate_response(
         self,
         messages: List[Dict[str, str]],
@@ -35,21 +216,51 @@ class BaseLLMProvider(ABC):
         **kwargs
     ) -> str:
         """
-        Generate a response from the LLM.
+        Generate a response from the LLM as plain text.
+        
+        Compatibility wrapper around generate(); the call is not recorded
+        in the performance monitor.
         
         Args:
             messages: List of message dictionaries with 'role' and 'content'
             max_tokens: Maximum tokens in response
             temperature: Sampling temperature (0-1)
             **kwargs: Additional provider-specific parameters
-            
+        
         Returns:
             Generated response text
-            
+        
         Raises:
             Exception: If API call fails
         """
-        pass
+        return self.generate(messages, max_tokens=max_tokens, temperature=temperature, record=False, **kwargs).text
+    
+    def stream_response(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        Generate a response as a stream of text deltas.
+        
+        Compatibility wrapper around _stream(); the call is not recorded
+        in the performance monitor.
+        
+        Args:
+            messages: List of message dictionaries with 'role' and 'content'
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature (0-1)
+            **kwargs: Additional provider-specific parameters
+        
+        Yields:
+            Pieces of the response text, in order
+        
+        Raises:
+            Exception: If API call fails
+        """
+        yield from self._stream(messages, max_tokens, temperature, GenerationResult(text=""), **kwargs)
     
     @abstractmethod
     def get_provider_name(self) -> str:
@@ -71,19 +282,77 @@ class BaseLLMProvider(ABC):
         """
         pass
     
+    def components(self) -> List["BaseLLMProvider"]:
+        """
+        Get the single-model providers this provider sends requests to.
+        
+        Returns:
+            [self] for plain providers; composite providers return their parts
+        """
+        return [self]
+    
+    def warm_up(self) -> None:
+        """
+        Prime the provider before it takes live traffic.
+        
+        The default sends a minimal one-token completion so client setup,
+        authentication and the first connection happen off the request path.
+        
+        Raises:
+            Exception: If the provider cannot serve requests
+        """
+        self.generate(
+            [{"role": "user", "content": "ping"}],
+            max_tokens=1,
+            record=False
+        )
+    
+    def check_health(self) -> None:
+        """
+        Check that the provider can serve requests.
+        
+        Called by the background health prober. The default sends a minimal
+        one-token completion; hosted providers override it with a free
+        authenticated request so probing does not spend billed tokens.
+        
+        Raises:
+            Exception: If the provider is not healthy
+        """
+        self.generate_response([{"role": "user", "content": "ping"}], max_tokens=1)
+    
+    def keep_alive(self) -> None:
+        """
+        Keep idle connections to the provider open.
+        
+        Called periodically by the keep-alive heartbeat. The default does
+        nothing; HTTP-based providers override it with a cheap request.
+        """
+        pass
+    
+    def close(self) -> None:
+        """
+        Release network resources held by the provider.
+        
+        Called once the provider has been replaced and has no requests in flight.
+        """
+        pass
+    
     def validate_messages(self, messages: List[Dict[str, str]]) -> bool:
         """
         Validate message format.
         
         Args:
             messages: List of message dictionaries
-            
+        
         Returns:
             True if valid, False otherwise
         """
         if not messages:
             return False
         
+        if isinstance(messages, ValidatedMessages):
+            return True
+        
         for msg in messages:
             if not isinstance(msg, dict):
                 return False
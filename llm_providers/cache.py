@@ -0,0 +1,304 @@
+"""
+Response caching for LLM providers
+Two-level cache: a small in-process LRU in front of a persistent SQLite
+store (WAL mode) that survives restarts and is shared by every uvicorn
+worker on the host.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Values at least this long are zlib-compressed before storage
+COMPRESS_MIN_BYTES = 256
+
+
+def normalize_text(text: str) -> str:
+    """Normalize user text for matching: lowercase, collapsed whitespace, no trailing punctuation."""
+    return re.sub(r"\s+", " ", text.strip().lower()).rstrip(" .?!")
+
+
+def make_cache_key(
+    namespace: str,
+    provider: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    **params
+) -> str:
+    """
+    Build a cache key for a generation request.
+    
+    Args:
+        namespace: Cache namespace (e.g. tenant)
+        provider: Provider name
+        model: Model name
+        messages: Conversation messages
+        **params: Generation parameters that affect the output
+    
+    Returns:
+        Hex digest identifying the request
+    """
+    payload = json.dumps(
+        [namespace, provider, model, messages, params],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def encode_value(value: str) -> bytes:
+    """Serialize a response: 1-byte format tag + UTF-8, zlib-compressed when large."""
+    raw = value.encode("utf-8")
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(raw, 6)
+        if len(compressed) < len(raw):
+            return b"z" + compressed
+    return b"r" + raw
+
+
+def decode_value(blob: bytes) -> str:
+    """Deserialize a value written by encode_value."""
+    tag, body = blob[:1], blob[1:]
+    if tag == b"z":
+        body = zlib.decompress(body)
+    return body.decode("utf-8")
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with TTL"""
+    
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0):
+        """
+        Initialize LRU cache.
+        
+        Args:
+            max_entries: Maximum number of entries
+            ttl: Seconds an entry stays valid
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, key: str) -> Optional[str]:
+        """Get a value, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        """Store a value, evicting the least recently used entry if full."""
+        with self._lock:
+            self._entries[key] = (time.time() + (ttl or self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache:
+    """
+    Persistent cache in a single SQLite file, shared across processes.
+    
+    WAL mode lets readers in every worker proceed while one writer commits.
+    Each thread keeps its own connection. Entries expire after their TTL,
+    and the least recently used entries are evicted once max_entries is
+    exceeded. Access times are refreshed at most once per minute per entry
+    so cache hits rarely need a write.
+    """
+    
+    ACCESS_REFRESH_SECONDS = 60
+    EVICT_EVERY_WRITES = 100
+    
+    def __init__(self, path: str, max_entries: int = 10000, ttl: float = 3600.0):
+        """
+        Initialize SQLite cache.
+        
+        Args:
+            path: Database file path (directories are created)
+            max_entries: Maximum entries kept on disk
+            ttl: Seconds an entry stays valid
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        conn.commit()
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    
+    def get(self, key: str) -> Optional[str]:
+        """Get a value, or None if missing or expired."""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM responses WHERE key = ?",
+            (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        
+        value, expires_at, accessed_at = row
+        now = time.time()
+        if expires_at < now:
+            return None
+        
+        if now - accessed_at > self.ACCESS_REFRESH_SECONDS:
+            try:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                conn.commit()
+            except sqlite3.OperationalError:
+                # Another worker holds the write lock; the refresh is best-effort
+                pass
+        
+        return decode_value(value)
+    
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        """Store a value."""
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, encode_value(value), now + (ttl or self.ttl), now)
+        )
+        conn.commit()
+        
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY_WRITES == 0:
+            self.evict()
+    
+    def evict(self) -> int:
+        """
+        Remove expired entries, then the least recently used beyond max_entries.
+        
+        Returns:
+            Number of entries removed
+        """
+        conn = self._connection()
+        removed = conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),)).rowcount
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            removed += conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                (excess,)
+            ).rowcount
+        conn.commit()
+        return removed
+    
+    def clear(self):
+        """Remove all entries."""
+        conn = self._connection()
+        conn.execute("DELETE FROM responses")
+        conn.commit()
+
+
+class TwoLevelCache:
+    """In-process LRU (L1) in front of a shared persistent cache (L2)"""
+    
+    def __init__(self, l1: LRUCache, l2: Optional[SQLiteCache] = None):
+        """
+        Initialize two-level cache.
+        
+        Args:
+            l1: Per-process LRU cache
+            l2: Optional persistent cache shared between workers
+        """
+        self.l1 = l1
+        self.l2 = l2
+        self.stats = {"l1_hits": 0, "l2_hits": 0, "misses": 0, "errors": 0}
+    
+    def get(self, key: str) -> Optional[str]:
+        """Look up L1, then L2 (promoting L2 hits into L1)."""
+        value = self.l1.get(key)
+        if value is not None:
+            self.stats["l1_hits"] += 1
+            return value
+        
+        if self.l2 is not None:
+            try:
+                value = self.l2.get(key)
+            except sqlite3.Error as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Persistent cache read failed: {str(e)}")
+                value = None
+            if value is not None:
+                self.stats["l2_hits"] += 1
+                self.l1.set(key, value)
+                return value
+        
+        self.stats["misses"] += 1
+        return None
+    
+    def contains(self, key: str) -> bool:
+        """Check whether a key is cached, without touching hit statistics."""
+        if self.l1.get(key) is not None:
+            return True
+        return self.l2 is not None and self.l2.get(key) is not None
+    
+    def set(self, key: str, value: str):
+        """Store in both levels."""
+        self.l1.set(key, value)
+        if self.l2 is not None:
+            try:
+                self.l2.set(key, value)
+            except sqlite3.Error as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Persistent cache write failed: {str(e)}")
+    
+    def get_stats(self) -> Dict:
+        """Get hit/miss counters and sizes."""
+        return {
+            **self.stats,
+            "l1_entries": len(self.l1),
+            "l2_entries": len(self.l2) if self.l2 is not None else None
+        }
@@ -0,0 +1,251 @@
+"""
+Cascade LLM Provider Implementation
+Routes each request to a fast, cheap model first and escalates to a
+stronger model only when the request looks complex or the fast answer
+is unusable.
+"""
+
+from typing import Callable, List, Dict, Optional, Tuple
+import re
+from .base import BaseLLMProvider, GenerationResult
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CascadeProvider(BaseLLMProvider):
+    """
+    Two-tier cascade over existing providers.
+    
+    Simple questions are answered by the fast tier with a reduced token
+    budget. A request goes straight to the strong tier when local
+    heuristics (message length, history depth, keyword rules) flag it as
+    complex, and falls through to the strong tier when the fast answer is
+    empty, a refusal, or cut off at the fast tier's token budget.
+    """
+    
+    DEFAULT_ESCALATION_KEYWORDS = [
+        "explain", "compare", "analyze", "analyse", "step by step",
+        "in detail", "code", "debug", "calculate", "summarize",
+        "summarise", "write", "plan", "pros and cons"
+    ]
+    
+    REFUSAL_PATTERNS = [
+        r"\bi(?:'m| am) (?:not sure|unable|not able)\b",
+        r"\bi can(?:not|'t) (?:help|answer|assist|provide)\b",
+        r"\bi don'?t (?:know|have (?:enough )?information)\b",
+        r"\bas an ai\b",
+        r"\bsorry,? (?:but )?i\b"
+    ]
+    
+    def __init__(
+        self,
+        fast_provider: BaseLLMProvider,
+        strong_provider: BaseLLMProvider,
+        max_message_chars: int = 280,
+        max_history_messages: int = 6,
+        escalation_keywords: Optional[List[str]] = None,
+        fast_max_tokens: Optional[int] = None,
+        **config
+    ):
+        """
+        Initialize cascade provider.
+        
+        Args:
+            fast_provider: Cheap, low-latency provider tried first
+            strong_provider: Capable provider used on escalation
+            max_message_chars: Escalate when the user message is longer than this
+            max_history_messages: Escalate when the conversation has more messages than this
+            escalation_keywords: Phrases that send a request straight to the strong tier
+            fast_max_tokens: Token budget for fast tier answers (defaults to max_tokens)
+            **config: Additional configuration
+        """
+        super().__init__(
+            api_key=strong_provider.api_key,
+            model=f"{fast_provider.model} -> {strong_provider.model}",
+            **config
+        )
+        self.fast_provider = fast_provider
+        self.strong_provider = strong_provider
+        self.max_message_chars = max_message_chars
+        self.max_history_messages = max_history_messages
+        self.fast_max_tokens = fast_max_tokens
+        # Optional health lookup (e.g. HealthProber.is_healthy) used to skip
+        # a fast tier that is known to be failing
+        self.health_check: Optional[Callable[[BaseLLMProvider], bool]] = None
+        
+        keywords = escalation_keywords
+        if keywords is None:
+            keywords = self.DEFAULT_ESCALATION_KEYWORDS
+        keywords = [k.strip().lower() for k in keywords if k.strip()]
+        self._keyword_pattern = re.compile(
+            r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")\b"
+        ) if keywords else None
+        self._refusal_pattern = re.compile("|".join(self.REFUSAL_PATTERNS), re.IGNORECASE)
+        
+        # Routing counters, exposed through get_stats()
+        self.stats = {
+            "fast": 0,
+            "escalated_by_heuristic": 0,
+            "escalated_by_answer": 0,
+            "escalated_by_length": 0,
+            "escalated_by_caller": 0
+        }
+    
+    def _generate(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        strong_only: bool = False,
+        **kwargs
+    ) -> GenerationResult:
+        """
+        Generate response, starting at the fast tier when possible.
+        
+        Args:
+            messages: Conversation messages
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature
+            strong_only: Skip the fast tier (e.g. to regenerate a reply that
+                was cut short by the caller's budget)
+            **kwargs: Additional provider-specific parameters
+        
+        Returns:
+            Result of the tier that served the reply; attempts include
+            those spent on a rejected fast answer
+        
+        Raises:
+            Exception: If the strong tier fails
+        """
+        if not self.validate_messages(messages):
+            raise ValueError("Invalid message format")
+        
+        if strong_only:
+            escalate, reason = True, "requested by caller"
+        else:
+            escalate, reason = self.should_escalate(messages)
+        
+        if not escalate and self.health_check and not self.health_check(self.fast_provider):
+            escalate, reason = True, "fast tier unhealthy"
+        
+        attempts = 0
+        if not escalate:
+            fast_tokens = self.fast_max_tokens or max_tokens
+            if max_tokens and fast_tokens:
+                fast_tokens = min(fast_tokens, max_tokens)
+            try:
+                result = self.fast_provider.generate(
+                    messages,
+                    max_tokens=fast_tokens,
+                    temperature=temperature,
+                    record=False,
+                    **kwargs
+                )
+                attempts = result.attempts
+                counter = "escalated_by_answer"
+                if result.truncated and fast_tokens and (not max_tokens or fast_tokens < max_tokens):
+                    # Cut off by the fast tier's own cap, which the strong
+                    # tier does not have; a cut at the caller's max_tokens is
+                    # left for the caller to handle
+                    counter, reason = "escalated_by_length", f"fast answer cut off at {fast_tokens} tokens"
+                elif self.is_acceptable_answer(result.text):
+                    self.stats["fast"] += 1
+                    return result
+                else:
+                    reason = "empty or refused answer"
+            except Exception as e:
+                attempts = 1
+                counter, reason = "escalated_by_answer", f"fast tier error: {str(e)}"
+            self.stats[counter] += 1
+        else:
+            self.stats["escalated_by_caller" if strong_only else "escalated_by_heuristic"] += 1
+        
+        logger.info(f"Escalating to {self.strong_provider.get_provider_name()} ({reason})")
+        result = self.strong_provider.generate(
+            messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            record=False,
+            **kwargs
+        )
+        result.attempts += attempts
+        return result
+    
+    def should_escalate(self, messages: List[Dict[str, str]]) -> Tuple[bool, str]:
+        """
+        Decide locally whether a request needs the strong tier.
+        
+        Args:
+            messages: Conversation messages
+        
+        Returns:
+            Tuple of (escalate, reason)
+        """
+        user_messages = [m for m in messages if m['role'] == 'user']
+        last_message = user_messages[-1]['content'] if user_messages else ""
+        
+        if len(last_message) > self.max_message_chars:
+            return True, "long message"
+        
+        history_depth = sum(1 for m in messages if m['role'] != 'system')
+        if history_depth > self.max_history_messages:
+            return True, "deep history"
+        
+        if self._keyword_pattern and self._keyword_pattern.search(last_message.lower()):
+            return True, "keyword rule"
+        
+        return False, ""
+    
+    def is_acceptable_answer(self, reply: Optional[str]) -> bool:
+        """
+        Check that a fast tier answer is usable.
+        
+        Args:
+            reply: Fast tier response text
+        
+        Returns:
+            False for empty answers or refusals, True otherwise
+        """
+        if not reply or not reply.strip():
+            return False
+        # Only look at the opening of the answer so a long, useful reply
+        # that mentions "sorry" later on is not discarded.
+        return not self._refusal_pattern.search(reply[:200])
+    
+    def components(self) -> List[BaseLLMProvider]:
+        """Get both tiers."""
+        return [self.fast_provider, self.strong_provider]
+    
+    def warm_up(self) -> None:
+        """Warm up both tiers; only the strong tier is required to succeed."""
+        try:
+            self.fast_provider.warm_up()
+        except Exception as e:
+            logger.warning(f"Fast tier warm-up failed: {str(e)}")
+        self.strong_provider.warm_up()
+    
+    def keep_alive(self) -> None:
+        """Keep connections to both tiers open."""
+        self.fast_provider.keep_alive()
+        self.strong_provider.keep_alive()
+    
+    def close(self) -> None:
+        """Close both tiers."""
+        self.fast_provider.close()
+        self.strong_provider.close()
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get routing counters."""
+        return dict(self.stats)
+    
+    def get_provider_name(self) -> str:
+        """Get provider name."""
+        return (
+            f"Cascade({self.fast_provider.get_provider_name()}"
+            f" -> {self.strong_provider.get_provider_name()})"
+        )
+    
+    def is_available(self) -> bool:
+        """Check if the strong tier is available (the fast tier is optional)."""
+        return self.strong_provider.is_available()
@@ -4,7 +4,8 @@ Ensures all required environment variables are set correctly
 """
 
 import os
-from typing import Dict, List, Tuple
+import re
+from typing import Dict, List, Mapping, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,27 +17,81 @@ class ConfigValidator:
     REQUIRED_VARS = {
         'openai': ['OPENAI_API_KEY'],
         'groq': ['GROQ_API_KEY'],
-        'watsonx': ['WATSONX_API_KEY', 'WATSONX_PROJECT_ID']
+        'watsonx': ['WATSONX_API_KEY', 'WATSONX_PROJECT_ID'],
+        'local': ['LOCAL_MODEL_PATH']
     }
     
     OPTIONAL_VARS = {
-        'openai': ['OPENAI_MODEL'],
-        'groq': ['GROQ_MODEL'],
-        'watsonx': ['WATSONX_MODEL', 'WATSONX_URL']
+        'openai': ['OPENAI_MODEL', 'OPENAI_API_KEYS'],
+        'groq': ['GROQ_MODEL', 'GROQ_API_KEYS'],
+        'watsonx': ['WATSONX_MODEL', 'WATSONX_URL'],
+        'local': ['LOCAL_SLOTS', 'LOCAL_THREADS', 'LOCAL_CONTEXT_SIZE', 'LOCAL_CHAT_FORMAT']
     }
     
+    # Comma-separated key pools that can stand in for the single key variable
+    KEY_POOL_VARS = {
+        'OPENAI_API_KEY': 'OPENAI_API_KEYS',
+        'GROQ_API_KEY': 'GROQ_API_KEYS'
+    }
+    
+    @staticmethod
+    def list_api_keys(key_var: str, env: Optional[Mapping[str, str]] = None) -> List[str]:
+        """
+        List the API keys configured for a key variable.
+        
+        Args:
+            key_var: Single-key variable (e.g. OPENAI_API_KEY)
+            env: Environment snapshot to read (defaults to os.environ)
+        
+        Returns:
+            The key from key_var followed by those in its pool variable
+            (comma- or whitespace-separated), without duplicates
+        """
+        env = os.environ if env is None else env
+        keys = [env.get(key_var, "").strip()]
+        pool_var = ConfigValidator.KEY_POOL_VARS.get(key_var)
+        if pool_var:
+            keys.extend(re.split(r"[\s,]+", env.get(pool_var, "")))
+        return list(dict.fromkeys(k for k in keys if k))
+    
     @staticmethod
-    def validate_provider_config(provider_type: str) -> Tuple[bool, List[str]]:
+    def validate_api_keys(key_var: str, env: Optional[Mapping[str, str]] = None) -> List[str]:
+        """
+        Check a key pool for entries that are listed more than once.
+        
+        Args:
+            key_var: Single-key variable (e.g. OPENAI_API_KEY)
+            env: Environment snapshot to read (defaults to os.environ)
+        
+        Returns:
+            List of problems (empty if valid)
+        """
+        env = os.environ if env is None else env
+        pool_var = ConfigValidator.KEY_POOL_VARS.get(key_var)
+        if not pool_var:
+            return []
+        listed = [k for k in re.split(r"[\s,]+", env.get(pool_var, "")) if k]
+        if len(listed) != len(set(listed)):
+            return [f"{pool_var} lists the same key more than once"]
+        return []
+    
+    @staticmethod
+    def validate_provider_config(
+        provider_type: str,
+        env: Optional[Mapping[str, str]] = None
+    ) -> Tuple[bool, List[str]]:
         """
         Validate configuration for a specific provider.
         
         Args:
             provider_type: Provider type (openai, groq, watsonx)
-            
+            env: Environment snapshot to check (defaults to os.environ)
+        
         Returns:
             Tuple of (is_valid, missing_vars)
         """
         provider_type = provider_type.lower()
+        env = os.environ if env is None else env
         
         if provider_type not in ConfigValidator.REQUIRED_VARS:
             return False, [f"Unknown provider: {provider_type}"]
@@ -45,7 +100,10 @@ class ConfigValidator:
         required = ConfigValidator.REQUIRED_VARS[provider_type]
         
         for var in required:
-            if not os.getenv(var):
+            if var in ConfigValidator.KEY_POOL_VARS:
+                if not ConfigValidator.list_api_keys(var, env):
+                    missing_vars.append(f"{var} or {ConfigValidator.KEY_POOL_VARS[var]}")
+            elif not env.get(var):
                 missing_vars.append(var)
         
         is_valid = len(missing_vars) == 0
@@ -53,40 +111,49 @@ class ConfigValidator:
         return is_valid, missing_vars
     
     @staticmethod
-    def validate_all_configs() -> Dict[str, Dict]:
+    def validate_all_configs(env: Optional[Mapping[str, str]] = None) -> Dict[str, Dict]:
         """
         Validate all provider configurations.
         
+        Args:
+            env: Environment snapshot to check (defaults to os.environ)
+        
         Returns:
             Dictionary with validation results for each provider
         """
         results = {}
         
-        for provider in ['openai', 'groq', 'watsonx']:
-            is_valid, missing = ConfigValidator.validate_provider_config(provider)
+        for provider in ['openai', 'groq', 'watsonx', 'local']:
+            is_valid, missing = ConfigValidator.validate_provider_config(provider, env=env)
+            key_var = ConfigValidator.REQUIRED_VARS[provider][0]
             results[provider] = {
                 'valid': is_valid,
                 'missing_vars': missing,
-                'configured': is_valid
+                'configured': is_valid,
+                'api_keys': len(ConfigValidator.list_api_keys(key_var, env)) if key_var in ConfigValidator.KEY_POOL_VARS else None
             }
         
         return results
     
     @staticmethod
-    def get_config_summary() -> str:
+    def get_config_summary(env: Optional[Mapping[str, str]] = None) -> str:
         """
         Get a human-readable configuration summary.
         
+        Args:
+            env: Environment snapshot to check (defaults to os.environ)
+        
         Returns:
             Formatted string with configuration status
         """
-        results = ConfigValidator.validate_all_configs()
+        results = ConfigValidator.validate_all_configs(env=env)
         
         summary = ["LLM Provider Configuration Status:", "="*50]
         
         for provider, status in results.items():
             icon = "✓" if status['valid'] else "✗"
-            summary.append(f"{icon} {provider.upper()}: {'Configured' if status['valid'] else 'Not configured'}")
+            keys = f" ({status['api_keys']} API keys)" if (status['api_keys'] or 0) > 1 else ""
+            summary.append(f"{icon} {provider.upper()}: {'Configured' if status['valid'] else 'Not configured'}{keys}")
             if status['missing_vars']:
                 summary.append(f"   Missing: {', '.join(status['missing_vars'])}")
         
@@ -0,0 +1,146 @@
+"""
+Connection pooling, pre-warming and keep-alive for HTTP-based providers
+Moves DNS, TCP and TLS setup off the request path by opening pooled
+connections at startup and keeping them from expiring while idle.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+import httpx
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Requests sent by the current thread through clients from build_http_client()
+_sent = threading.local()
+
+
+def _count_request(request: httpx.Request):
+    """httpx request hook; counts every attempt, including SDK retries."""
+    _sent.count = getattr(_sent, "count", 0) + 1
+
+
+def requests_sent() -> int:
+    """
+    Number of HTTP requests the current thread has sent so far.
+    
+    Providers call an SDK synchronously, so the difference before and after
+    a call is the number of attempts it took, retries included.
+    """
+    return getattr(_sent, "count", 0)
+
+
+def build_http_client(
+    keepalive_expiry: float = 120.0,
+    max_keepalive_connections: int = 20,
+    max_connections: int = 100,
+    on_response: Optional[Callable[[httpx.Response], None]] = None
+) -> httpx.Client:
+    """
+    Create the HTTP client shared by an SDK client.
+    
+    httpx closes idle pooled connections after 5 seconds by default, which
+    makes most chatbot requests pay for a fresh TLS handshake. A longer
+    keepalive_expiry combined with the heartbeat keeps them reusable.
+    
+    Args:
+        keepalive_expiry: Seconds an idle pooled connection is kept open
+        max_keepalive_connections: Maximum idle connections kept in the pool
+        max_connections: Maximum concurrent connections
+        on_response: Called with every response (retries included) once its headers arrive
+    
+    Returns:
+        Configured httpx.Client
+    """
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        ),
+        follow_redirects=True,
+        event_hooks={
+            "request": [_count_request],
+            "response": [on_response] if on_response else []
+        }
+    )
+
+
+def open_connections(request: Callable[[], object], count: int):
+    """
+    Open up to count pooled connections by issuing concurrent requests.
+    
+    Requests that run at the same time cannot share a connection, so the
+    pool ends up holding count warm connections afterwards.
+    
+    Args:
+        request: Cheap authenticated request (e.g. listing models)
+        count: Number of connections to open
+    
+    Raises:
+        Exception: If every request fails
+    """
+    count = max(1, count)
+    with ThreadPoolExecutor(max_workers=count, thread_name_prefix="warmup") as executor:
+        futures = [executor.submit(request) for _ in range(count)]
+        errors = [f.exception() for f in futures if f.exception() is not None]
+    
+    if len(errors) == count:
+        raise errors[0]
+    if errors:
+        logger.warning(f"{len(errors)} of {count} warm-up request(s) failed: {str(errors[0])}")
+
+
+class KeepAliveHeartbeat:
+    """
+    Low-rate background heartbeat that keeps provider connections warm.
+    
+    Every interval seconds, calls keep_alive() on each provider returned by
+    providers_fn. The interval should be shorter than the HTTP client's
+    keepalive_expiry so pooled connections never go idle long enough to close.
+    """
+    
+    def __init__(self, providers_fn: Callable[[], Iterable], interval: float):
+        """
+        Initialize heartbeat.
+        
+        Args:
+            providers_fn: Returns the providers currently serving traffic
+            interval: Seconds between heartbeats
+        """
+        self.providers_fn = providers_fn
+        self.interval = interval
+        self.beats = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Start the heartbeat thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="keepalive-heartbeat", daemon=True)
+        self._thread.start()
+        logger.info(f"Keep-alive heartbeat started (every {self.interval:.0f}s)")
+    
+    def stop(self):
+        """Stop the heartbeat thread."""
+        self._stop.set()
+    
+    def _run(self):
+        """Heartbeat loop."""
+        while not self._stop.wait(self.interval):
+            for provider in self.providers_fn():
+                started = time.time()
+                try:
+                    provider.keep_alive()
+                    self.beats += 1
+                    logger.debug(
+                        f"Heartbeat to {provider.get_provider_name()} "
+                        f"took {(time.time() - started) * 1000:.0f}ms"
+                    )
+                except Exception as e:
+                    self.failures += 1
+                    logger.warning(f"Heartbeat to {provider.get_provider_name()} failed: {str(e)}")
@@ -3,10 +3,13 @@ LLM Provider Factory
 Implements Abstract Factory pattern for creating LLM provider instances
 """
 
+import os
 from typing import Optional
 from .base import BaseLLMProvider
 from .openai_provider import OpenAIProvider
 from .groq_provider import GroqProvider
+from .cascade_provider import CascadeProvider
+from .local_provider import LocalProvider
 # from .watsonx_provider import WatsonXProvider
 import logging
 
@@ -16,13 +19,16 @@ logger = logging.getLogger(__name__)
 class LLMProviderFactory:
     """
     Factory class for creating LLM provider instances.
-    Supports OpenAI, Groq, and WatsonX providers.
+    Supports OpenAI, Groq, and WatsonX providers, a local CPU model, plus a
+    cascade that combines two of them.
     """
     
     # Supported provider types
     OPENAI = "openai"
     GROQ = "groq"
     WATSONX = "watsonx"
+    CASCADE = "cascade"
+    LOCAL = "local"
     
     @staticmethod
     def create_provider(
@@ -35,14 +41,14 @@ class LLMProviderFactory:
         Create and return an LLM provider instance based on the provider type.
         
         Args:
-            provider_type: Type of provider ('openai', 'groq', 'watsonx')
+            provider_type: Type of provider ('openai', 'groq', 'watsonx', 'local', 'cascade')
             api_key: API key for the provider
             model: Optional model name (uses default if not provided)
             **config: Additional provider-specific configuration
-            
+        
         Returns:
             BaseLLMProvider instance
-            
+        
         Raises:
             ValueError: If provider_type is not supported
             Exception: If provider initialization fails
@@ -58,26 +64,55 @@ class LLMProviderFactory:
                     api_key=api_key,
                     model=model,
                     max_tokens=config.get('max_tokens', 500),
-                    temperature=config.get('temperature', 0.7)
+                    temperature=config.get('temperature', 0.7),
+                    keepalive_expiry=config.get('keepalive_expiry', 120.0),
+                    warmup_connections=config.get('warmup_connections', 2),
+                    pool_keys=LLMProviderFactory._pool_keys(api_key, config.get('OPENAI_API_KEYS')),
+                    key_cooldown=config.get('KEY_COOLDOWN_SECONDS', 10.0)
                 )
-                
+            
             elif provider_type == LLMProviderFactory.GROQ:
                 model = model or config.get('GROQ_MODEL', 'llama3-70b-8192')
                 provider = GroqProvider(
                     api_key=api_key,
                     model=model,
                     max_tokens=config.get('max_tokens', 500),
-                    temperature=config.get('temperature', 0.7)
+                    temperature=config.get('temperature', 0.7),
+                    keepalive_expiry=config.get('keepalive_expiry', 120.0),
+                    warmup_connections=config.get('warmup_connections', 2),
+                    pool_keys=LLMProviderFactory._pool_keys(api_key, config.get('GROQ_API_KEYS')),
+                    key_cooldown=config.get('KEY_COOLDOWN_SECONDS', 10.0)
+                )
+            
+            elif provider_type == LLMProviderFactory.LOCAL:
+                # model may name another GGUF file (e.g. a cascade tier's);
+                # hosted model names fall back to LOCAL_MODEL_PATH
+                model = model if model and os.path.isfile(model) else config.get('LOCAL_MODEL_PATH')
+                provider = LocalProvider(
+                    api_key=api_key,
+                    model=model,
+                    max_tokens=config.get('max_tokens', 500),
+                    temperature=config.get('temperature', 0.7),
+                    slots=config.get('LOCAL_SLOTS', 1),
+                    threads=config.get('LOCAL_THREADS') or None,
+                    context_size=config.get('LOCAL_CONTEXT_SIZE', 2048),
+                    chat_format=config.get('LOCAL_CHAT_FORMAT'),
+                    prompt_cache_mb=config.get('LOCAL_PROMPT_CACHE_MB', 64.0),
+                    slot_timeout=config.get('LOCAL_SLOT_TIMEOUT', 30.0)
                 )
-                
+            
+            elif provider_type == LLMProviderFactory.CASCADE:
+                provider = LLMProviderFactory._create_cascade(api_key, **config)
+                model = provider.model
+            
             # elif provider_type == LLMProviderFactory.WATSONX:
             #     model = model or config.get('WATSONX_MODEL', 'ibm/granite-13b-chat-v2')
             #     project_id = config.get('WATSONX_PROJECT_ID')
             #     url = config.get('WATSONX_URL', 'https://us-south.ml.cloud.ibm.com')
-                
+            
             #     if not project_id:
             #         raise ValueError("WatsonX requires WATSONX_PROJECT_ID in configuration")
-                
+            
             #     provider = WatsonXProvider(
             #         api_key=api_key,
             #         model=model,
@@ -86,12 +121,13 @@ class LLMProviderFactory:
             #         max_tokens=config.get('max_tokens', 500),
             #         temperature=config.get('temperature', 0.7)
             #     )
-                
+            
             else:
                 raise ValueError(
                     f"Unsupported provider type: {provider_type}. "
                     f"Supported types: {LLMProviderFactory.OPENAI}, "
-                    f"{LLMProviderFactory.GROQ}, {LLMProviderFactory.WATSONX}"
+                    f"{LLMProviderFactory.GROQ}, {LLMProviderFactory.WATSONX}, "
+                    f"{LLMProviderFactory.LOCAL}, {LLMProviderFactory.CASCADE}"
                 )
             
             # Verify provider is available
@@ -100,11 +136,76 @@ class LLMProviderFactory:
             
             logger.info(f"Successfully created {provider.get_provider_name()} provider with model: {model}")
             return provider
-            
+        
         except Exception as e:
             logger.error(f"Failed to create provider {provider_type}: {str(e)}")
             raise
     
+    @staticmethod
+    def _pool_keys(api_key: str, pool) -> tuple:
+        """
+        Get the key pool a provider created with api_key may spread requests over.
+        
+        A key outside the configured pool (e.g. a tenant's own key) is used alone.
+        
+        Args:
+            api_key: API key the provider is created with
+            pool: Configured keys of the provider type
+        
+        Returns:
+            The pool's keys, or () if api_key is not one of them
+        """
+        pool = tuple(pool or ())
+        return pool if api_key in pool else ()
+    
+    @staticmethod
+    def _create_cascade(api_key: str, **config) -> CascadeProvider:
+        """
+        Build a cascade from two single-model providers.
+        
+        Tier settings come from CASCADE_* config keys. Each tier uses its own
+        key from config['api_keys'] when present, falling back to api_key.
+        
+        Args:
+            api_key: Default API key for both tiers
+            **config: Provider configuration including CASCADE_* keys
+        
+        Returns:
+            CascadeProvider instance
+        """
+        api_keys = config.get('api_keys') or {}
+        tiers = {}
+        
+        for tier, default_type, default_model in (
+            ('FAST', LLMProviderFactory.GROQ, 'llama3-8b-8192'),
+            ('STRONG', LLMProviderFactory.GROQ, 'llama3-70b-8192'),
+        ):
+            tier_type = (config.get(f'CASCADE_{tier}_PROVIDER') or default_type).lower().strip()
+            if tier_type == LLMProviderFactory.CASCADE:
+                raise ValueError("Cascade tiers cannot themselves be cascades")
+            
+            tiers[tier] = LLMProviderFactory.create_provider(
+                provider_type=tier_type,
+                api_key=api_keys.get(tier_type) or api_key,
+                model=config.get(f'CASCADE_{tier}_MODEL') or default_model,
+                **{k: v for k, v in config.items() if k != 'api_keys'}
+            )
+        
+        keywords = config.get('CASCADE_KEYWORDS')
+        if isinstance(keywords, str):
+            keywords = keywords.split(',')
+        
+        return CascadeProvider(
+            fast_provider=tiers['FAST'],
+            strong_provider=tiers['STRONG'],
+            max_message_chars=config.get('CASCADE_MAX_MESSAGE_CHARS', 280),
+            max_history_messages=config.get('CASCADE_MAX_HISTORY', 6),
+            escalation_keywords=keywords,
+            fast_max_tokens=config.get('CASCADE_FAST_MAX_TOKENS'),
+            max_tokens=config.get('max_tokens', 500),
+            temperature=config.get('temperature', 0.7)
+        )
+    
     @staticmethod
     def get_supported_providers() -> list:
         """
@@ -117,4 +218,6 @@ class LLMProviderFactory:
             LLMProviderFactory.OPENAI,
             LLMProviderFactory.GROQ,
             # LLMProviderFactory.WATSONX
+            LLMProviderFactory.LOCAL,
+            LLMProviderFactory.CASCADE
         ]
@@ -2,9 +2,11 @@
 Groq LLM Provider Implementation
 """
 
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
 from groq import Groq
-from .base import BaseLLMProvider
+from .base import BaseLLMProvider, GenerationResult, usage_tokens
+from .connection import requests_sent
+from .key_pool import KeyPool
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,15 +28,23 @@ class GroqProvider(BaseLLMProvider):
             **config: Additional configuration
         """
         super().__init__(api_key, model, **config)
-        self.client = Groq(api_key=api_key) if api_key else None
+        self.warmup_connections = config.get('warmup_connections', 2)
+        # api_key plus any other keys of the pool (pool_keys), each with its own client
+        self.keys = KeyPool(
+            [api_key, *config.get('pool_keys', ())],
+            lambda key, http_client: Groq(api_key=key, http_client=http_client),
+            keepalive_expiry=config.get('keepalive_expiry', 120.0),
+            cooldown=config.get('key_cooldown', 10.0)
+        ) if api_key else None
+        self.client = self.keys.primary if self.keys else None
     
-    def generate_response(
+    def _generate(
         self,
         messages: List[Dict[str, str]],
         max_tokens: Optional[int] = None,
         temperature: Optional[float] = None,
         **kwargs
-    ) -> str:
+    ) -> GenerationResult:
         """
         Generate response using Groq API.
         
@@ -43,10 +53,10 @@ class GroqProvider(BaseLLMProvider):
             max_tokens: Maximum tokens in response
             temperature: Sampling temperature
             **kwargs: Additional Groq-specific parameters
-            
+        
         Returns:
-            Generated response text
-            
+            GenerationResult with the reported usage and finish reason
+        
         Raises:
             Exception: If API call fails
         """
@@ -63,23 +73,136 @@ class GroqProvider(BaseLLMProvider):
             
             logger.info(f"Calling Groq API with model: {self.model}")
             
-            response = self.client.chat.completions.create(
+            sent = requests_sent()
+            response = self.keys.call(lambda client: client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 max_tokens=max_tokens,
                 temperature=temperature,
                 **kwargs
-            )
+            ))
             
-            reply = response.choices[0].message.content
+            choice = response.choices[0]
+            reply = choice.message.content or ""
+            prompt_tokens, completion_tokens = usage_tokens(response.usage)
             logger.info(f"Groq response received: {len(reply)} characters")
             
-            return reply
+            return GenerationResult(
+                text=reply,
+                model=getattr(response, "model", None) or self.model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                finish_reason=choice.finish_reason,
+                attempts=max(1, requests_sent() - sent)
+            )
+        
+        except Exception as e:
+            logger.error(f"Groq API error: {str(e)}")
+            raise Exception(f"Groq API call failed: {str(e)}")
+    
+    def _stream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int],
+        temperature: Optional[float],
+        result: GenerationResult,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        Stream a response from the Groq API as text deltas.
+        
+        The finish reason, the attempt count and (when the API reports it)
+        usage are set on result.
+        
+        Args:
+            messages: Conversation messages
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature
+            result: Result to fill in
+            **kwargs: Additional Groq-specific parameters
+        
+        Yields:
+            Pieces of the response text, in order
+        
+        Raises:
+            Exception: If API call fails
+        """
+        if not self.client:
+            raise Exception("Groq client not initialized. Check API key.")
+        
+        if not self.validate_messages(messages):
+            raise ValueError("Invalid message format")
+        
+        try:
+            logger.info(f"Streaming from Groq API with model: {self.model}")
             
+            sent = requests_sent()
+            with self.keys.stream_call(lambda client: client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=max_tokens or self.config.get('max_tokens', 500),
+                temperature=temperature or self.config.get('temperature', 0.7),
+                stream=True,
+                **kwargs
+            )) as stream:
+                result.attempts = max(1, requests_sent() - sent)
+                
+                for chunk in stream:
+                    if getattr(chunk, "usage", None) is not None:
+                        result.prompt_tokens, result.completion_tokens = usage_tokens(chunk.usage)
+                    # Groq reports usage on the final chunk under x_groq
+                    x_groq = getattr(chunk, "x_groq", None)
+                    if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+                        result.prompt_tokens, result.completion_tokens = usage_tokens(x_groq.usage)
+                    if not chunk.choices:
+                        continue
+                    if getattr(chunk, "model", None):
+                        result.model = chunk.model
+                    if chunk.choices[0].finish_reason:
+                        result.finish_reason = chunk.choices[0].finish_reason
+                    if chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+        
         except Exception as e:
             logger.error(f"Groq API error: {str(e)}")
             raise Exception(f"Groq API call failed: {str(e)}")
     
+    def warm_up(self) -> None:
+        """
+        Open pooled connections and initialize the SDK before live traffic.
+        
+        Lists models with every key instead of running a completion, which
+        exercises DNS, TCP, TLS and authentication without spending tokens.
+        Keys the API rejects are disabled.
+        """
+        if not self.client:
+            raise Exception("Groq client not initialized. Check API key.")
+        
+        # Touch the lazily created resource objects used on the request path
+        self.client.chat.completions
+        self.keys.warm_up(self._list_models, self.warmup_connections)
+    
+    def check_health(self) -> None:
+        """Probe the API by listing models, which authenticates without spending tokens."""
+        if not self.client:
+            raise Exception("Groq client not initialized. Check API key.")
+        self.keys.call(self._list_models)
+    
+    def keep_alive(self) -> None:
+        """Refresh pooled connections so they do not expire while idle."""
+        if self.keys:
+            self.keys.keep_alive(self._list_models, self.warmup_connections)
+    
+    @staticmethod
+    def _list_models(client):
+        """Cheap authenticated request; no SDK retries so probes stay light."""
+        return client.with_options(max_retries=0).models.list()
+    
+    def close(self) -> None:
+        """Close the clients of every key."""
+        if self.keys:
+            self.keys.close()
+    
     def get_provider_name(self) -> str:
         """Get provider name."""
         return "Groq"
@@ -0,0 +1,173 @@
+"""
+Background deep health probing for LLM providers
+Periodically runs a cheap health check against each configured provider
+and caches the outcome, so health endpoints and routing decisions can read
+upstream status in constant time instead of calling the provider.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, Iterable, Optional
+from .base import BaseLLMProvider
+from .key_pool import mask_key
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProbeResult:
+    """Outcome of the latest probe against one provider"""
+    provider: str
+    model: str
+    healthy: bool
+    latency_ms: float
+    checked_at: float
+    error: Optional[str] = None
+    consecutive_failures: int = 0
+
+
+def provider_label(provider: BaseLLMProvider) -> str:
+    """Readable name of a provider instance: provider, model and masked API key."""
+    label = f"{provider.get_provider_name()}:{provider.model}"
+    return f"{label} ({mask_key(provider.api_key)})" if provider.api_key else label
+
+
+class HealthProber:
+    """
+    Periodic upstream prober with a cached result per provider.
+    
+    A provider is reported unhealthy once failure_threshold probes in a row
+    have failed, so a single transient error does not flip readiness.
+    Providers that have not been probed yet are assumed healthy. Results
+    are kept per provider instance, so a tenant provider with its own API
+    key is probed on its own even if it uses the primary's model.
+    """
+    
+    def __init__(
+        self,
+        providers_fn: Callable[[], Iterable[BaseLLMProvider]],
+        interval: float = 60.0,
+        failure_threshold: int = 2
+    ):
+        """
+        Initialize health prober.
+        
+        Args:
+            providers_fn: Returns the providers currently configured
+            interval: Seconds between probe rounds
+            failure_threshold: Consecutive failures before a provider is unhealthy
+        """
+        self.providers_fn = providers_fn
+        self.interval = interval
+        self.failure_threshold = max(1, failure_threshold)
+        self._results: Dict[BaseLLMProvider, ProbeResult] = {}
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Start the background probe thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+        self._thread.start()
+        logger.info(f"Health prober started (every {self.interval:.0f}s)")
+    
+    def stop(self):
+        """Stop the background probe thread."""
+        self._stop.set()
+    
+    def _run(self):
+        """Probe loop: probe immediately, then every interval seconds."""
+        while True:
+            self.probe_all()
+            if self._stop.wait(self.interval):
+                break
+    
+    def probe_all(self):
+        """Probe every configured provider once and replace the cached results."""
+        results = {}
+        for provider in self._targets():
+            results[provider] = self.probe(provider, self._results.get(provider))
+        # Swap the whole dict so readers never see a partially updated round
+        self._results = results
+    
+    def _targets(self) -> Iterable[BaseLLMProvider]:
+        """Expand composite providers (e.g. cascade tiers) into probe targets."""
+        seen = {}
+        for provider in self.providers_fn():
+            for component in provider.components():
+                seen.setdefault(id(component), component)
+        return seen.values()
+    
+    def probe(self, provider: BaseLLMProvider, previous: Optional[ProbeResult] = None) -> ProbeResult:
+        """
+        Run one health check against a provider.
+        
+        Hosted providers check with a free request (e.g. listing models), so
+        probing spends no tokens.
+        
+        Args:
+            provider: Provider to probe
+            previous: Previous result, used to count consecutive failures
+        
+        Returns:
+            ProbeResult for this probe
+        """
+        started = time.time()
+        try:
+            provider.check_health()
+            error = None
+        except Exception as e:
+            error = str(e)
+        latency_ms = (time.time() - started) * 1000
+        
+        failures = 0
+        if error:
+            failures = (previous.consecutive_failures if previous else 0) + 1
+            logger.warning(f"Health probe to {provider.get_provider_name()} failed ({failures}x): {error}")
+        
+        return ProbeResult(
+            provider=provider.get_provider_name(),
+            model=provider.model,
+            healthy=failures < self.failure_threshold,
+            latency_ms=latency_ms,
+            checked_at=time.time(),
+            error=error,
+            consecutive_failures=failures
+        )
+    
+    def get_result(self, provider: BaseLLMProvider) -> Optional[ProbeResult]:
+        """Get the cached probe result for a provider (None if not probed yet)."""
+        return self._results.get(provider)
+    
+    def is_healthy(self, provider: BaseLLMProvider) -> bool:
+        """
+        Check cached health of a provider.
+        
+        A composite provider is healthy if any of its components is, since
+        it can still serve requests through that component.
+        
+        Args:
+            provider: Provider to check
+        
+        Returns:
+            True unless the provider has failed failure_threshold probes in a row
+        """
+        components = provider.components()
+        if len(components) > 1:
+            return any(self.is_healthy(c) for c in components)
+        
+        result = self._results.get(provider)
+        return result is None or result.healthy
+    
+    def get_status(self) -> Dict[str, Dict]:
+        """Get all cached probe results keyed by provider label."""
+        status = {}
+        for provider, result in self._results.items():
+            label = provider_label(provider)
+            if label in status:
+                label = f"{label} #{sum(1 for k in status if k.startswith(label)) + 1}"
+            status[label] = asdict(result)
+        return status
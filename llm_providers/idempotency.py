@@ -0,0 +1,130 @@
+"""
+Idempotency keys for chat requests
+Lets clients retry a request with the same Idempotency-Key without paying
+for another generation: duplicates wait on the in-flight result or get the
+stored response while it is still fresh.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyConflict(Exception):
+    """Raised when a key is reused with a different request body"""
+    pass
+
+
+def fingerprint(body: str) -> str:
+    """Hash a serialized request body."""
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    fingerprint: str
+    task: "asyncio.Task"
+    expires_at: float = float("inf")  # Set when the task completes
+
+
+class IdempotencyStore:
+    """
+    Bounded, TTL-based store of in-flight and completed requests by key.
+    
+    The first request for a key runs as its own task, so it completes (and
+    is stored) even if that client disconnects; duplicates await the same
+    task. Failed requests and results rejected by should_store are not kept,
+    so a retry runs again. Must be used from a single event loop.
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0):
+        """
+        Initialize idempotency store.
+        
+        Args:
+            max_entries: Maximum keys kept (oldest are evicted first)
+            ttl: Seconds a completed response is kept
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.stats = {"executed": 0, "joined_in_flight": 0, "replayed": 0, "conflicts": 0}
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    async def run(
+        self,
+        key: str,
+        body_fingerprint: str,
+        compute: Callable[[], Awaitable[Any]],
+        should_store: Callable[[Any], bool] = lambda result: True,
+        admit: Optional[Callable[[], None]] = None
+    ) -> Tuple[Any, bool]:
+        """
+        Run compute once per key and share its result with duplicates.
+        
+        Args:
+            key: Client-supplied idempotency key
+            body_fingerprint: Fingerprint of the request body
+            compute: Produces the response
+            should_store: Whether a result may be replayed (e.g. only successes)
+            admit: Called before compute runs for a new key (e.g. a rate
+                check); duplicates skip it, and an exception it raises
+                rejects the request without storing the key
+        
+        Returns:
+            (result, replayed) where replayed is True for a duplicate request
+        
+        Raises:
+            IdempotencyConflict: If the key was used with a different body
+        """
+        self._evict()
+        entry = self._entries.get(key)
+        
+        if entry is not None:
+            if entry.fingerprint != body_fingerprint:
+                self.stats["conflicts"] += 1
+                raise IdempotencyConflict("Idempotency-Key was already used with a different request body")
+            self.stats["replayed" if entry.task.done() else "joined_in_flight"] += 1
+            return await asyncio.shield(entry.task), True
+        
+        if admit:
+            admit()
+        task = asyncio.ensure_future(compute())
+        entry = self._entries[key] = _Entry(body_fingerprint, task)
+        task.add_done_callback(lambda t: self._completed(key, entry, should_store))
+        self.stats["executed"] += 1
+        
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        
+        return await asyncio.shield(task), False
+    
+    def _completed(self, key: str, entry: _Entry, should_store: Callable[[Any], bool]):
+        """Start the TTL of a stored result, or forget a failed request."""
+        task = entry.task
+        keep = not task.cancelled() and task.exception() is None and should_store(task.result())
+        if keep:
+            entry.expires_at = time.monotonic() + self.ttl
+        elif self._entries.get(key) is entry:
+            del self._entries[key]
+    
+    def _evict(self):
+        """Drop expired entries from the front (oldest first)."""
+        now = time.monotonic()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            del self._entries[key]
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get counters and the number of stored keys."""
+        return {**self.stats, "keys": len(self._entries)}
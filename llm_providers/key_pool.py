@@ -0,0 +1,323 @@
+"""
+API key pools for hosted providers
+Spreads requests over several API keys of one provider, each with its own
+SDK client and rate-limit state, so throughput is no longer capped by a
+single key's requests- and tokens-per-minute limits.
+"""
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+import httpx
+from .connection import build_http_client, open_connections
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a rate-limit reset value ("1s", "6m0s", "59.5ms", or plain seconds).
+    
+    Returns:
+        Seconds, or None if the value is missing or malformed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if not parts or "".join(number + unit for number, unit in parts) != value:
+        return None
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+def mask_key(key: str) -> str:
+    """Show only the last four characters of a key."""
+    return f"...{key[-4:]}" if len(key) >= 12 else "..."
+
+
+class PooledKey:
+    """One API key: its client and the rate-limit state last reported for it"""
+    
+    def __init__(self, index: int, key: str):
+        self.index = index
+        self.label = f"#{index + 1} {mask_key(key)}"
+        self.client = None
+        self.limit_requests: Optional[int] = None
+        self.remaining_requests: Optional[int] = None
+        self.requests_reset_at = 0.0
+        self.limit_tokens: Optional[int] = None
+        self.remaining_tokens: Optional[int] = None
+        self.tokens_reset_at = 0.0
+        self.cooldown_until = 0.0
+        self.disabled = False  # Rejected by the provider (e.g. revoked)
+        self.in_flight = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.last_used = 0.0
+    
+    def headroom(self, now: float) -> float:
+        """
+        Fraction of the tighter of the request and token limits still unused.
+        
+        Counts resets that have already passed and requests in flight; keys
+        whose limits are not known yet count as fully free.
+        """
+        fractions = [1.0]
+        if self.limit_requests:
+            remaining = self.remaining_requests if now < self.requests_reset_at else self.limit_requests
+            fractions.append((remaining - self.in_flight) / self.limit_requests)
+        if self.limit_tokens:
+            remaining = self.remaining_tokens if now < self.tokens_reset_at else self.limit_tokens
+            fractions.append(remaining / self.limit_tokens)
+        return min(fractions)
+    
+    def usable(self, now: float) -> bool:
+        return not self.disabled and now >= self.cooldown_until
+
+
+class KeyPool:
+    """
+    Pool of API keys for one provider.
+    
+    Every key gets its own SDK client on its own HTTP client, whose response
+    hook reads the x-ratelimit-* headers of each response into the key's
+    state. Calls go to the usable key with the most headroom, ties going to
+    the key with fewer requests in flight and then the least recently used.
+    
+    A 429 puts its key in cooldown for the retry-after period (or until
+    the exhausted limit resets). While another key is usable, the SDK is
+    told not to retry the 429 on the same key, and the call fails over to
+    the next key instead. With a single key, or once every key is cooling
+    down, the SDK's own retry and backoff apply as before.
+    """
+    
+    def __init__(
+        self,
+        keys: Sequence[str],
+        make_client: Callable[[str, httpx.Client], object],
+        keepalive_expiry: float = 120.0,
+        cooldown: float = 10.0
+    ):
+        """
+        Args:
+            keys: API keys (duplicates are dropped)
+            make_client: Builds an SDK client from a key and an HTTP client
+            keepalive_expiry: Seconds an idle pooled connection is kept open
+            cooldown: Seconds a key rests after a 429 that gives no retry-after
+        """
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.keys: List[PooledKey] = []
+        for key in dict.fromkeys(k for k in keys if k):
+            pooled = PooledKey(len(self.keys), key)
+            pooled.client = make_client(
+                key,
+                build_http_client(
+                    keepalive_expiry=keepalive_expiry,
+                    on_response=partial(self._observe, pooled)
+                )
+            )
+            self.keys.append(pooled)
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    @property
+    def primary(self):
+        """Client of the first key."""
+        return self.keys[0].client
+    
+    def _observe(self, key: PooledKey, response: httpx.Response):
+        """Response hook: record the rate-limit headers, and cool the key down on a 429."""
+        headers = response.headers
+        now = time.monotonic()
+        with self._lock:
+            for kind in ("requests", "tokens"):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if not (limit and remaining and limit.isdigit() and remaining.isdigit()):
+                    continue
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                setattr(key, f"limit_{kind}", int(limit))
+                setattr(key, f"remaining_{kind}", int(remaining))
+                setattr(key, f"{kind}_reset_at", now + (reset if reset is not None else 60.0))
+            
+            if response.status_code != 429:
+                return
+            
+            key.rate_limited += 1
+            retry_after = parse_duration(headers.get("retry-after"))
+            if headers.get("retry-after-ms"):
+                retry_after = parse_duration(headers["retry-after-ms"] + "ms") or retry_after
+            if retry_after is None:
+                exhausted = [
+                    getattr(key, f"{kind}_reset_at") - now
+                    for kind in ("requests", "tokens")
+                    if getattr(key, f"remaining_{kind}") == 0
+                ]
+                retry_after = max(exhausted) if exhausted else self.cooldown
+            key.cooldown_until = now + max(retry_after, 0.0)
+            
+            if any(k is not key and k.usable(now) for k in self.keys):
+                # Fail over in call() rather than wait on this key
+                headers["x-should-retry"] = "false"
+        logger.warning(f"API key {key.label} rate limited; cooling down for {retry_after:.1f}s")
+    
+    def _acquire(self, exclude: set) -> Optional[PooledKey]:
+        """Pick the key for the next call and count it as in flight."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [k for k in self.keys if k.index not in exclude and k.usable(now)]
+            if not candidates and not exclude:
+                # Every key is cooling down: use the one that recovers first
+                # and let the SDK back off on it
+                candidates = [min((k for k in self.keys if not k.disabled), key=lambda k: k.cooldown_until, default=None)]
+            candidates = [k for k in candidates if k is not None]
+            if not candidates:
+                return None
+            key = min(candidates, key=lambda k: (-k.headroom(now), k.in_flight, k.last_used))
+            key.in_flight += 1
+            key.requests += 1
+            key.last_used = now
+            return key
+    
+    def _release(self, key: PooledKey):
+        with self._lock:
+            key.in_flight -= 1
+    
+    def _run(self, request: Callable[[object], T]) -> Tuple[PooledKey, T]:
+        """Run request(client), failing over on 429s; the key is returned still in flight."""
+        tried = set()
+        while True:
+            key = self._acquire(tried)
+            if key is None:
+                raise Exception("No usable API key left for this provider (keys rejected or rate limited)")
+            try:
+                return key, request(key.client)
+            except Exception as e:
+                self._release(key)
+                if getattr(e, "status_code", None) != 429:
+                    raise
+                tried.add(key.index)
+                if not any(k.usable(time.monotonic()) and k.index not in tried for k in self.keys):
+                    raise
+                logger.info(f"Retrying with another API key after a 429 on {key.label}")
+    
+    def call(self, request: Callable[[object], T]) -> T:
+        """
+        Run request(client) with the key that has the most headroom.
+        
+        Args:
+            request: Makes one SDK call with the given client
+        
+        Returns:
+            The request's result
+        
+        Raises:
+            Exception: The request's error; a rate-limit error is only raised
+                once no other usable key is left
+        """
+        key, result = self._run(request)
+        self._release(key)
+        return result
+    
+    @contextmanager
+    def stream_call(self, request: Callable[[object], T]) -> Iterator[T]:
+        """
+        Open a stream like call(), holding its key until the stream is closed.
+        
+        The SDK returns a stream once the response headers arrive, while the
+        reply is still being generated. The key counts as in flight until
+        the block exits, which also closes the stream.
+        
+        Args:
+            request: Makes one streaming SDK call with the given client
+        
+        Yields:
+            The stream returned by request
+        
+        Raises:
+            Exception: As for call()
+        """
+        key, stream = self._run(request)
+        try:
+            yield stream
+        finally:
+            try:
+                stream.close()
+            finally:
+                self._release(key)
+    
+    def warm_up(self, request: Callable[[object], object], connections: int) -> None:
+        """
+        Validate every key and open its pooled connections.
+        
+        Keys the provider rejects (401/403) are disabled and logged, so a
+        revoked key is found at startup rather than on live traffic.
+        
+        Args:
+            request: Cheap authenticated request made with a client (e.g. listing models)
+            connections: Connections to open per key
+        
+        Raises:
+            Exception: If no key works
+        """
+        errors = []
+        for key in self.keys:
+            try:
+                open_connections(partial(request, key.client), connections)
+                key.disabled = False
+            except Exception as e:
+                errors.append(e)
+                if getattr(e, "status_code", None) in (401, 403):
+                    key.disabled = True
+                    logger.error(f"API key {key.label} was rejected and is disabled: {str(e)}")
+                else:
+                    logger.warning(f"Warm-up with API key {key.label} failed: {str(e)}")
+        if len(errors) == len(self.keys):
+            raise errors[0]
+    
+    def keep_alive(self, request: Callable[[object], object], connections: int) -> None:
+        """Refresh the pooled connections of every enabled key."""
+        for key in self.keys:
+            if not key.disabled:
+                open_connections(partial(request, key.client), connections)
+    
+    def close(self) -> None:
+        """Close every key's client."""
+        for key in self.keys:
+            key.client.close()
+    
+    def get_stats(self) -> List[Dict]:
+        """Get each key's requests, rate-limit state and utilization."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "key": key.label,
+                    "requests": key.requests,
+                    "in_flight": key.in_flight,
+                    "rate_limited": key.rate_limited,
+                    "cooldown_seconds": round(max(key.cooldown_until - now, 0.0), 1),
+                    "disabled": key.disabled,
+                    "remaining_requests": key.remaining_requests if now < key.requests_reset_at else key.limit_requests,
+                    "limit_requests": key.limit_requests,
+                    "remaining_tokens": key.remaining_tokens if now < key.tokens_reset_at else key.limit_tokens,
+                    "limit_tokens": key.limit_tokens,
+                    "utilization": round(1.0 - key.headroom(now), 4) if key.limit_requests or key.limit_tokens else None
+                }
+                for key in self.keys
+            ]
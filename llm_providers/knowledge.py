@@ -0,0 +1,377 @@
+"""
+Local knowledge index for site FAQ and documentation
+BM25 keyword search (NumPy-vectorized over posting arrays) with an optional
+embedding matrix, used to answer high-confidence FAQ matches without an LLM
+call and to ground other answers in the site's own content.
+"""
+
+import json
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from how i in is it me my of "
+    "on or our so that the this to us was we what when where which who will "
+    "with you your".split()
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+@dataclass
+class Document:
+    """A searchable passage, optionally an FAQ entry with a canned answer"""
+    id: str
+    text: str
+    title: Optional[str] = None
+    answer: Optional[str] = None
+    source: Optional[str] = None
+
+
+@dataclass
+class SearchHit:
+    """A search result"""
+    document: Document
+    score: float
+    confidence: float
+
+
+class KnowledgeIndex:
+    """
+    Incrementally built BM25 index with optional dense embeddings.
+    
+    Postings are accumulated in Python lists as documents are added and
+    converted to NumPy arrays lazily on the next search, so ingestion stays
+    cheap and scoring touches only the posting arrays of the query terms.
+    """
+    
+    def __init__(
+        self,
+        k1: float = 1.5,
+        b: float = 0.75,
+        embedder: Optional[Callable[[List[str]], np.ndarray]] = None,
+        embedding_weight: float = 0.5
+    ):
+        """
+        Initialize knowledge index.
+        
+        Args:
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+            embedder: Optional function mapping texts to a (n, dim) embedding array
+            embedding_weight: Weight of cosine similarity in hybrid scoring (0-1)
+        """
+        self.k1 = k1
+        self.b = b
+        self.embedder = embedder
+        self.embedding_weight = embedding_weight
+        
+        self.documents: List[Document] = []
+        self._vocab: Dict[str, int] = {}
+        self._postings: List[List[int]] = []
+        self._frequencies: List[List[int]] = []
+        self._doc_lengths: List[int] = []
+        self._embeddings: Optional[np.ndarray] = None
+        
+        self._lock = threading.Lock()
+        self._arrays = None  # Frozen NumPy view, rebuilt after ingestion
+    
+    def __len__(self) -> int:
+        return len(self.documents)
+    
+    def add_documents(self, documents: Iterable[Document]) -> int:
+        """
+        Add documents to the index.
+        
+        Args:
+            documents: Documents to add
+        
+        Returns:
+            Number of documents added
+        """
+        documents = list(documents)
+        if not documents:
+            return 0
+        
+        vectors = None
+        if self.embedder:
+            vectors = self._normalize(np.asarray(
+                self.embedder([self._search_text(d) for d in documents]),
+                dtype=np.float32
+            ))
+        
+        with self._lock:
+            for document in documents:
+                doc_index = len(self.documents)
+                self.documents.append(document)
+                
+                counts: Dict[int, int] = {}
+                tokens = tokenize(self._search_text(document))
+                for token in tokens:
+                    term = self._vocab.get(token)
+                    if term is None:
+                        term = self._vocab[token] = len(self._postings)
+                        self._postings.append([])
+                        self._frequencies.append([])
+                    counts[term] = counts.get(term, 0) + 1
+                
+                for term, count in counts.items():
+                    self._postings[term].append(doc_index)
+                    self._frequencies[term].append(count)
+                self._doc_lengths.append(len(tokens))
+            
+            if vectors is not None:
+                self._embeddings = vectors if self._embeddings is None else np.vstack([self._embeddings, vectors])
+            
+            self._arrays = None
+        
+        return len(documents)
+    
+    def _search_text(self, document: Document) -> str:
+        """Text that is indexed for a document (title and body)."""
+        return f"{document.title}\n{document.text}" if document.title else document.text
+    
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize rows so a dot product is cosine similarity."""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+    
+    def _freeze(self):
+        """Convert postings to NumPy arrays and compute IDF (after ingestion)."""
+        with self._lock:
+            if self._arrays is not None:
+                return self._arrays
+            
+            n_docs = len(self.documents)
+            doc_lengths = np.asarray(self._doc_lengths, dtype=np.float32)
+            postings = [np.asarray(p, dtype=np.int32) for p in self._postings]
+            frequencies = [np.asarray(f, dtype=np.float32) for f in self._frequencies]
+            doc_freq = np.asarray([len(p) for p in self._postings], dtype=np.float32)
+            idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            
+            self._arrays = {
+                "n_docs": n_docs,
+                "doc_lengths": doc_lengths,
+                "avgdl": float(doc_lengths.mean()) if n_docs else 0.0,
+                "postings": postings,
+                "frequencies": frequencies,
+                "idf": idf,
+                # IDF of a term no document contains, used for unknown query terms
+                "max_idf": math.log1p((n_docs + 0.5) / 0.5),
+                "embeddings": self._embeddings
+            }
+            return self._arrays
+    
+    def bm25_scores(self, query: str) -> np.ndarray:
+        """
+        Score every document against a query.
+        
+        Args:
+            query: Query text
+        
+        Returns:
+            Array of BM25 scores, one per document
+        """
+        return self._bm25(self._freeze(), tokenize(query))
+    
+    def _bm25(self, arrays: Dict, query_terms: List[str]) -> np.ndarray:
+        """BM25 scores against one frozen snapshot of the index."""
+        scores = np.zeros(arrays["n_docs"], dtype=np.float32)
+        if not arrays["n_docs"]:
+            return scores
+        
+        norm = self.k1 * (1 - self.b + self.b * arrays["doc_lengths"] / max(arrays["avgdl"], 1e-6))
+        for token in set(query_terms):
+            term = self._vocab.get(token)
+            if term is None or term >= len(arrays["postings"]):
+                continue
+            docs = arrays["postings"][term]
+            tf = arrays["frequencies"][term]
+            scores[docs] += arrays["idf"][term] * tf * (self.k1 + 1) / (tf + norm[docs])
+        
+        return scores
+    
+    def _confidence(self, arrays: Dict, query_terms: List[str], doc_index: int, score: float) -> float:
+        """
+        Normalize a BM25 score to 0-1.
+        
+        Divides by the score the document would get if it contained every
+        query term once, so a document missing rare query terms scores low.
+        """
+        norm = self.k1 * (1 - self.b + self.b * arrays["doc_lengths"][doc_index] / max(arrays["avgdl"], 1e-6))
+        ceiling = 0.0
+        for token in set(query_terms):
+            term = self._vocab.get(token)
+            idf = arrays["idf"][term] if term is not None and term < len(arrays["idf"]) else arrays["max_idf"]
+            ceiling += idf * (self.k1 + 1) / (1 + norm)
+        return float(min(1.0, score / ceiling)) if ceiling > 0 else 0.0
+    
+    def search(self, query: str, k: int = 3) -> List[SearchHit]:
+        """
+        Find the top-k documents for a query.
+        
+        With an embedder, the ranking blends normalized BM25 confidence and
+        cosine similarity; otherwise it is pure BM25.
+        
+        Args:
+            query: Query text
+            k: Number of results
+        
+        Returns:
+            Hits sorted by descending score
+        """
+        arrays = self._freeze()
+        query_terms = tokenize(query)
+        scores = self._bm25(arrays, query_terms)
+        if not len(scores):
+            return []
+        
+        embeddings = arrays["embeddings"]
+        if self.embedder and embeddings is not None and len(embeddings) == len(scores):
+            query_vector = self._normalize(np.asarray(self.embedder([query]), dtype=np.float32))[0]
+            cosine = embeddings @ query_vector
+            top_bm25 = scores.max()
+            lexical = scores / top_bm25 if top_bm25 > 0 else scores
+            combined = (1 - self.embedding_weight) * lexical + self.embedding_weight * cosine
+        else:
+            cosine = None
+            combined = scores
+        
+        k = min(k, len(combined))
+        top = np.argpartition(-combined, k - 1)[:k]
+        top = top[np.argsort(-combined[top])]
+        
+        hits = []
+        for doc_index in top:
+            if combined[doc_index] <= 0:
+                continue
+            confidence = self._confidence(arrays, query_terms, doc_index, float(scores[doc_index]))
+            if cosine is not None:
+                confidence = (1 - self.embedding_weight) * confidence + self.embedding_weight * float(cosine[doc_index])
+            hits.append(SearchHit(
+                document=self.documents[doc_index],
+                score=float(combined[doc_index]),
+                confidence=confidence
+            ))
+        return hits
+    
+    def load_path(self, path: str, passage_chars: int = 800) -> int:
+        """
+        Ingest a file or directory.
+        
+        .jsonl lines are {"question", "answer"} FAQ entries or {"text", "title"}
+        passages; .md and .txt files are split into paragraph-sized passages.
+        
+        Args:
+            path: File or directory path
+            passage_chars: Target passage size for text files
+        
+        Returns:
+            Number of documents added
+        """
+        if os.path.isdir(path):
+            added = 0
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith((".jsonl", ".md", ".txt")):
+                        added += self.load_path(os.path.join(root, name), passage_chars)
+            return added
+        
+        if path.endswith(".jsonl"):
+            documents = list(self._read_jsonl(path))
+        else:
+            with open(path, encoding="utf-8") as f:
+                documents = [
+                    Document(id=f"{path}#{i}", text=passage, source=path)
+                    for i, passage in enumerate(split_passages(f.read(), passage_chars))
+                ]
+        
+        added = self.add_documents(documents)
+        logger.info(f"Indexed {added} document(s) from {path}")
+        return added
+    
+    @staticmethod
+    def _read_jsonl(path: str) -> Iterable[Document]:
+        """Stream documents from a JSONL file."""
+        with open(path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                doc_id = str(record.get("id", f"{path}#{line_number}"))
+                if "question" in record:
+                    yield Document(
+                        id=doc_id,
+                        text=record["question"],
+                        answer=record.get("answer"),
+                        source=path
+                    )
+                else:
+                    yield Document(
+                        id=doc_id,
+                        text=record["text"],
+                        title=record.get("title"),
+                        source=path
+                    )
+
+
+def split_passages(text: str, passage_chars: int = 800) -> List[str]:
+    """
+    Split text into passages at paragraph boundaries.
+    
+    Args:
+        text: Raw text
+        passage_chars: Target maximum passage length
+    
+    Returns:
+        List of passages
+    """
+    passages, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) > passage_chars:
+            passages.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        passages.append(current)
+    return passages
+
+
+def openai_embedder(api_key: str, model: str = "text-embedding-3-small") -> Callable[[List[str]], np.ndarray]:
+    """
+    Build an embedder backed by the OpenAI embeddings API.
+    
+    Args:
+        api_key: OpenAI API key
+        model: Embedding model name
+    
+    Returns:
+        Function mapping texts to an embedding array
+    """
+    from openai import OpenAI
+    client = OpenAI(api_key=api_key)
+    
+    def embed(texts: List[str]) -> np.ndarray:
+        response = client.embeddings.create(model=model, input=texts)
+        return np.asarray([item.embedding for item in response.data], dtype=np.float32)
+    
+    return embed
@@ -0,0 +1,240 @@
+"""
+Usage ledger for chat requests
+Records latency, token usage, cost, provider and model of every chat in
+rotated, gzip-compressed JSONL files. Events are queued in memory and
+written in batches by a background thread, keeping disk I/O off the
+request path.
+"""
+
+import glob
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# USD per million (prompt, completion) tokens; models not listed have no cost estimate
+PRICING_PER_MILLION: Dict[str, Tuple[float, float]] = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "llama3-8b-8192": (0.05, 0.08),
+    "llama3-70b-8192": (0.59, 0.79),
+    "mixtral-8x7b-32768": (0.24, 0.24),
+    "gemma-7b-it": (0.07, 0.07),
+}
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """
+    Estimate the cost of a request in USD.
+    
+    Dated snapshots reported by the API (e.g. gpt-4o-2024-05-13) are
+    priced as their base model.
+    
+    Args:
+        model: Model name
+        prompt_tokens: Prompt tokens
+        completion_tokens: Completion tokens
+    
+    Returns:
+        Cost in USD, or None if the model has no known price
+    """
+    prices = PRICING_PER_MILLION.get(model)
+    if prices is None:
+        base = max((name for name in PRICING_PER_MILLION if model.startswith(name + "-")), key=len, default=None)
+        if base is None:
+            return None
+        prices = PRICING_PER_MILLION[base]
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+@dataclass
+class LedgerEvent:
+    """One chat request as recorded in the ledger"""
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    source: str = "llm"  # "llm", "cache", "knowledge" or "filter": what produced the reply
+    priority: str = "interactive"
+    tenant: str = "default"
+    latency_ms: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: Optional[float] = None
+    success: bool = True
+    error: Optional[str] = None
+    message: Optional[str] = None  # Only kept when transcripts are enabled
+    reply: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+
+
+class UsageLedger:
+    """
+    Bounded queue plus background writer for ledger events.
+    
+    Backpressure policy: record() never blocks. When the queue is full
+    (the disk cannot keep up), new events are dropped and counted in
+    stats["dropped"], so a slow disk degrades the ledger rather than chat
+    latency.
+    
+    Batches are written when batch_size events are queued or flush_interval
+    seconds have passed. Each batch is appended to the current file as its
+    own gzip member, and the file is closed after every write, so anything
+    flushed survives a crash. Files rotate daily and when they exceed
+    rotate_bytes.
+    """
+    
+    FILE_PREFIX = "usage-"
+    FILE_SUFFIX = ".jsonl.gz"
+    
+    def __init__(
+        self,
+        directory: str,
+        batch_size: int = 200,
+        flush_interval: float = 5.0,
+        max_queue: int = 10000,
+        rotate_bytes: int = 64 * 1024 * 1024
+    ):
+        """
+        Initialize usage ledger.
+        
+        Args:
+            directory: Directory for ledger files (created if missing)
+            batch_size: Events per write
+            flush_interval: Maximum seconds an event waits before being written
+            max_queue: Events held in memory before new ones are dropped
+            rotate_bytes: File size that starts a new file
+        """
+        self.directory = directory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self._queue: "queue.Queue[LedgerEvent]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._path = None
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0, "flushes": 0, "write_errors": 0}
+        
+        os.makedirs(directory, exist_ok=True)
+    
+    def start(self):
+        """Start the background writer thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="usage-ledger", daemon=True)
+        self._thread.start()
+        logger.info(f"Usage ledger writing to {self.directory}")
+    
+    def record(self, event: LedgerEvent) -> bool:
+        """
+        Queue an event without blocking.
+        
+        Args:
+            event: Event to record
+        
+        Returns:
+            False if the event was dropped because the queue is full
+        """
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            if self.stats["dropped"] % 1000 == 1:
+                logger.warning(f"Usage ledger queue full; {self.stats['dropped']} event(s) dropped so far")
+            return False
+        self.stats["recorded"] += 1
+        return True
+    
+    def close(self, timeout: float = 10.0):
+        """Stop the writer after flushing queued events."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def _run(self):
+        """Writer loop: collect a batch by size or time, then write it."""
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (self._stop.is_set() and self._queue.empty()):
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=min(remaining, 0.5)))
+                except queue.Empty:
+                    continue
+            if batch:
+                self._write(batch)
+    
+    def _write(self, batch: List[LedgerEvent]):
+        """Append a batch to the current ledger file."""
+        data = "".join(json.dumps(asdict(e), separators=(",", ":")) + "\n" for e in batch)
+        try:
+            with gzip.open(self._current_path(), "at", encoding="utf-8") as f:
+                f.write(data)
+            self.stats["written"] += len(batch)
+            self.stats["flushes"] += 1
+        except OSError as e:
+            self.stats["write_errors"] += 1
+            logger.error(f"Failed to write {len(batch)} ledger event(s): {str(e)}")
+    
+    def _current_path(self) -> str:
+        """
+        Path of the file to append to, rotating by day and size.
+        
+        Each process writes its own files (the pid is part of the name), so
+        several uvicorn workers can share one ledger directory.
+        """
+        day = datetime.now().strftime("%Y-%m-%d")
+        stem = f"{self.FILE_PREFIX}{day}-{os.getpid()}-"
+        path = self._path
+        if path is None or not os.path.basename(path).startswith(stem):
+            existing = sorted(glob.glob(os.path.join(self.directory, f"{stem}*{self.FILE_SUFFIX}")))
+            path = existing[-1] if existing else self._numbered_path(stem, 1)
+        if os.path.exists(path) and os.path.getsize(path) >= self.rotate_bytes:
+            number = int(os.path.basename(path)[len(stem):-len(self.FILE_SUFFIX)])
+            path = self._numbered_path(stem, number + 1)
+        self._path = path
+        return path
+    
+    def _numbered_path(self, stem: str, number: int) -> str:
+        return os.path.join(self.directory, f"{stem}{number:04d}{self.FILE_SUFFIX}")
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get counters and the current queue depth."""
+        return {**self.stats, "queued": self._queue.qsize()}
+
+
+def read_events(directory: str, since: Optional[float] = None) -> Iterator[Dict]:
+    """
+    Stream ledger events from every file in a directory, oldest file first.
+    
+    Args:
+        directory: Ledger directory
+        since: Optional Unix timestamp; older events are skipped
+    
+    Yields:
+        Event dictionaries
+    """
+    pattern = os.path.join(directory, f"{UsageLedger.FILE_PREFIX}*{UsageLedger.FILE_SUFFIX}")
+    for path in sorted(glob.glob(pattern)):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    event = json.loads(line)
+                    if since is None or event.get("timestamp", 0) >= since:
+                        yield event
+        except (OSError, EOFError, json.JSONDecodeError) as e:
+            # A crash mid-write can leave a truncated final member
+            logger.warning(f"Stopped reading {path}: {str(e)}")
@@ -0,0 +1,223 @@
+"""
+Adaptive max_tokens
+Predicts how long a reply will be from the kind of question, its length and
+the conversation depth, learning online from the completion lengths it
+observes, and sets each request's max_tokens to the predicted length plus a
+safety margin. Truncated replies push the budget for similar questions up.
+"""
+
+import math
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Question types, checked in order; the first match wins
+QUESTION_TYPES = (
+    ("greeting", re.compile(r"^\W*(hi|hello|hey|thanks|thank you|ok|okay|bye|good (morning|afternoon|evening))\b[\s\W]*$", re.I)),
+    ("code", re.compile(r"```|\b(code|function|script|snippet|regex|sql|python|javascript|error|exception|stack trace)\b", re.I)),
+    ("explain", re.compile(r"\b(how|why|explain|describe|compare|difference|steps?|guide|walk me through|pros and cons)\b", re.I)),
+    ("list", re.compile(r"\b(list|options|examples|ideas|ways|features|plans)\b", re.I)),
+    ("yes_no", re.compile(r"^\s*(is|are|can|could|do|does|did|will|would|should|has|have)\b", re.I)),
+    ("factual", re.compile(r"^\s*(what|who|when|where|which)\b", re.I)),
+)
+
+
+def question_type(message: str) -> str:
+    """Classify a user message by the kind of answer it usually needs."""
+    for name, pattern in QUESTION_TYPES:
+        if pattern.search(message):
+            return name
+    return "other"
+
+
+def _bucket(value: int, edges: Tuple[int, ...]) -> int:
+    """Index of the first edge value is below (len(edges) if none)."""
+    for i, edge in enumerate(edges):
+        if value < edge:
+            return i
+    return len(edges)
+
+
+@dataclass
+class LengthPrediction:
+    """A max_tokens decision, passed back to observe() once the reply is known"""
+    key: Tuple[str, int, int]
+    max_tokens: int
+    ceiling: int
+    learned: bool  # False while there is too little data (the ceiling is used)
+
+
+class LengthPredictor:
+    """
+    Online output-length model.
+    
+    Observed completion lengths are kept per (question type, message length
+    bucket, history depth bucket) in small ring buffers. A prediction takes
+    a high quantile of the most specific bucket with enough samples, backing
+    off to (type, length) and then (type), and adds a margin; a question
+    type without enough data gets the configured ceiling. A reply that hits
+    its budget is counted as truncated and raises a boost for its question
+    type, so repeated truncations widen the budget quickly, while replies
+    that fit let it decay back slowly.
+    """
+    
+    MESSAGE_EDGES = (8, 32, 128, 512)  # Estimated tokens in the user message
+    DEPTH_EDGES = (1, 3, 7, 15)  # Prior messages in the conversation
+    
+    def __init__(
+        self,
+        margin: float = 0.3,
+        quantile: float = 0.95,
+        min_tokens: int = 64,
+        min_samples: int = 20,
+        window: int = 200,
+        truncation_ratio: float = 0.9
+    ):
+        """
+        Args:
+            margin: Fraction added on top of the predicted length
+            quantile: Quantile of observed lengths to budget for (0-1)
+            min_tokens: Smallest budget ever given
+            min_samples: Samples a bucket needs before it is used
+            window: Observations kept per bucket
+            truncation_ratio: A reply using this fraction of its budget counts as truncated
+        """
+        self.margin = margin
+        self.quantile = quantile
+        self.min_tokens = min_tokens
+        self.min_samples = min_samples
+        self.window = window
+        self.truncation_ratio = truncation_ratio
+        self._samples: Dict[tuple, Deque[int]] = {}
+        self._boost: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "predictions": 0,
+            "learned": 0,
+            "observed": 0,
+            "truncated": 0,
+            "budget_tokens": 0,
+            "ceiling_tokens": 0
+        }
+        self._by_type: Dict[str, Dict[str, int]] = {}
+    
+    def features(self, message: str, history_messages: int) -> Tuple[str, int, int]:
+        """Feature key of a request."""
+        return (
+            question_type(message),
+            _bucket(max(1, len(message) // 4), self.MESSAGE_EDGES),
+            _bucket(history_messages, self.DEPTH_EDGES)
+        )
+    
+    def predict(self, message: str, history_messages: int, ceiling: int) -> LengthPrediction:
+        """
+        Choose max_tokens for a request.
+        
+        Args:
+            message: The user message
+            history_messages: Number of prior conversation messages
+            ceiling: Configured max_tokens; the budget never exceeds it
+        
+        Returns:
+            LengthPrediction (max_tokens == ceiling until enough is learned)
+        """
+        key = self.features(message, history_messages)
+        
+        with self._lock:
+            samples = None
+            for scope in (key, key[:2], key[:1]):
+                bucket = self._samples.get(scope)
+                if bucket is not None and len(bucket) >= self.min_samples:
+                    samples = sorted(bucket)
+                    break
+            boost = self._boost.get(key[0], 1.0)
+        
+        if samples is None:
+            budget, learned = ceiling, False
+        else:
+            predicted = samples[min(len(samples) - 1, int(self.quantile * len(samples)))]
+            budget = math.ceil(predicted * (1 + self.margin) * boost)
+            budget, learned = max(self.min_tokens, min(ceiling, budget)), True
+        
+        with self._lock:
+            self.stats["predictions"] += 1
+            self.stats["learned"] += learned
+            self.stats["budget_tokens"] += budget
+            self.stats["ceiling_tokens"] += ceiling
+        return LengthPrediction(key=key, max_tokens=budget, ceiling=ceiling, learned=learned)
+    
+    def observe(self, prediction: LengthPrediction, completion_tokens: int, truncated: Optional[bool] = None) -> bool:
+        """
+        Learn from a finished reply.
+        
+        Args:
+            prediction: The prediction the request was sent with
+            completion_tokens: Tokens in the reply
+            truncated: Whether the provider stopped at the budget; inferred
+                from the reply length if not known
+        
+        Returns:
+            True if the reply was (probably) cut short by an adaptive budget
+            below the configured ceiling, so it should be regenerated
+        """
+        if truncated is None:
+            truncated = completion_tokens >= prediction.max_tokens * self.truncation_ratio
+        
+        # A truncated reply would have been longer; record it as at least
+        # twice the budget so the quantile moves up (capped at the ceiling)
+        value = min(prediction.ceiling, prediction.max_tokens * 2) if truncated else completion_tokens
+        qtype = prediction.key[0]
+        
+        with self._lock:
+            for scope in (prediction.key, prediction.key[:2], prediction.key[:1]):
+                bucket = self._samples.get(scope)
+                if bucket is None:
+                    bucket = self._samples[scope] = deque(maxlen=self.window)
+                bucket.append(value)
+            
+            boost = self._boost.get(qtype, 1.0)
+            if truncated and prediction.max_tokens < prediction.ceiling:
+                self._boost[qtype] = min(4.0, boost * 1.5)
+            elif boost > 1.0:
+                self._boost[qtype] = max(1.0, boost * 0.98)
+            
+            counts = self._by_type.setdefault(qtype, {"observed": 0, "truncated": 0})
+            counts["observed"] += 1
+            self.stats["observed"] += 1
+            if truncated:
+                counts["truncated"] += 1
+                self.stats["truncated"] += 1
+        
+        cut_short = truncated and prediction.max_tokens < prediction.ceiling
+        if cut_short:
+            logger.info(
+                f"Reply hit its adaptive budget of {prediction.max_tokens} tokens "
+                f"({qtype}); widening the budget for similar questions"
+            )
+        return cut_short
+    
+    def get_stats(self) -> Dict:
+        """Get prediction counts, truncation rates and the share of the static budget used."""
+        with self._lock:
+            stats = dict(self.stats)
+            observed = stats["observed"]
+            return {
+                "predictions": stats["predictions"],
+                "learned": stats["learned"],
+                "truncation_rate": round(stats["truncated"] / observed, 4) if observed else 0.0,
+                "average_budget": round(stats["budget_tokens"] / stats["predictions"], 1) if stats["predictions"] else None,
+                "budget_vs_ceiling": round(stats["budget_tokens"] / stats["ceiling_tokens"], 3) if stats["ceiling_tokens"] else None,
+                "by_type": {
+                    qtype: {
+                        **counts,
+                        "boost": round(self._boost.get(qtype, 1.0), 3),
+                        "samples": len(self._samples.get((qtype,), ()))
+                    }
+                    for qtype, counts in sorted(self._by_type.items())
+                }
+            }
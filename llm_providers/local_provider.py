@@ -0,0 +1,284 @@
+"""
+Local CPU LLM Provider Implementation
+Runs a small quantized GGUF model in-process with llama-cpp-python, so the
+chatbot keeps answering without network access and simple questions skip
+the round trip to a hosted API.
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+from .base import BaseLLMProvider, GenerationResult
+import logging
+
+try:
+    from llama_cpp import Llama, LlamaRAMCache
+except ImportError:
+    Llama = None
+    LlamaRAMCache = None
+
+logger = logging.getLogger(__name__)
+
+
+class LocalProviderBusy(Exception):
+    """Raised when no model slot frees up within the slot timeout"""
+    pass
+
+
+class LocalProvider(BaseLLMProvider):
+    """
+    Quantized model on the local CPU.
+    
+    The model is loaded once into a pool of slots, each a llama.cpp context
+    that serves one request at a time. Weights are memory-mapped, so extra
+    slots share them and mainly add a KV cache each; concurrent requests run
+    in parallel up to the slot count and queue for a free slot beyond it.
+    Each slot keeps a RAM cache of evaluated prompt prefixes, so the shared
+    system prompt is not re-evaluated on every request.
+    
+    llama-cpp-python evaluates one sequence per context, so requests are not
+    batched token by token across slots; more slots trade memory for
+    concurrency instead.
+    """
+    
+    def __init__(self, api_key: str = "", model: str = "", **config):
+        """
+        Load the model into its slots.
+        
+        Args:
+            api_key: Unused (the local model needs no key)
+            model: Path of the GGUF model file
+            **config: Additional configuration (slots, threads, context_size,
+                chat_format, prompt_cache_mb, slot_timeout)
+        """
+        super().__init__(api_key, model, **config)
+        self.slot_count = max(1, config.get('slots', 1))
+        self.slot_timeout = config.get('slot_timeout', 30.0)
+        self.threads = config.get('threads') or max(1, (os.cpu_count() or 1) // self.slot_count)
+        self._slots: "queue.Queue" = queue.Queue()
+        self._models = []
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "waited": 0, "timeouts": 0, "completion_tokens": 0, "generation_seconds": 0.0}
+        
+        if Llama is None:
+            logger.error("llama-cpp-python is not installed; the local provider is unavailable")
+            return
+        if not model or not os.path.exists(model):
+            logger.error(f"Local model file not found: {model}")
+            return
+        
+        prompt_cache_bytes = int(config.get('prompt_cache_mb', 64) * 1024 * 1024)
+        for _ in range(self.slot_count):
+            llm = Llama(
+                model_path=model,
+                n_ctx=config.get('context_size', 2048),
+                n_threads=self.threads,
+                chat_format=config.get('chat_format'),
+                verbose=False
+            )
+            if prompt_cache_bytes > 0 and LlamaRAMCache is not None:
+                llm.set_cache(LlamaRAMCache(capacity_bytes=prompt_cache_bytes))
+            self._models.append(llm)
+            self._slots.put(llm)
+        
+        logger.info(f"Loaded local model {os.path.basename(model)} into {self.slot_count} slot(s), {self.threads} thread(s) each")
+    
+    def _acquire(self):
+        """Check out a free slot, waiting up to slot_timeout."""
+        try:
+            return self._slots.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            self.stats["waited"] += 1
+        try:
+            return self._slots.get(timeout=self.slot_timeout)
+        except queue.Empty:
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise LocalProviderBusy(f"No local model slot free after {self.slot_timeout:g}s")
+    
+    def _record(self, completion_tokens: Optional[int], started: float):
+        """Add a finished generation to the throughput counters."""
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["completion_tokens"] += completion_tokens or 0
+            self.stats["generation_seconds"] += time.perf_counter() - started
+    
+    def _generate(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        **kwargs
+    ) -> GenerationResult:
+        """
+        Generate response with the local model.
+        
+        Args:
+            messages: Conversation messages
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature
+            **kwargs: Additional llama.cpp sampling parameters
+        
+        Returns:
+            GenerationResult with the token counts llama.cpp reports
+        
+        Raises:
+            LocalProviderBusy: If every slot stays busy for slot_timeout
+            Exception: If generation fails
+        """
+        if not self.is_available():
+            raise Exception("Local model not loaded. Check LOCAL_MODEL_PATH and llama-cpp-python.")
+        
+        if not self.validate_messages(messages):
+            raise ValueError("Invalid message format")
+        
+        llm = self._acquire()
+        started = time.perf_counter()
+        try:
+            response = llm.create_chat_completion(
+                messages=list(messages),
+                max_tokens=max_tokens or self.config.get('max_tokens', 500),
+                temperature=temperature or self.config.get('temperature', 0.7),
+                **kwargs
+            )
+        except Exception as e:
+            logger.error(f"Local model error: {str(e)}")
+            raise Exception(f"Local model call failed: {str(e)}")
+        finally:
+            self._slots.put(llm)
+        
+        choice = response["choices"][0]
+        usage = response.get("usage") or {}
+        self._record(usage.get("completion_tokens"), started)
+        
+        return GenerationResult(
+            text=choice["message"].get("content") or "",
+            model=os.path.basename(self.model),
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+            finish_reason=choice.get("finish_reason")
+        )
+    
+    def _stream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int],
+        temperature: Optional[float],
+        result: GenerationResult,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        Stream a response from the local model as text deltas.
+        
+        The slot is held until the stream ends or the consumer stops
+        reading, which stops generation.
+        
+        Args:
+            messages: Conversation messages
+            max_tokens: Maximum tokens in response
+            temperature: Sampling temperature
+            result: Result to fill in
+            **kwargs: Additional llama.cpp sampling parameters
+        
+        Yields:
+            Pieces of the response text, in order
+        
+        Raises:
+            LocalProviderBusy: If every slot stays busy for slot_timeout
+            Exception: If generation fails
+        """
+        if not self.is_available():
+            raise Exception("Local model not loaded. Check LOCAL_MODEL_PATH and llama-cpp-python.")
+        
+        if not self.validate_messages(messages):
+            raise ValueError("Invalid message format")
+        
+        llm = self._acquire()
+        started = time.perf_counter()
+        pieces = 0
+        result.model = os.path.basename(self.model)
+        try:
+            stream = llm.create_chat_completion(
+                messages=list(messages),
+                max_tokens=max_tokens or self.config.get('max_tokens', 500),
+                temperature=temperature or self.config.get('temperature', 0.7),
+                stream=True,
+                **kwargs
+            )
+            try:
+                for chunk in stream:
+                    choice = chunk["choices"][0]
+                    if choice.get("finish_reason"):
+                        result.finish_reason = choice["finish_reason"]
+                    content = choice.get("delta", {}).get("content")
+                    if content:
+                        pieces += 1
+                        yield content
+            finally:
+                stream.close()
+        except Exception as e:
+            logger.error(f"Local model error: {str(e)}")
+            raise Exception(f"Local model call failed: {str(e)}")
+        finally:
+            self._slots.put(llm)
+            # llama.cpp streams one token per chunk
+            self._record(pieces, started)
+        
+        result.completion_tokens = pieces
+    
+    def warm_up(self) -> None:
+        """
+        Run a one-token completion in every slot.
+        
+        Pages the memory-mapped weights in and fills each slot's prompt
+        cache, so the first user requests do not pay for it.
+        
+        Raises:
+            Exception: If the model is not loaded or fails to generate
+        """
+        if not self.is_available():
+            raise Exception("Local model not loaded. Check LOCAL_MODEL_PATH and llama-cpp-python.")
+        
+        held = [self._acquire() for _ in range(len(self._models))]
+        try:
+            for llm in held:
+                llm.create_chat_completion(messages=[{"role": "user", "content": "ping"}], max_tokens=1)
+        finally:
+            for llm in held:
+                self._slots.put(llm)
+    
+    def close(self) -> None:
+        """Free the model slots."""
+        for llm in self._models:
+            closer = getattr(llm, "close", None)
+            if closer:
+                closer()
+        self._models = []
+    
+    def get_stats(self) -> Dict:
+        """Get slot occupancy and generation throughput."""
+        with self._lock:
+            stats = dict(self.stats)
+        seconds = stats.pop("generation_seconds")
+        return {
+            "model": os.path.basename(self.model),
+            "slots": len(self._models),
+            "busy_slots": len(self._models) - self._slots.qsize(),
+            "threads_per_slot": self.threads,
+            **stats,
+            "tokens_per_second": round(stats["completion_tokens"] / seconds, 1) if seconds else None
+        }
+    
+    def get_provider_name(self) -> str:
+        """Get provider name."""
+        return "Local"
+    
+    def is_available(self) -> bool:
+        """Check if the model is loaded."""
+        return bool(self._models)
+
@@ -1,14 +1,26 @@
 """
 Performance monitoring and metrics for LLM providers
-Tracks latency, token usage, and error rates
+Tracks latency, token usage, and error rates, plus event-loop lag and
+thread-pool saturation of the serving process
 """
 
+import asyncio
+import math
+import sys
 import time
-from typing import Dict, Optional
+import threading
+import traceback
+from collections import deque
+from typing import Dict, List, Optional
 from dataclasses import dataclass, field
 from datetime import datetime
 import logging
 
+try:
+    import anyio.to_thread
+except ImportError:
+    anyio = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,23 +33,43 @@ class RequestMetrics:
     tokens_used: Optional[int] = None
     success: bool = True
     error: Optional[str] = None
+    source: str = "primary"  # "primary" for user traffic, "shadow" for mirrored calls
+    tenant: str = "default"
+    prompt_tokens: Optional[int] = None
+    ttft_ms: Optional[float] = None  # Time to first token, for streamed replies
+    finish_reason: Optional[str] = None
+    attempts: int = 1
     timestamp: datetime = field(default_factory=datetime.now)
 
 
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Roughly estimate the token count of a text (about 4 characters per token).
+    
+    Used where the provider does not report usage, so primary and shadow
+    calls are compared on the same basis.
+    """
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+
 class PerformanceMonitor:
     """Monitor and track LLM provider performance"""
     
     def __init__(self):
         self.requests: list[RequestMetrics] = []
         self.max_history = 1000  # Keep last 1000 requests
+        self._lock = threading.Lock()  # Shadow calls record from worker threads
     
     def record_request(self, metrics: RequestMetrics):
         """Record a request"""
-        self.requests.append(metrics)
-        
-        # Trim history if needed
-        if len(self.requests) > self.max_history:
-            self.requests = self.requests[-self.max_history:]
+        with self._lock:
+            self.requests.append(metrics)
+            
+            # Trim history if needed
+            if len(self.requests) > self.max_history:
+                self.requests = self.requests[-self.max_history:]
         
         # Log slow requests
         if metrics.latency_ms > 5000:  # 5 seconds
@@ -45,36 +77,103 @@ class PerformanceMonitor:
                 f"Slow API call: {metrics.provider} took {metrics.latency_ms:.0f}ms"
             )
     
-    def get_stats(self, provider: Optional[str] = None) -> Dict:
+    def record_result(self, result, source: str = "primary", tenant: str = "default"):
+        """
+        Record a successful generation from its GenerationResult.
+        
+        Args:
+            result: GenerationResult returned by a provider
+            source: Traffic source ("primary" or "shadow")
+            tenant: Tenant id
+        """
+        self.record_request(RequestMetrics(
+            provider=result.provider,
+            model=result.model,
+            latency_ms=result.latency_ms,
+            tokens_used=result.completion_tokens,
+            source=source,
+            tenant=tenant,
+            prompt_tokens=result.prompt_tokens,
+            ttft_ms=result.ttft_ms,
+            finish_reason=result.finish_reason,
+            attempts=result.attempts
+        ))
+    
+    def get_stats(
+        self,
+        provider: Optional[str] = None,
+        source: Optional[str] = None,
+        tenant: Optional[str] = None
+    ) -> Dict:
         """
         Get performance statistics.
         
         Args:
             provider: Optional provider name to filter by
-            
+            source: Optional traffic source to filter by ("primary" or "shadow")
+            tenant: Optional tenant id to filter by
+        
         Returns:
             Dictionary with performance stats
         """
-        requests = self.requests
+        requests = list(self.requests)
         if provider:
             requests = [r for r in requests if r.provider == provider]
+        if source:
+            requests = [r for r in requests if r.source == source]
+        if tenant:
+            requests = [r for r in requests if r.tenant == tenant]
         
         if not requests:
             return {"message": "No requests recorded"}
         
-        latencies = [r.latency_ms for r in requests]
+        latencies = sorted(r.latency_ms for r in requests)
         successes = sum(1 for r in requests if r.success)
         failures = len(requests) - successes
+        tokens = [r.tokens_used for r in requests if r.success and r.tokens_used is not None]
+        prompt_tokens = [r.prompt_tokens for r in requests if r.success and r.prompt_tokens is not None]
+        ttfts = sorted(r.ttft_ms for r in requests if r.ttft_ms is not None)
         
         return {
             "total_requests": len(requests),
             "success_rate": f"{(successes / len(requests) * 100):.1f}%",
             "average_latency_ms": sum(latencies) / len(latencies),
-            "min_latency_ms": min(latencies),
-            "max_latency_ms": max(latencies),
+            "p50_latency_ms": latencies[int(0.50 * (len(latencies) - 1))],
+            "p95_latency_ms": latencies[int(0.95 * (len(latencies) - 1))],
+            "min_latency_ms": latencies[0],
+            "max_latency_ms": latencies[-1],
+            "average_tokens": sum(tokens) / len(tokens) if tokens else None,
+            "average_prompt_tokens": sum(prompt_tokens) / len(prompt_tokens) if prompt_tokens else None,
+            "p50_ttft_ms": ttfts[int(0.50 * (len(ttfts) - 1))] if ttfts else None,
+            "p95_ttft_ms": ttfts[int(0.95 * (len(ttfts) - 1))] if ttfts else None,
+            "truncated_replies": sum(1 for r in requests if r.finish_reason == "length"),
+            "retried_requests": sum(1 for r in requests if r.attempts > 1),
             "total_failures": failures
         }
     
+    def get_comparison(self) -> Dict[str, Dict]:
+        """
+        Compare providers side by side, split by traffic source.
+        
+        Returns:
+            Dictionary keyed by "source/provider" with performance stats
+        """
+        keys = sorted({(r.source, r.provider) for r in list(self.requests)})
+        return {
+            f"{source}/{provider}": self.get_stats(provider=provider, source=source)
+            for source, provider in keys
+        }
+    
+    def get_tenant_stats(self) -> Dict[str, Dict]:
+        """
+        Get user-traffic statistics per tenant.
+        
+        Returns:
+            Dictionary keyed by tenant id with performance stats
+        """
+        tenants = sorted({r.tenant for r in list(self.requests) if r.source == "primary"})
+        return {tenant: self.get_stats(source="primary", tenant=tenant) for tenant in tenants}
+    
     def clear(self):
         """Clear all metrics"""
         self.requests = []
@@ -87,9 +186,12 @@ monitor = PerformanceMonitor()
 class TimingContext:
     """Context manager for timing API calls"""
     
-    def __init__(self, provider: str, model: str):
+    def __init__(self, provider: str, model: str, source: str = "primary", tenant: str = "default"):
         self.provider = provider
         self.model = model
+        self.source = source
+        self.tenant = tenant
+        self.tokens_used = None  # May be set inside the block once known
         self.start_time = None
         self.end_time = None
     
@@ -105,10 +207,210 @@ class TimingContext:
             provider=self.provider,
             model=self.model,
             latency_ms=latency_ms,
+            tokens_used=self.tokens_used,
             success=exc_type is None,
-            error=str(exc_val) if exc_val else None
+            error=str(exc_val) if exc_val else None,
+            source=self.source,
+            tenant=self.tenant
         )
         
         monitor.record_request(metrics)
         
         return False  # Don't suppress exceptions
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of durations in milliseconds.
+    
+    Buckets grow geometrically, so every value from min_ms to max_ms is
+    kept to within about 100 / sub_buckets percent, in constant memory and
+    with O(1) recording (the idea behind HdrHistogram).
+    """
+    
+    def __init__(self, min_ms: float = 0.01, max_ms: float = 60000.0, sub_buckets: int = 16):
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self._log_growth = math.log(2) / sub_buckets
+        self._counts = [0] * (int(math.log(max_ms / min_ms) / self._log_growth) + 2)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_seen_ms = 0.0
+        self._lock = threading.Lock()
+    
+    def record(self, value_ms: float):
+        """Add a duration."""
+        value_ms = max(0.0, value_ms)
+        index = 0 if value_ms < self.min_ms else min(
+            int(math.log(value_ms / self.min_ms) / self._log_growth) + 1,
+            len(self._counts) - 1
+        )
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total_ms += value_ms
+            self.max_seen_ms = max(self.max_seen_ms, value_ms)
+    
+    def _upper_bound(self, index: int) -> float:
+        return self.min_ms * math.exp(self._log_growth * index)
+    
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (0-100)."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, math.ceil(self.count * q / 100))
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= rank:
+                    return min(self._upper_bound(index), self.max_seen_ms)
+            return self.max_seen_ms
+    
+    def get_stats(self) -> Dict:
+        """Get count, mean, max and tail percentiles."""
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p90_ms": round(self.percentile(90), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "p999_ms": round(self.percentile(99.9), 3),
+            "max_ms": round(self.max_seen_ms, 3)
+        }
+
+
+class EventLoopMonitor:
+    """
+    Watch the event loop for lag and blocking calls.
+    
+    A probe task sleeps for a fixed interval and records how late it wakes
+    up; lateness is time the loop spent on other callbacks, so it is the
+    delay every request on this worker saw. The probe also samples the
+    AnyIO thread limiter used by run_in_threadpool, giving thread-pool
+    utilization and the number of calls queued for a thread.
+    
+    A watchdog thread notices when the probe has not run for longer than
+    the block threshold and logs the loop thread's stack while it is still
+    stuck, which names the blocking callback.
+    """
+    
+    def __init__(self, interval: float = 0.1, block_threshold: float = 0.25, max_blocked: int = 20):
+        """
+        Args:
+            interval: Seconds between probes
+            block_threshold: Stall length (seconds) that triggers a stack dump
+            max_blocked: Number of recent stalls kept with their stacks
+        """
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.lag = LatencyHistogram()
+        self.blocked: deque = deque(maxlen=max_blocked)
+        self.stats = {"blocked": 0, "probes": 0}
+        self._pool = {"total": 0, "borrowed": 0, "waiting": 0, "peak_borrowed": 0, "peak_waiting": 0, "busy_sum": 0.0}
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._reported_beat = None
+    
+    def start(self):
+        """Start probing the running loop (call from the loop, e.g. at startup)."""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(
+            f"Event loop monitor started (probe every {self.interval * 1000:.0f} ms, "
+            f"block threshold {self.block_threshold * 1000:.0f} ms)"
+        )
+    
+    def stop(self):
+        """Stop the probe and the watchdog."""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+    
+    async def _probe(self):
+        """Measure wake-up lateness and sample the thread limiter."""
+        loop = asyncio.get_running_loop()
+        limiter = anyio.to_thread.current_default_thread_limiter() if anyio else None
+        
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag.record((loop.time() - expected) * 1000)
+            self._last_beat = time.monotonic()
+            self.stats["probes"] += 1
+            
+            if limiter is not None:
+                pool = limiter.statistics()
+                self._pool["total"] = pool.total_tokens
+                self._pool["borrowed"] = pool.borrowed_tokens
+                self._pool["waiting"] = pool.tasks_waiting
+                self._pool["peak_borrowed"] = max(self._pool["peak_borrowed"], pool.borrowed_tokens)
+                self._pool["peak_waiting"] = max(self._pool["peak_waiting"], pool.tasks_waiting)
+                self._pool["busy_sum"] += pool.borrowed_tokens / pool.total_tokens if pool.total_tokens else 0.0
+    
+    def _watch(self):
+        """Watchdog thread: dump the loop thread's stack once per stall."""
+        check = max(0.01, self.block_threshold / 4)
+        while not self._stop.wait(check):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.block_threshold or self._reported_beat == beat:
+                continue
+            
+            self._reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = traceback.format_stack(frame) if frame is not None else []
+            del frame
+            self.stats["blocked"] += 1
+            self.blocked.append({
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "blocked_ms": round(stalled * 1000, 1),
+                "stack": [line.rstrip() for line in stack[-30:]]
+            })
+            logger.warning(
+                f"Event loop blocked for over {stalled * 1000:.0f} ms; loop thread stack:\n"
+                + "".join(stack[-30:])
+            )
+    
+    def get_stats(self, include_stacks: bool = False) -> Dict:
+        """
+        Get lag percentiles, stall counts and thread-pool saturation.
+        
+        Args:
+            include_stacks: Include the stacks of recent stalls
+        
+        Returns:
+            Dictionary with lag, blocking and thread-pool stats
+        """
+        probes = self.stats["probes"]
+        recent: List[Dict] = list(self.blocked)
+        return {
+            "interval_ms": self.interval * 1000,
+            "lag": self.lag.get_stats(),
+            "blocked": {
+                "threshold_ms": self.block_threshold * 1000,
+                "count": self.stats["blocked"],
+                "recent": recent if include_stacks else [{k: v for k, v in b.items() if k != "stack"} for b in recent]
+            },
+            "thread_pool": {
+                "size": self._pool["total"],
+                "busy": self._pool["borrowed"],
+                "queued": self._pool["waiting"],
+                "peak_busy": self._pool["peak_borrowed"],
+                "peak_queued": self._pool["peak_waiting"],
+                "average_utilization": round(self._pool["busy_sum"] / probes, 4) if probes else 0.0
+            } if anyio else None
+        }
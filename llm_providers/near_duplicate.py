@@ -0,0 +1,240 @@
+"""
+Near-duplicate question matching
+A MinHash/LSH index over normalized first-turn questions, so paraphrases
+such as "what are your hours?" and "What are your opening hours" reuse one
+cached answer instead of each paying for a provider call. Entries live in
+fixed-size numpy arrays used as a ring buffer, with LSH buckets pointing
+into them, so memory is bounded and the oldest entry is evicted by each
+insert once the index is full.
+"""
+
+import re
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Contractions expanded before tokenizing, so "what's" matches "what is"
+CONTRACTIONS = ((re.compile(r"n['’]t\b"), " not"), (re.compile(r"['’]s\b"), " is"), (re.compile(r"['’]re\b"), " are"), (re.compile(r"['’]m\b"), " am"), (re.compile(r"['’]ll\b"), " will"))
+# Politeness that does not change what is being asked
+FILLER_WORDS = {"please", "pls", "plz", "hi", "hello", "hey", "thanks", "thx", "kindly", "just"}
+WORD_PATTERN = re.compile(r"\w+")
+
+_PRIME = np.uint64(4294967311)  # Smallest prime above 2**32
+
+
+class NearDuplicateIndex:
+    """
+    Maps paraphrased questions to the cache key of an earlier answer.
+    
+    Questions are reduced to sets of word hashes. A 128-value MinHash
+    signature split into 32 bands of 4 rows gives each question 32 band
+    hashes; an earlier question becomes a candidate if it shares any band
+    with the query in the same context, which almost always happens above
+    a Jaccard similarity of 0.6. The candidates sharing the most bands are
+    then checked exactly against their stored word hashes, so the
+    threshold is not subject to MinHash estimation noise.
+    
+    Each band has a dict bucketing rows by context and band hash, so a
+    lookup only touches rows that share a band with the query. Word
+    hashes, contexts and keys are kept in preallocated arrays of capacity
+    rows; each insert into a full index overwrites the oldest row and
+    removes it from its buckets.
+    """
+    
+    def __init__(
+        self,
+        capacity: int = 10000,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        bands: int = 32,
+        max_tokens: int = 32,
+        max_candidates: int = 16,
+        seed: int = 1
+    ):
+        """
+        Args:
+            capacity: Questions kept; the oldest is evicted beyond this
+            threshold: Minimum Jaccard similarity of word sets to reuse an answer
+            num_perm: MinHash permutations (must be a multiple of bands)
+            bands: LSH bands
+            max_tokens: Questions with more distinct words are not indexed
+            max_candidates: Most candidates checked exactly per lookup
+            seed: Seed of the MinHash permutations
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.capacity = capacity
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_tokens = max_tokens
+        self.max_candidates = max_candidates
+        
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 32, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, size=(num_perm, 1), dtype=np.uint64)
+        self._row_weights = rng.integers(1, 2 ** 32, size=self.rows, dtype=np.uint64)
+        self._band_salt = rng.integers(0, 2 ** 32, size=bands, dtype=np.uint64)
+        
+        self._band_hashes = np.zeros((capacity, bands), dtype=np.uint32)  # Kept to unlink evicted rows
+        # Per band: context and band hash -> row, or a list of rows when several share it
+        self._buckets: List[Dict[int, Union[int, List[int]]]] = [{} for _ in range(bands)]
+        self._tokens = np.zeros((capacity, max_tokens), dtype=np.uint32)  # 0-padded word hashes
+        self._lengths = np.zeros(capacity, dtype=np.uint8)
+        self._contexts = np.zeros(capacity, dtype=np.int64)  # 0 marks an empty row
+        self._keys = np.zeros(capacity, dtype="S64")
+        self._next = 0
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "added": 0, "evicted": 0, "skipped": 0}
+    
+    def tokens(self, text: str) -> np.ndarray:
+        """Sorted distinct word hashes of a normalized question (never 0)."""
+        text = text.lower()
+        for pattern, replacement in CONTRACTIONS:
+            text = pattern.sub(replacement, text)
+        words = {w for w in WORD_PATTERN.findall(text) if w not in FILLER_WORDS}
+        return np.unique(np.array([zlib.crc32(w.encode("utf-8")) | 1 for w in words], dtype=np.uint32))
+    
+    def _band_hashes_of(self, tokens: np.ndarray) -> np.ndarray:
+        """LSH band hashes of a token set: MinHash signature, then one hash per band."""
+        values = tokens.astype(np.uint64)[np.newaxis, :]
+        signature = ((self._a * values + self._b) % _PRIME).min(axis=1)
+        bands = (signature.reshape(self.bands, self.rows) * self._row_weights).sum(axis=1)
+        return ((bands ^ self._band_salt) % _PRIME).astype(np.uint32)
+    
+    @staticmethod
+    def _bucket_key(context_id: int, band_hash: int) -> int:
+        return (context_id << 32) | band_hash
+    
+    @staticmethod
+    def context_id(key: str) -> int:
+        """Nonzero int64 id of a context key (a hex digest)."""
+        return int(key[:15], 16) or 1
+    
+    def lookup(self, question: str, context: str) -> Optional[Tuple[str, float]]:
+        """
+        Find an earlier question similar enough to reuse its answer.
+        
+        Args:
+            question: The user's question
+            context: Key of everything besides the question that affects the
+                answer (tenant, provider, model, generation parameters)
+        
+        Returns:
+            (cache key, similarity) of the most similar earlier question at
+            or above the threshold, or None
+        """
+        tokens = self.tokens(question)
+        if not 0 < len(tokens) <= self.max_tokens:
+            return None
+        bands = self._band_hashes_of(tokens)
+        context_id = self.context_id(context)
+        
+        with self._lock:
+            self.stats["lookups"] += 1
+            matched = []
+            for band, value in enumerate(bands.tolist()):
+                rows = self._buckets[band].get(self._bucket_key(context_id, value))
+                if isinstance(rows, list):
+                    matched.extend(rows)
+                elif rows is not None:
+                    matched.append(rows)
+            if not matched:
+                return None
+            if len(matched) > self.max_candidates:
+                # More shared bands means a higher estimated similarity
+                counts = np.bincount(np.array(matched, dtype=np.intp))
+                rows = np.flatnonzero(counts)
+                if len(rows) > self.max_candidates:
+                    rows = rows[np.argpartition(-counts[rows], self.max_candidates)[:self.max_candidates]]
+            else:
+                rows = np.unique(np.array(matched, dtype=np.intp))
+            
+            shared = np.isin(self._tokens[rows], tokens).sum(axis=1)
+            similarity = shared / (len(tokens) + self._lengths[rows].astype(np.int64) - shared)
+            best = int(np.argmax(similarity))
+            if similarity[best] < self.threshold:
+                return None
+            
+            self.stats["hits"] += 1
+            return self._keys[rows[best]].decode("ascii"), float(similarity[best])
+    
+    def add(self, question: str, context: str, key: str) -> bool:
+        """
+        Index a question whose answer is cached under key.
+        
+        Args:
+            question: The user's question
+            context: Context key (see lookup)
+            key: Response cache key of the answer (hex digest)
+        
+        Returns:
+            False if the question has no words or too many to index
+        """
+        tokens = self.tokens(question)
+        if not 0 < len(tokens) <= self.max_tokens:
+            with self._lock:
+                self.stats["skipped"] += 1
+            return False
+        bands = self._band_hashes_of(tokens)
+        
+        with self._lock:
+            slot = self._next % self.capacity
+            if self._contexts[slot]:
+                self.stats["evicted"] += 1
+                self._unlink(slot)
+            context_id = self.context_id(context)
+            for band, value in enumerate(bands.tolist()):
+                bucket_key = self._bucket_key(context_id, value)
+                rows = self._buckets[band].get(bucket_key)
+                if rows is None:
+                    self._buckets[band][bucket_key] = slot
+                elif isinstance(rows, list):
+                    rows.append(slot)
+                else:
+                    self._buckets[band][bucket_key] = [rows, slot]
+            self._band_hashes[slot] = bands
+            self._tokens[slot] = 0
+            self._tokens[slot, :len(tokens)] = tokens
+            self._lengths[slot] = len(tokens)
+            self._contexts[slot] = context_id
+            self._keys[slot] = key.encode("ascii")
+            self._next += 1
+            self.stats["added"] += 1
+        return True
+    
+    def _unlink(self, slot: int):
+        """Remove a row from its buckets (caller holds the lock)."""
+        context_id = int(self._contexts[slot])
+        for band, value in enumerate(self._band_hashes[slot].tolist()):
+            bucket_key = self._bucket_key(context_id, value)
+            rows = self._buckets[band].get(bucket_key)
+            if isinstance(rows, list):
+                rows.remove(slot)
+                if len(rows) == 1:
+                    self._buckets[band][bucket_key] = rows[0]
+            elif rows == slot:
+                del self._buckets[band][bucket_key]
+    
+    def __len__(self) -> int:
+        return min(self._next, self.capacity)
+    
+    def get_stats(self) -> Dict:
+        """Get lookup and hit counts, occupancy, array memory and bucket count."""
+        with self._lock:
+            stats = dict(self.stats)
+            buckets = sum(len(b) for b in self._buckets)
+        arrays = (self._band_hashes, self._tokens, self._lengths, self._contexts, self._keys)
+        return {
+            **stats,
+            "hit_rate": round(stats["hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0,
+            "entries": len(self),
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "memory_bytes": sum(a.nbytes for a in arrays),
+            "buckets": buckets
+        }
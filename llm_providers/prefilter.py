@@ -0,0 +1,311 @@
+"""
+Local pre-filter for chat messages
+Cheap checks that run before any provider call: size limits, precompiled
+rules for floods, link spam and prompt-injection attempts, and a character
+bigram model that recognizes keyboard-mash gibberish. Junk is rejected or
+answered with a canned reply in microseconds, without spending upstream
+capacity.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from .monitoring import LatencyHistogram
+import logging
+
+logger = logging.getLogger(__name__)
+
+ALLOW = "allow"
+REJECT = "reject"
+CANNED = "canned"
+
+GIBBERISH_REPLY = "Sorry, I didn't catch that. Could you rephrase your question?"
+INJECTION_REPLY = "I can't change how I work, but I'm happy to help with any other question."
+
+URL_PATTERN = re.compile(r"https?://|www\.", re.I)
+
+
+@dataclass
+class FilterRule:
+    """A precompiled pattern and what to do with messages that match it"""
+    name: str
+    pattern: "re.Pattern"
+    action: str  # REJECT or CANNED
+    reply: Optional[str] = None  # Canned reply, or the rejection reason
+
+
+@dataclass
+class Verdict:
+    """Outcome of checking one message"""
+    action: str
+    rule: Optional[str] = None
+    reply: Optional[str] = None  # Set for CANNED
+    reason: Optional[str] = None  # Set for REJECT
+    status: int = 400
+    
+    @property
+    def allowed(self) -> bool:
+        return self.action == ALLOW
+
+
+DEFAULT_RULES = (
+    FilterRule(
+        "char_flood",
+        re.compile(r"(\w)\1{29,}"),
+        REJECT,
+        "Message contains a long run of one repeated character"
+    ),
+    FilterRule(
+        "word_flood",
+        re.compile(r"\b(\w+)\b(?:\W+\1\b){9,}", re.I),
+        REJECT,
+        "Message repeats the same word over and over"
+    ),
+    FilterRule(
+        "prompt_injection",
+        re.compile(
+            r"\b(?:ignore|disregard|forget|override)\b.{0,40}?\b(?:previous|prior|above|earlier|all|your|system)\b"
+            r".{0,20}?\b(?:instructions?|prompts?|rules|directions|guidelines)\b"
+            r"|\b(?:reveal|show|print|repeat|output)\b.{0,30}?\b(?:system prompt|initial instructions|hidden instructions)\b"
+            r"|\byou are now (?:DAN|in developer mode|jailbroken)\b",
+            re.I | re.S
+        ),
+        CANNED,
+        INJECTION_REPLY
+    ),
+)
+
+
+def load_rules(path: str) -> List[FilterRule]:
+    """
+    Load extra rules from a JSON file.
+    
+    The file holds a list of {"name", "pattern", "action", "reply"} objects;
+    action is "reject" (reply is the reason) or "canned" (reply is sent to
+    the user). Patterns are case-insensitive.
+    
+    Args:
+        path: Rules file
+    
+    Returns:
+        Compiled rules
+    
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the file or a rule is malformed
+    """
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError("rules file must contain a list")
+    
+    rules = []
+    for entry in entries:
+        name = entry.get("name") or f"rule_{len(rules) + 1}"
+        action = entry.get("action", REJECT)
+        if action not in (REJECT, CANNED):
+            raise ValueError(f"rule '{name}': action must be reject or canned")
+        if action == CANNED and not entry.get("reply"):
+            raise ValueError(f"rule '{name}': canned rules need a reply")
+        try:
+            pattern = re.compile(entry["pattern"], re.I)
+        except (KeyError, re.error) as e:
+            raise ValueError(f"rule '{name}': invalid pattern: {str(e)}")
+        rules.append(FilterRule(name, pattern, action, entry.get("reply")))
+    return rules
+
+
+# Everyday English the bigram model is trained on
+TRAINING_TEXT = """
+Hello, how can I help you today? I would like to know more about your product and the plans you offer.
+What is the difference between the basic and the premium subscription? Can I change my plan later?
+Please explain how to reset my password, because the link in the email does not seem to work anymore.
+The weather has been lovely this week, and we spent most of the afternoon walking along the river.
+Thank you very much for your quick answer. That solved the problem, and everything works fine now.
+Could you tell me when the store opens on weekends, and whether there is parking nearby?
+I am looking for a recipe that is quick to make, healthy, and uses vegetables from the garden.
+Our team is building a web application with a Python backend and a JavaScript front end.
+Why does my order show as pending? I paid with a credit card three days ago and have not received a confirmation.
+Where can I find the documentation for the public API, and is there a limit on the number of requests?
+She said that the meeting would start at nine, but nobody knew which room it was in.
+Which languages do you support, and can the assistant answer questions about billing and shipping?
+If you have any other questions, just let me know and I will be happy to help you with them.
+The quick brown fox jumps over the lazy dog while the children watch from the window.
+Learning something new every day keeps the mind sharp, curious and open to other ideas.
+Is it possible to export my data as a spreadsheet, or do I need to contact support for that?
+We should compare several options before making a decision, since the price is quite high.
+My computer becomes very slow after an update, and some programs crash when I open them.
+Good morning! I have a question about delivery times to Europe and the cost of returns.
+"""
+
+
+class GibberishModel:
+    """
+    Character bigram model of English text.
+    
+    Letters are mapped to 26 states and everything else to a separator
+    state; a message's score is the mean log-probability of its
+    transitions, computed with one vectorized table lookup. The threshold
+    is calibrated at construction as the median score of random letter
+    strings, so only text that looks less like English than typical random
+    typing is flagged. Short messages and text that is mostly not ASCII
+    letters (other scripts, numbers, code) are never flagged.
+    """
+    
+    STATES = 27
+    
+    def __init__(self, training_text: str = TRAINING_TEXT, min_letters: int = 12):
+        """
+        Args:
+            training_text: English text to learn bigram frequencies from
+            min_letters: Messages with fewer ASCII letters are not scored
+        """
+        self.min_letters = min_letters
+        self._state = np.full(256, self.STATES - 1, dtype=np.intp)
+        self._state[ord("a"):ord("z") + 1] = np.arange(26)
+        self._state[ord("A"):ord("Z") + 1] = np.arange(26)
+        
+        counts = np.ones((self.STATES, self.STATES))  # Add-one smoothing
+        states = self._states(training_text)
+        np.add.at(counts, (states[:-1], states[1:]), 1)
+        self._log_prob = np.log(counts / counts.sum(axis=1, keepdims=True))
+        
+        rng = random.Random(0)
+        alphabet = "abcdefghijklmnopqrstuvwxyz     "
+        noise = [self.score("".join(rng.choice(alphabet) for _ in range(60))) for _ in range(200)]
+        self.threshold = float(np.median(noise))
+    
+    def _states(self, text: str) -> np.ndarray:
+        return self._state[np.frombuffer(text.encode("ascii", "ignore"), dtype=np.uint8)]
+    
+    def score(self, text: str) -> float:
+        """Mean transition log-probability of the text (higher is more English-like)."""
+        return self._score(self._states(text))
+    
+    def _score(self, states: np.ndarray) -> float:
+        if len(states) < 2:
+            return 0.0
+        before, after = states[:-1], states[1:]
+        separator = self.STATES - 1
+        keep = (before != separator) | (after != separator)
+        if not keep.any():
+            return 0.0
+        return float(self._log_prob[before[keep], after[keep]].mean())
+    
+    def is_gibberish(self, text: str) -> bool:
+        """Whether the text is long enough to judge and scores below the threshold."""
+        states = self._states(text)
+        letters = int(np.count_nonzero(states != self.STATES - 1))
+        if letters < self.min_letters or letters < 0.5 * len(text.strip()):
+            return False
+        return self._score(states) < self.threshold
+
+
+class PreFilter:
+    """
+    Checks chat messages before they reach a provider.
+    
+    Checks run cheapest first and stop at the first hit: message length
+    and request size, link count, the rules (built-in plus any loaded
+    from a file), then the gibberish model. Oversized and flooding
+    messages are rejected; prompt-injection attempts and gibberish get a
+    canned reply. Every check is counted and timed.
+    """
+    
+    def __init__(
+        self,
+        max_chars: int = 4000,
+        max_bytes: int = 32000,
+        max_links: int = 5,
+        rules: Sequence[FilterRule] = DEFAULT_RULES,
+        gibberish: Optional[GibberishModel] = None
+    ):
+        """
+        Args:
+            max_chars: Longest accepted message, in characters
+            max_bytes: Largest accepted message plus history, in UTF-8 bytes
+            max_links: Most links accepted in one message
+            rules: Rules checked in order
+            gibberish: Gibberish model (None disables the check)
+        """
+        self.max_chars = max_chars
+        self.max_bytes = max_bytes
+        self.max_links = max_links
+        self.rules = list(rules)
+        self.gibberish = gibberish
+        self.latency = LatencyHistogram(min_ms=0.001, max_ms=1000.0)
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._by_rule = Counter()
+    
+    def check(self, message: str, history: Sequence[str] = ()) -> Verdict:
+        """
+        Check a message.
+        
+        Args:
+            message: The user message
+            history: Contents of the conversation history sent with it
+        
+        Returns:
+            Verdict (action ALLOW, REJECT or CANNED)
+        """
+        started = time.perf_counter()
+        verdict = self._check(message, history)
+        self.latency.record((time.perf_counter() - started) * 1000)
+        
+        with self._lock:
+            self._counts["checked"] += 1
+            self._counts[verdict.action] += 1
+            if verdict.rule:
+                self._by_rule[verdict.rule] += 1
+        if not verdict.allowed:
+            logger.info(f"Pre-filter {verdict.action}: {verdict.rule} ({message[:40]!r})")
+        return verdict
+    
+    def _check(self, message: str, history: Sequence[str]) -> Verdict:
+        if len(message) > self.max_chars:
+            return Verdict(REJECT, "max_chars", reason=f"Message is longer than {self.max_chars} characters", status=413)
+        
+        size = len(message.encode("utf-8")) + sum(len(h.encode("utf-8")) for h in history)
+        if size > self.max_bytes:
+            return Verdict(REJECT, "max_bytes", reason=f"Message and history are larger than {self.max_bytes} bytes", status=413)
+        
+        lowered = message.lower()
+        if ("http" in lowered or "www." in lowered) and len(URL_PATTERN.findall(message)) > self.max_links:
+            return Verdict(REJECT, "link_spam", reason=f"Message contains more than {self.max_links} links")
+        
+        for rule in self.rules:
+            if rule.pattern.search(message):
+                if rule.action == CANNED:
+                    return Verdict(CANNED, rule.name, reply=rule.reply)
+                return Verdict(REJECT, rule.name, reason=rule.reply or f"Message rejected ({rule.name})")
+        
+        if self.gibberish and self.gibberish.is_gibberish(message):
+            return Verdict(CANNED, "gibberish", reply=GIBBERISH_REPLY)
+        
+        return Verdict(ALLOW)
+    
+    def get_stats(self) -> Dict:
+        """Get accept, reject and canned rates, hits per rule and check latency in microseconds."""
+        with self._lock:
+            counts = dict(self._counts)
+            by_rule = dict(self._by_rule.most_common())
+        checked = counts.get("checked", 0)
+        latency = self.latency.get_stats()
+        return {
+            "checked": checked,
+            "accept_rate": round(counts.get(ALLOW, 0) / checked, 4) if checked else None,
+            "reject_rate": round(counts.get(REJECT, 0) / checked, 4) if checked else None,
+            "canned_rate": round(counts.get(CANNED, 0) / checked, 4) if checked else None,
+            "by_rule": by_rule,
+            "latency_us": {
+                key.replace("_ms", "_us"): round(value * 1000, 1)
+                for key, value in latency.items() if key.endswith("_ms")
+            }
+        }
@@ -0,0 +1,313 @@
+"""
+On-demand profiling of a live worker
+A time-boxed sampling CPU profiler producing folded stacks (the input format
+of flamegraph.pl and speedscope), tracemalloc snapshots and diffs, and a
+bounded deep-size estimate for in-process caches and queues. Nothing runs
+and nothing is traced until an administrator asks for it.
+"""
+
+import gc
+import linecache
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running"""
+    pass
+
+
+def _frame_label(frame) -> str:
+    """Folded-stack label of a frame: module file (relative where possible), function, line."""
+    code = frame.f_code
+    filename = code.co_filename
+    for prefix in sys.path:
+        if prefix and filename.startswith(prefix + os.sep):
+            filename = filename[len(prefix) + 1:]
+            break
+    return f"{code.co_name} ({filename}:{frame.f_lineno})"
+
+
+class SamplingProfiler:
+    """
+    Statistical CPU profiler using sys._current_frames().
+    
+    A background thread wakes every interval and records the stack of every
+    other thread, so the running event loop and worker threads are profiled
+    without instrumenting them. Cost is paid only while a profile is running;
+    one profile runs at a time.
+    """
+    
+    def __init__(self, max_seconds: float = 60.0):
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+    
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+    
+    def profile(self, seconds: float, interval: float = 0.005, include_idle: bool = False) -> Dict:
+        """
+        Sample all threads for a while (blocks the calling thread).
+        
+        Args:
+            seconds: Profile duration, capped at max_seconds
+            interval: Seconds between samples
+            include_idle: Keep stacks of threads waiting in select/wait/sleep
+        
+        Returns:
+            Dictionary with folded stack counts, sample count and duration
+        
+        Raises:
+            ProfilerBusy: If another profile is running
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A CPU profile is already running")
+        
+        try:
+            seconds = max(0.0, min(seconds, self.max_seconds))
+            interval = max(interval, 0.001)
+            own_id = threading.get_ident()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks: Counter = Counter()
+            samples = 0
+            started = time.monotonic()
+            deadline = started + seconds
+            
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    if not include_idle and _is_idle(frame):
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    if thread_id not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    labels.append(names.get(thread_id, f"thread-{thread_id}"))
+                    stacks[";".join(reversed(labels))] += 1
+                samples += 1
+                time.sleep(interval)
+            
+            duration = time.monotonic() - started
+            logger.info(f"CPU profile finished: {samples} samples in {duration:.1f}s")
+            return {"stacks": stacks, "samples": samples, "duration_seconds": round(duration, 3), "interval_seconds": interval}
+        finally:
+            self._lock.release()
+
+
+# Innermost functions of threads parked in the selector, a condition or an idle pool
+_IDLE_FUNCTIONS = {"select", "poll", "wait", "accept", "_worker", "_wait_for_tstate_lock"}
+
+
+def _is_idle(frame) -> bool:
+    """Whether the innermost Python frame looks like a thread parked in a wait."""
+    return frame.f_code.co_name in _IDLE_FUNCTIONS
+
+
+def folded(stacks: Counter) -> str:
+    """Render stack counts as folded stacks, one 'a;b;c count' line each, hottest first."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class MemoryProfiler:
+    """
+    tracemalloc snapshots and diffs.
+    
+    Tracing is off until start() (tracemalloc slows allocations noticeably
+    while it runs). Each snapshot() is kept so the next one can be diffed
+    against it, showing which allocation sites grew in between.
+    """
+    
+    # Allocations by the profilers themselves are not interesting
+    FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, linecache.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>")
+    )
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._started_here = False
+    
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+    
+    def start(self, frames: int = 10) -> Dict:
+        """
+        Start tracing allocations.
+        
+        Args:
+            frames: Stack depth stored per allocation (more is slower)
+        
+        Returns:
+            Tracing status
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(max(1, frames))
+                self._started_here = True
+                self._previous = None
+                logger.info(f"tracemalloc started ({frames} frame(s))")
+            return self.status()
+    
+    def stop(self) -> Dict:
+        """Stop tracing (only if started here) and drop stored snapshots."""
+        with self._lock:
+            if tracemalloc.is_tracing() and self._started_here:
+                tracemalloc.stop()
+                logger.info("tracemalloc stopped")
+            self._started_here = False
+            self._previous = None
+            return self.status()
+    
+    def status(self) -> Dict:
+        """Whether tracing is on, with traced and peak memory."""
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": True,
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory()
+        }
+    
+    def snapshot(self, limit: int = 25, group_by: str = "lineno", diff: bool = True) -> Dict:
+        """
+        Take a snapshot and report the top allocation sites.
+        
+        Args:
+            limit: Number of sites to return
+            group_by: "lineno", "filename" or "traceback"
+            diff: Also compare with the previous snapshot, if any
+        
+        Returns:
+            Dictionary with top sites and, when diffing, top growth since the previous snapshot
+        
+        Raises:
+            RuntimeError: If tracing is not on
+            ValueError: If group_by is not supported
+        """
+        if group_by not in ("lineno", "filename", "traceback"):
+            raise ValueError("group_by must be lineno, filename or traceback")
+        
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc is not running; start it first")
+            
+            snapshot = tracemalloc.take_snapshot().filter_traces(self.FILTERS)
+            previous, self._previous = self._previous, snapshot
+        
+        stats = snapshot.statistics(group_by)
+        result = {
+            **self.status(),
+            "total_bytes": sum(s.size for s in stats),
+            "top": [_stat_entry(s) for s in stats[:limit]]
+        }
+        if diff and previous is not None:
+            changes = snapshot.compare_to(previous, group_by)
+            result["growth"] = [_stat_entry(s) for s in changes[:limit] if s.size_diff > 0]
+        return result
+
+
+def _stat_entry(stat) -> Dict:
+    """JSON-friendly form of a Statistic or StatisticDiff."""
+    frames = [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+    entry = {
+        "site": frames[0] if len(frames) == 1 else frames,
+        "size_bytes": stat.size,
+        "count": stat.count
+    }
+    if hasattr(stat, "size_diff"):
+        entry["size_diff_bytes"] = stat.size_diff
+        entry["count_diff"] = stat.count_diff
+    return entry
+
+
+def deep_sizeof(obj, max_objects: int = 200000) -> Dict:
+    """
+    Estimate the memory retained by an object graph.
+    
+    Follows gc referents breadth-first, counting each object once and
+    skipping types, modules and functions (shared, not owned). Stops after
+    max_objects objects, so the result is a lower bound on huge structures.
+    
+    Args:
+        obj: Root object
+        max_objects: Walk limit
+    
+    Returns:
+        Dictionary with bytes, objects and whether the walk was truncated
+    """
+    seen = set()
+    pending: List = [obj]
+    total = 0
+    
+    while pending and len(seen) < max_objects:
+        current = pending.pop()
+        if id(current) in seen or isinstance(current, _SHARED_TYPES):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current, 0)
+        pending.extend(gc.get_referents(current))
+    
+    return {"bytes": total, "objects": len(seen), "truncated": bool(pending)}
+
+
+_SHARED_TYPES = (type, type(sys), type(deep_sizeof), type(len), type(deep_sizeof.__code__))
+
+
+def process_memory() -> Dict:
+    """Resident and peak memory of this process, where the platform reports them."""
+    result = {}
+    try:
+        with open("/proc/self/statm") as f:
+            result["rss_bytes"] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result["peak_rss_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+    result["gc_counts"] = gc.get_count()
+    result["gc_objects"] = len(gc.get_objects())
+    result["threads"] = threading.active_count()
+    return result
+
+
+def measure(structures: Dict[str, object], names: Optional[Iterable[str]] = None, max_objects: int = 200000) -> Dict:
+    """
+    Deep sizes of named structures (None entries are reported as absent).
+    
+    Args:
+        structures: Name to object
+        names: Optional subset to measure
+        max_objects: Walk limit per structure
+    
+    Returns:
+        Name to deep_sizeof result (or None)
+    """
+    wanted = set(names) if names else None
+    return {
+        name: deep_sizeof(obj, max_objects) if obj is not None else None
+        for name, obj in structures.items()
+        if wanted is None or name in wanted
+    }
@@ -0,0 +1,251 @@
+"""
+Zero-downtime provider reload
+Holds the active provider set and swaps it atomically: the replacement is
+built and warmed up first, new requests go to it immediately, and requests
+already in flight finish on the old set before it is closed.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+from .base import BaseLLMProvider
+from .settings import Settings
+from .tenants import TenantConfig, TenantRegistry
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderGeneration:
+    """
+    One generation of providers built from a single Settings snapshot.
+    
+    Tracks how many requests are using it so it can be drained before
+    its network resources are released.
+    """
+    
+    def __init__(
+        self,
+        settings: Settings,
+        provider: Optional[BaseLLMProvider],
+        shadow=None,
+        version: int = 0,
+        tenants: Optional[TenantRegistry] = None,
+        tenant_providers: Optional[Dict[str, Optional[BaseLLMProvider]]] = None
+    ):
+        """
+        Initialize a provider generation.
+        
+        Args:
+            settings: Settings the providers were built from
+            provider: Primary provider (None if not configured)
+            shadow: Optional ShadowMirror for this generation
+            version: Monotonic generation number
+            tenants: Tenant registry (a single default tenant if omitted)
+            tenant_providers: Providers of tenants that do not use the primary,
+                by tenant id (None if the tenant's provider failed to build)
+        """
+        self.settings = settings
+        self.provider = provider
+        self.shadow = shadow
+        self.tenants = tenants or TenantRegistry([])
+        self.tenant_providers = tenant_providers or {}
+        self.version = version
+        self.in_flight = 0
+        self._idle = threading.Condition()
+    
+    def provider_for(self, tenant: TenantConfig) -> Optional[BaseLLMProvider]:
+        """Get the provider that serves a tenant."""
+        if tenant.id in self.tenant_providers:
+            return self.tenant_providers[tenant.id]
+        return self.provider
+    
+    def providers(self) -> List[BaseLLMProvider]:
+        """Get every provider in this generation (primary, shadow and tenant providers)."""
+        providers = [self.provider] if self.provider else []
+        if self.shadow:
+            providers.append(self.shadow.provider)
+        for provider in self.tenant_providers.values():
+            if provider and all(provider is not p for p in providers):
+                providers.append(provider)
+        return providers
+    
+    def acquire(self):
+        """Register a request using this generation."""
+        with self._idle:
+            self.in_flight += 1
+    
+    def release(self):
+        """Unregister a finished request."""
+        with self._idle:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self._idle.notify_all()
+    
+    def drain(self, timeout: float) -> bool:
+        """
+        Wait until no request is using this generation.
+        
+        Args:
+            timeout: Maximum seconds to wait
+        
+        Returns:
+            True if drained, False on timeout
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self.in_flight == 0, timeout=timeout)
+    
+    def close(self):
+        """Release provider, shadow and tenant provider resources."""
+        if self.shadow:
+            timeout = self.settings.reload_drain_timeout
+            if not self.shadow.shutdown(timeout):
+                logger.warning(f"Shadow calls still running after {timeout}s; closing the shadow provider anyway")
+        for provider in self.providers():
+            try:
+                provider.close()
+            except Exception as e:
+                logger.warning(f"Error closing provider: {str(e)}")
+
+
+def warm_up_generation(generation: ProviderGeneration):
+    """
+    Warm up every provider in a generation.
+    
+    The primary provider must warm up successfully; a shadow or tenant
+    provider that fails is only logged, so it cannot block the others.
+    
+    Args:
+        generation: Generation to warm up
+    
+    Raises:
+        Exception: If the primary provider fails to warm up
+    """
+    for provider in generation.providers():
+        started = time.time()
+        try:
+            provider.warm_up()
+        except Exception as e:
+            if provider is generation.provider:
+                raise
+            logger.warning(f"{provider.get_provider_name()} warm-up failed: {str(e)}")
+            continue
+        logger.info(
+            f"Warmed up {provider.get_provider_name()} "
+            f"in {(time.time() - started) * 1000:.0f}ms"
+        )
+
+
+class ProviderManager:
+    """
+    Owns the active ProviderGeneration and performs hot reloads.
+    
+    Request handlers take a lease on the current generation for the whole
+    request, so a reload never changes the provider underneath them.
+    """
+    
+    def __init__(self, builder: Callable[[Settings], ProviderGeneration]):
+        """
+        Initialize provider manager.
+        
+        Args:
+            builder: Builds an (unwarmed) ProviderGeneration from settings
+        """
+        self._builder = builder
+        self._current: Optional[ProviderGeneration] = None
+        self._swap_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._version = 0
+        self.last_reload: Optional[float] = None
+    
+    @property
+    def current(self) -> Optional[ProviderGeneration]:
+        """Get the active generation."""
+        return self._current
+    
+    @contextmanager
+    def lease(self) -> Iterator[ProviderGeneration]:
+        """
+        Pin the active generation for the duration of a request.
+        
+        Yields:
+            The generation that must serve the whole request
+        """
+        with self._swap_lock:
+            generation = self._current
+            generation.acquire()
+        try:
+            yield generation
+        finally:
+            generation.release()
+    
+    def load(self, settings: Settings, warm_up: bool = False) -> ProviderGeneration:
+        """
+        Build, optionally warm up, and activate providers for new settings.
+        
+        The previous generation keeps serving until the swap, then drains its
+        in-flight requests and is closed.
+        
+        Args:
+            settings: Validated settings to build from
+            warm_up: Warm up the new primary provider before the swap
+        
+        Returns:
+            The newly active generation
+        
+        Raises:
+            Exception: If building or warming up fails (the old generation stays active)
+        """
+        with self._reload_lock:
+            self._version += 1
+            generation = self._builder(settings)
+            generation.version = self._version
+            
+            if warm_up:
+                try:
+                    warm_up_generation(generation)
+                except Exception:
+                    generation.close()
+                    raise
+            
+            self._activate(generation)
+            return generation
+    
+    def activate(self, generation: ProviderGeneration):
+        """
+        Make an already built generation active.
+        
+        Args:
+            generation: Generation to activate
+        """
+        with self._reload_lock:
+            self._version += 1
+            generation.version = self._version
+            self._activate(generation)
+    
+    def _activate(self, generation: ProviderGeneration):
+        """Swap in a generation, then drain and close the previous one."""
+        with self._swap_lock:
+            previous, self._current = self._current, generation
+        self.last_reload = time.time()
+        
+        if previous:
+            timeout = generation.settings.reload_drain_timeout
+            logger.info(
+                f"Swapped to provider generation {generation.version}; "
+                f"draining {previous.in_flight} in-flight request(s) on generation {previous.version}"
+            )
+            if not previous.drain(timeout):
+                logger.warning(
+                    f"Generation {previous.version} still has {previous.in_flight} "
+                    f"request(s) after {timeout}s; closing anyway"
+                )
+            previous.close()
+    
+    def close(self):
+        """Close the active generation."""
+        with self._swap_lock:
+            current, self._current = self._current, None
+        if current:
+            current.close()
@@ -0,0 +1,259 @@
+"""
+Priority scheduling for provider calls
+Shares a fixed number of concurrent provider calls between traffic classes
+(interactive chat and batch jobs) with weighted fair queueing, capacity
+reserved for interactive traffic and, optionally, batch admitted only when
+the provider would otherwise sit idle.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Deque, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+
+class SchedulerTimeout(Exception):
+    """Raised when a request waits longer than the queue timeout for a slot"""
+    pass
+
+
+class _Waiter:
+    """A queued request; woken through a thread event or an asyncio future"""
+    
+    __slots__ = ("tag", "priority", "enqueued_at", "granted", "_event", "_loop", "_future")
+    
+    def __init__(self, tag: float, priority: str, loop=None):
+        self.tag = tag
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self._loop = loop
+        self._future = loop.create_future() if loop else None
+        self._event = None if loop else threading.Event()
+    
+    def grant(self):
+        self.granted = True
+        if self._future is not None:
+            self._loop.call_soon_threadsafe(_resolve, self._future)
+        else:
+            self._event.set()
+
+
+def _resolve(future: "asyncio.Future"):
+    if not future.done():
+        future.set_result(True)
+
+
+class _TrafficClass:
+    """Queue and counters of one priority class"""
+    
+    def __init__(self, name: str, weight: float):
+        self.name = name
+        self.weight = weight
+        self.queue: Deque[_Waiter] = deque()
+        self.last_tag = 0.0
+        self.running = 0
+        self.admitted = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+
+
+class PriorityScheduler:
+    """
+    Admission control for provider calls by traffic class.
+    
+    Up to max_concurrency calls run at once. Waiting requests are ordered by
+    weighted fair queueing: each gets a virtual finish tag of 1/weight past
+    its class's previous tag, and the smallest eligible tag runs next, so
+    under contention classes share slots in proportion to their weights.
+    
+    The last reserved_interactive slots only ever go to interactive
+    requests. With batch_idle_only, batch requests are also held back
+    while any interactive request is waiting, i.e. they only use capacity
+    interactive traffic is not asking for.
+    
+    Async callers wait on the event loop without holding a worker thread;
+    sync callers block their thread.
+    """
+    
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        reserved_interactive: int = 4,
+        weights: Optional[Dict[str, float]] = None,
+        batch_idle_only: bool = True,
+        queue_timeout: float = 30.0
+    ):
+        """
+        Initialize scheduler.
+        
+        Args:
+            max_concurrency: Maximum concurrent provider calls
+            reserved_interactive: Slots that only interactive requests may use
+            weights: Fair-queueing weight per class
+            batch_idle_only: Admit batch requests only when no interactive request waits
+            queue_timeout: Seconds a request may wait for a slot
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.reserved_interactive = min(max(0, reserved_interactive), self.max_concurrency - 1)
+        self.batch_idle_only = batch_idle_only
+        self.queue_timeout = queue_timeout
+        weights = weights or {INTERACTIVE: 4.0, BATCH: 1.0}
+        self._classes = {name: _TrafficClass(name, max(weight, 1e-6)) for name, weight in weights.items()}
+        self._virtual_time = 0.0
+        self._lock = threading.Lock()
+    
+    @property
+    def running(self) -> int:
+        return sum(c.running for c in self._classes.values())
+    
+    def _enqueue(self, waiter: _Waiter):
+        """Tag and queue a waiter (lock held)."""
+        cls = self._classes[waiter.priority]
+        waiter.tag = max(self._virtual_time, cls.last_tag) + 1.0 / cls.weight
+        cls.last_tag = waiter.tag
+        cls.queue.append(waiter)
+    
+    def _can_admit(self, cls: _TrafficClass) -> bool:
+        """Check whether the head of a class may start now (lock held)."""
+        running = self.running
+        if running >= self.max_concurrency:
+            return False
+        if cls.name == INTERACTIVE:
+            return True
+        if running >= self.max_concurrency - self.reserved_interactive:
+            return False
+        interactive = self._classes.get(INTERACTIVE)
+        return not (self.batch_idle_only and interactive and interactive.queue)
+    
+    def _dispatch(self):
+        """Grant slots to eligible waiters in virtual finish order (lock held)."""
+        while True:
+            candidates = [c for c in self._classes.values() if c.queue and self._can_admit(c)]
+            if not candidates:
+                return
+            cls = min(candidates, key=lambda c: c.queue[0].tag)
+            waiter = cls.queue.popleft()
+            self._virtual_time = waiter.tag
+            cls.running += 1
+            cls.admitted += 1
+            cls.total_wait += time.monotonic() - waiter.enqueued_at
+            waiter.grant()
+    
+    def _abandon(self, waiter: _Waiter):
+        """Withdraw a waiter that timed out or was cancelled (lock held)."""
+        cls = self._classes[waiter.priority]
+        if waiter.granted:
+            cls.running -= 1
+            self._dispatch()
+        else:
+            cls.queue.remove(waiter)
+    
+    def _check_priority(self, priority: str):
+        if priority not in self._classes:
+            raise ValueError(f"Unknown priority '{priority}'. Supported: {', '.join(self._classes)}")
+    
+    def acquire(self, priority: str = INTERACTIVE):
+        """
+        Block the calling thread until a slot is granted.
+        
+        Args:
+            priority: Traffic class
+        
+        Raises:
+            SchedulerTimeout: If no slot was granted within queue_timeout
+        """
+        self._check_priority(priority)
+        waiter = _Waiter(0.0, priority)
+        with self._lock:
+            self._enqueue(waiter)
+            self._dispatch()
+        
+        if not waiter._event.wait(self.queue_timeout):
+            with self._lock:
+                if not waiter.granted:
+                    self._classes[priority].timeouts += 1
+                    self._abandon(waiter)
+                    raise SchedulerTimeout(f"No {priority} slot free after {self.queue_timeout:g}s")
+    
+    async def acquire_async(self, priority: str = INTERACTIVE):
+        """
+        Wait on the event loop until a slot is granted.
+        
+        Args:
+            priority: Traffic class
+        
+        Raises:
+            SchedulerTimeout: If no slot was granted within queue_timeout
+        """
+        self._check_priority(priority)
+        waiter = _Waiter(0.0, priority, loop=asyncio.get_running_loop())
+        with self._lock:
+            self._enqueue(waiter)
+            self._dispatch()
+        
+        try:
+            await asyncio.wait_for(waiter._future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if waiter.granted:
+                    return
+                self._classes[priority].timeouts += 1
+                self._abandon(waiter)
+            raise SchedulerTimeout(f"No {priority} slot free after {self.queue_timeout:g}s")
+        except asyncio.CancelledError:
+            with self._lock:
+                self._abandon(waiter)
+            raise
+    
+    def release(self, priority: str = INTERACTIVE):
+        """Return a slot and admit the next waiter."""
+        with self._lock:
+            self._classes[priority].running -= 1
+            self._dispatch()
+    
+    @contextmanager
+    def slot(self, priority: str = INTERACTIVE):
+        """Hold a slot for the duration of a block (sync callers)."""
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+    
+    @asynccontextmanager
+    async def async_slot(self, priority: str = INTERACTIVE):
+        """Hold a slot for the duration of a block (async callers)."""
+        await self.acquire_async(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+    
+    def get_stats(self) -> Dict:
+        """Get running and queued requests, admissions and mean wait per class."""
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "reserved_interactive": self.reserved_interactive,
+                "running": self.running,
+                "classes": {
+                    c.name: {
+                        "weight": c.weight,
+                        "running": c.running,
+                        "queued": len(c.queue),
+                        "admitted": c.admitted,
+                        "timeouts": c.timeouts,
+                        "average_wait_ms": round(c.total_wait / c.admitted * 1000, 2) if c.admitted else 0.0
+                    }
+                    for c in self._classes.values()
+                }
+            }
@@ -0,0 +1,196 @@
+"""
+Resumable chat sessions for the WebSocket transport
+Keeps each widget session's conversation history on the server, so clients
+send only the new message per turn, and buffers the frames sent to the
+client with sequence numbers, so a client that reconnects can resume where
+its previous connection stopped.
+"""
+
+import asyncio
+import secrets
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ChatSession:
+    """
+    One widget session: history, sent frames and the attached connection.
+    
+    Sessions are only touched from the event loop thread, so they need no
+    locking; worker threads hand frames over with call_soon_threadsafe.
+    """
+    
+    def __init__(self, session_id: str, tenant_id: str, history_messages: int = 20, replay_frames: int = 500):
+        """
+        Initialize session.
+        
+        Args:
+            session_id: Random session identifier
+            tenant_id: Tenant the session belongs to
+            history_messages: Messages of history kept for the prompt
+            replay_frames: Sent frames kept for resuming
+        """
+        self.id = session_id
+        self.tenant_id = tenant_id
+        self.history: Deque[Dict[str, str]] = deque(maxlen=history_messages)
+        self.frames: Deque[Dict] = deque(maxlen=replay_frames)
+        self.seq = 0
+        self.busy = False
+        self.seen_ids: Deque[str] = deque(maxlen=32)
+        self.last_active = time.monotonic()
+        self._outbox: Optional["asyncio.Queue[Dict]"] = None
+    
+    @property
+    def connected(self) -> bool:
+        return self._outbox is not None
+    
+    def emit(self, frame: Dict) -> Dict:
+        """
+        Number a frame, keep it for replay and pass it to the attached connection.
+        
+        Args:
+            frame: JSON-serializable frame
+        
+        Returns:
+            The frame with its sequence number
+        """
+        self.seq += 1
+        frame = {**frame, "seq": self.seq}
+        self.frames.append(frame)
+        self.last_active = time.monotonic()
+        if self._outbox is not None:
+            self._outbox.put_nowait(frame)
+        return frame
+    
+    def attach(self, outbox: "asyncio.Queue[Dict]"):
+        """Route new frames to a connection, replacing any previous one."""
+        self._outbox = outbox
+        self.last_active = time.monotonic()
+    
+    def detach(self, outbox: "asyncio.Queue[Dict]"):
+        """Stop routing frames to a connection that has closed."""
+        if self._outbox is outbox:
+            self._outbox = None
+        self.last_active = time.monotonic()
+    
+    def replay(self, last_seq: int) -> Optional[List[Dict]]:
+        """
+        Frames the client has not seen yet.
+        
+        Args:
+            last_seq: Highest sequence number the client received
+        
+        Returns:
+            Frames after last_seq, or None if some of them are no longer
+            buffered (the client must then rebuild from the history)
+        """
+        if last_seq >= self.seq:
+            return []
+        if not self.frames or self.frames[0]["seq"] > last_seq + 1:
+            return None
+        return [f for f in self.frames if f["seq"] > last_seq]
+    
+    def add_turn(self, message: str, reply: str):
+        """Append a completed exchange to the history."""
+        self.history.append({"role": "user", "content": message})
+        self.history.append({"role": "assistant", "content": reply})
+
+
+class SessionStore:
+    """
+    Sessions by id, expiring after a period without activity.
+    
+    A session stays resumable for ttl seconds after its connection closes;
+    connected sessions and sessions with a turn in progress never expire.
+    When max_sessions is reached the least recently active idle session is
+    dropped.
+    """
+    
+    def __init__(
+        self,
+        ttl: float = 600.0,
+        max_sessions: int = 10000,
+        history_messages: int = 20,
+        replay_frames: int = 500
+    ):
+        """
+        Initialize session store.
+        
+        Args:
+            ttl: Seconds a disconnected session can be resumed
+            max_sessions: Maximum sessions kept
+            history_messages: Messages of history kept per session
+            replay_frames: Sent frames kept per session for resuming
+        """
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.history_messages = history_messages
+        self.replay_frames = replay_frames
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._next_sweep = 0.0
+        self.stats = {"created": 0, "resumed": 0, "expired": 0, "replayed_frames": 0}
+    
+    def create(self, tenant_id: str) -> ChatSession:
+        """Start a new session for a tenant."""
+        self._evict()
+        session = ChatSession(secrets.token_urlsafe(16), tenant_id, self.history_messages, self.replay_frames)
+        self._sessions[session.id] = session
+        self.stats["created"] += 1
+        return session
+    
+    def get(self, session_id: str, tenant_id: str) -> Optional[ChatSession]:
+        """
+        Look up a session to resume.
+        
+        Args:
+            session_id: Session id from the client
+            tenant_id: Tenant of the new connection
+        
+        Returns:
+            The session, or None if it is unknown, expired or belongs to another tenant
+        """
+        self._evict()
+        session = self._sessions.get(session_id)
+        if session is not None and not session.connected and not session.busy \
+                and time.monotonic() - session.last_active > self.ttl:
+            del self._sessions[session_id]
+            self.stats["expired"] += 1
+            session = None
+        if session is None or session.tenant_id != tenant_id:
+            return None
+        self._sessions.move_to_end(session_id)
+        self.stats["resumed"] += 1
+        return session
+    
+    def _evict(self):
+        """Drop expired sessions, then the oldest idle ones beyond max_sessions."""
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            # A full sweep at most a few times per TTL keeps lookups cheap
+            self._next_sweep = now + min(self.ttl / 4, 60.0)
+            for session_id, session in list(self._sessions.items()):
+                if not session.connected and not session.busy and now - session.last_active > self.ttl:
+                    del self._sessions[session_id]
+                    self.stats["expired"] += 1
+        
+        if len(self._sessions) >= self.max_sessions:
+            for session_id, session in list(self._sessions.items()):
+                if len(self._sessions) < self.max_sessions:
+                    break
+                if not session.connected and not session.busy:
+                    del self._sessions[session_id]
+                    self.stats["expired"] += 1
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get session counts."""
+        sessions = list(self._sessions.values())
+        return {
+            **self.stats,
+            "sessions": len(sessions),
+            "connected": sum(1 for s in sessions if s.connected),
+            "busy": sum(1 for s in sessions if s.busy)
+        }
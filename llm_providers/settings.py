@@ -0,0 +1,472 @@
+"""
+Typed application settings
+Reads all chatbot configuration from the environment once, so a running
+server works from a consistent, validated snapshot that can be swapped
+as a whole on reload.
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Tuple
+from .config_validator import ConfigValidator
+from .prefilter import load_rules
+from .tenants import TenantConfig, load_tenants
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _get_int(env: Mapping[str, str], name: str, default: int) -> int:
+    """Read an integer variable, naming it in the error if malformed."""
+    value = env.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got {value!r}")
+
+
+def _get_float(env: Mapping[str, str], name: str, default: float) -> float:
+    """Read a float variable, naming it in the error if malformed."""
+    value = env.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {value!r}")
+
+
+def _get_bool(env: Mapping[str, str], name: str, default: bool) -> bool:
+    """Read a boolean variable (1/true/yes/on)."""
+    value = env.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Immutable snapshot of the chatbot configuration"""
+    
+    llm_provider: str = "openai"
+    
+    # Provider credentials and models
+    openai_api_key: Optional[str] = None
+    groq_api_key: Optional[str] = None
+    watsonx_api_key: Optional[str] = None
+    openai_model: str = "gpt-3.5-turbo"
+    groq_model: str = "llama3-70b-8192"
+    watsonx_model: str = "ibm/granite-13b-chat-v2"
+    watsonx_project_id: Optional[str] = None
+    watsonx_url: str = "https://us-south.ml.cloud.ibm.com"
+    
+    # API key pools: every key gets its own client and rate-limit state
+    openai_api_keys: Tuple[str, ...] = ()  # OPENAI_API_KEY plus OPENAI_API_KEYS
+    groq_api_keys: Tuple[str, ...] = ()  # GROQ_API_KEY plus GROQ_API_KEYS
+    key_cooldown_seconds: float = 10.0  # Rest after a 429 that gives no retry-after
+    
+    # Local CPU model (llama-cpp-python)
+    local_model_path: Optional[str] = None  # GGUF file
+    local_slots: int = 1  # Requests the local model serves at once
+    local_threads: int = 0  # CPU threads per slot; 0 splits the CPUs between slots
+    local_context_size: int = 2048
+    local_chat_format: Optional[str] = None  # Defaults to the template stored in the model
+    local_prompt_cache_mb: float = 64.0  # Per-slot cache of evaluated prompt prefixes; 0 disables
+    local_slot_timeout: float = 30.0
+    
+    # Generation defaults
+    max_tokens: int = 500
+    temperature: float = 0.7
+    
+    # Cascade provider
+    cascade_fast_provider: str = "groq"
+    cascade_fast_model: str = "llama3-8b-8192"
+    cascade_strong_provider: str = "groq"
+    cascade_strong_model: str = "llama3-70b-8192"
+    cascade_fast_max_tokens: int = 200
+    
+    # Adaptive max_tokens: per-request budget learned from observed reply lengths
+    adaptive_max_tokens: bool = True
+    adaptive_min_tokens: int = 64
+    adaptive_margin: float = 0.3
+    adaptive_min_samples: int = 20
+    cascade_max_message_chars: int = 280
+    cascade_max_history: int = 6
+    cascade_keywords: Optional[str] = None
+    
+    # Shadow traffic
+    shadow_provider: Optional[str] = None
+    shadow_model: Optional[str] = None
+    shadow_sample_rate: float = 0.1
+    shadow_max_concurrency: int = 2
+    
+    # Connection warm-up and keep-alive
+    warmup_connections: int = 2
+    keepalive_expiry: float = 120.0
+    heartbeat_interval: float = 0.0  # 0 disables the heartbeat
+    
+    # Background health probing
+    health_probe_interval: float = 60.0  # 0 disables probing
+    health_failure_threshold: int = 2
+    
+    # Local knowledge index
+    knowledge_path: Optional[str] = None
+    knowledge_top_k: int = 3
+    knowledge_answer_threshold: float = 0.85
+    knowledge_min_confidence: float = 0.3
+    knowledge_embeddings: bool = False
+    
+    # Response cache
+    cache_enabled: bool = False
+    cache_path: Optional[str] = ".cache/responses.sqlite3"  # Empty keeps the cache in-process only
+    cache_ttl_seconds: float = 3600.0
+    cache_max_entries: int = 10000
+    cache_l1_entries: int = 256
+    near_duplicate_enabled: bool = True  # Reuse cached answers for paraphrased first questions
+    near_duplicate_threshold: float = 0.8  # Minimum word-set Jaccard similarity
+    near_duplicate_max_entries: int = 10000
+    
+    # Local pre-filter for junk and abusive messages
+    prefilter_enabled: bool = True
+    prefilter_max_chars: int = 4000
+    prefilter_max_bytes: int = 32000  # Message plus history, UTF-8
+    prefilter_max_links: int = 5
+    prefilter_gibberish: bool = True
+    prefilter_rules_file: Optional[str] = None  # Extra rules (JSON)
+    
+    # Idempotency keys
+    idempotency_ttl_seconds: float = 300.0
+    idempotency_max_keys: int = 10000
+    
+    # Usage ledger
+    ledger_path: Optional[str] = None  # Directory; unset disables the ledger
+    ledger_batch_size: int = 200
+    ledger_flush_interval: float = 5.0
+    ledger_queue_size: int = 10000
+    ledger_rotate_mb: float = 64.0
+    ledger_transcripts: bool = False
+    
+    # Priority scheduling of provider calls
+    scheduler_max_concurrency: int = 16  # 0 disables scheduling
+    scheduler_reserved_interactive: int = 4
+    scheduler_interactive_weight: float = 4.0
+    scheduler_batch_weight: float = 1.0
+    scheduler_batch_idle_only: bool = True
+    scheduler_queue_timeout: float = 30.0
+    
+    # Multi-tenant widgets and API clients
+    tenants_file: Optional[str] = None
+    
+    # WebSocket chat sessions
+    ws_heartbeat_seconds: float = 20.0
+    ws_session_ttl_seconds: float = 600.0  # How long a disconnected session can be resumed
+    ws_max_sessions: int = 10000
+    ws_history_messages: int = 20
+    ws_replay_frames: int = 500
+    
+    # Widget bundle served from /widget/
+    widget_path: Optional[str] = "chatbot/antigravity-widget.js"  # Empty disables the route
+    widget_loader_max_age: int = 300
+    
+    # Server and administration
+    compression_min_bytes: int = 1000  # Responses at least this large are compressed; 0 disables
+    cors_origins: Tuple[str, ...] = ("*",)
+    port: int = 8000
+    admin_token: Optional[str] = None
+    reload_warmup: bool = True
+    reload_drain_timeout: float = 30.0
+    profile_max_seconds: float = 60.0  # Longest CPU profile /admin/profile/cpu may run
+    loop_monitor_interval: float = 0.1  # Event-loop lag probe period; 0 disables the monitor
+    loop_block_threshold: float = 0.25  # Stalls longer than this log the loop thread's stack
+    
+    # Raw environment snapshot, used for validation
+    env: Mapping[str, str] = field(default_factory=dict, repr=False, compare=False)
+    
+    @classmethod
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> "Settings":
+        """
+        Build settings from environment variables.
+        
+        Args:
+            env: Mapping to read from (defaults to os.environ)
+        
+        Returns:
+            Settings instance
+        
+        Raises:
+            ValueError: If a numeric variable is malformed
+        """
+        env = dict(os.environ if env is None else env)
+        
+        return cls(
+            llm_provider=env.get("LLM_PROVIDER", "openai").lower().strip(),
+            # The first key of a pool stands in when the single key is unset
+            openai_api_key=(ConfigValidator.list_api_keys("OPENAI_API_KEY", env) or [None])[0],
+            groq_api_key=(ConfigValidator.list_api_keys("GROQ_API_KEY", env) or [None])[0],
+            watsonx_api_key=env.get("WATSONX_API_KEY") or None,
+            openai_model=env.get("OPENAI_MODEL", "gpt-3.5-turbo"),
+            groq_model=env.get("GROQ_MODEL", "llama3-70b-8192"),
+            watsonx_model=env.get("WATSONX_MODEL", "ibm/granite-13b-chat-v2"),
+            watsonx_project_id=env.get("WATSONX_PROJECT_ID") or None,
+            watsonx_url=env.get("WATSONX_URL", "https://us-south.ml.cloud.ibm.com"),
+            openai_api_keys=tuple(ConfigValidator.list_api_keys("OPENAI_API_KEY", env)),
+            groq_api_keys=tuple(ConfigValidator.list_api_keys("GROQ_API_KEY", env)),
+            key_cooldown_seconds=_get_float(env, "KEY_COOLDOWN_SECONDS", 10.0),
+            local_model_path=env.get("LOCAL_MODEL_PATH") or None,
+            local_slots=_get_int(env, "LOCAL_SLOTS", 1),
+            local_threads=_get_int(env, "LOCAL_THREADS", 0),
+            local_context_size=_get_int(env, "LOCAL_CONTEXT_SIZE", 2048),
+            local_chat_format=env.get("LOCAL_CHAT_FORMAT") or None,
+            local_prompt_cache_mb=_get_float(env, "LOCAL_PROMPT_CACHE_MB", 64.0),
+            local_slot_timeout=_get_float(env, "LOCAL_SLOT_TIMEOUT", 30.0),
+            max_tokens=_get_int(env, "MAX_TOKENS", 500),
+            temperature=_get_float(env, "TEMPERATURE", 0.7),
+            cascade_fast_provider=env.get("CASCADE_FAST_PROVIDER", "groq").lower().strip(),
+            cascade_fast_model=env.get("CASCADE_FAST_MODEL", "llama3-8b-8192"),
+            cascade_strong_provider=env.get("CASCADE_STRONG_PROVIDER", "groq").lower().strip(),
+            cascade_strong_model=env.get("CASCADE_STRONG_MODEL", "llama3-70b-8192"),
+            cascade_fast_max_tokens=_get_int(env, "CASCADE_FAST_MAX_TOKENS", 200),
+            adaptive_max_tokens=_get_bool(env, "ADAPTIVE_MAX_TOKENS", True),
+            adaptive_min_tokens=_get_int(env, "ADAPTIVE_MIN_TOKENS", 64),
+            adaptive_margin=_get_float(env, "ADAPTIVE_MARGIN", 0.3),
+            adaptive_min_samples=_get_int(env, "ADAPTIVE_MIN_SAMPLES", 20),
+            cascade_max_message_chars=_get_int(env, "CASCADE_MAX_MESSAGE_CHARS", 280),
+            cascade_max_history=_get_int(env, "CASCADE_MAX_HISTORY", 6),
+            cascade_keywords=env.get("CASCADE_KEYWORDS") or None,
+            shadow_provider=env.get("SHADOW_PROVIDER", "").lower().strip() or None,
+            shadow_model=env.get("SHADOW_MODEL") or None,
+            shadow_sample_rate=_get_float(env, "SHADOW_SAMPLE_RATE", 0.1),
+            shadow_max_concurrency=_get_int(env, "SHADOW_MAX_CONCURRENCY", 2),
+            warmup_connections=_get_int(env, "WARMUP_CONNECTIONS", 2),
+            keepalive_expiry=_get_float(env, "KEEPALIVE_EXPIRY", 120.0),
+            heartbeat_interval=_get_float(env, "HEARTBEAT_INTERVAL", 0.0),
+            health_probe_interval=_get_float(env, "HEALTH_PROBE_INTERVAL", 60.0),
+            health_failure_threshold=_get_int(env, "HEALTH_FAILURE_THRESHOLD", 2),
+            knowledge_path=env.get("KNOWLEDGE_PATH") or None,
+            knowledge_top_k=_get_int(env, "KNOWLEDGE_TOP_K", 3),
+            knowledge_answer_threshold=_get_float(env, "KNOWLEDGE_ANSWER_THRESHOLD", 0.85),
+            knowledge_min_confidence=_get_float(env, "KNOWLEDGE_MIN_CONFIDENCE", 0.3),
+            knowledge_embeddings=_get_bool(env, "KNOWLEDGE_EMBEDDINGS", False),
+            cache_enabled=_get_bool(env, "CACHE_ENABLED", False),
+            cache_path=env.get("CACHE_PATH", ".cache/responses.sqlite3") or None,
+            cache_ttl_seconds=_get_float(env, "CACHE_TTL_SECONDS", 3600.0),
+            cache_max_entries=_get_int(env, "CACHE_MAX_ENTRIES", 10000),
+            cache_l1_entries=_get_int(env, "CACHE_L1_ENTRIES", 256),
+            near_duplicate_enabled=_get_bool(env, "NEAR_DUPLICATE_ENABLED", True),
+            near_duplicate_threshold=_get_float(env, "NEAR_DUPLICATE_THRESHOLD", 0.8),
+            near_duplicate_max_entries=_get_int(env, "NEAR_DUPLICATE_MAX_ENTRIES", 10000),
+            prefilter_enabled=_get_bool(env, "PREFILTER_ENABLED", True),
+            prefilter_max_chars=_get_int(env, "PREFILTER_MAX_CHARS", 4000),
+            prefilter_max_bytes=_get_int(env, "PREFILTER_MAX_BYTES", 32000),
+            prefilter_max_links=_get_int(env, "PREFILTER_MAX_LINKS", 5),
+            prefilter_gibberish=_get_bool(env, "PREFILTER_GIBBERISH", True),
+            prefilter_rules_file=env.get("PREFILTER_RULES_FILE") or None,
+            idempotency_ttl_seconds=_get_float(env, "IDEMPOTENCY_TTL_SECONDS", 300.0),
+            idempotency_max_keys=_get_int(env, "IDEMPOTENCY_MAX_KEYS", 10000),
+            ledger_path=env.get("LEDGER_PATH") or None,
+            ledger_batch_size=_get_int(env, "LEDGER_BATCH_SIZE", 200),
+            ledger_flush_interval=_get_float(env, "LEDGER_FLUSH_INTERVAL", 5.0),
+            ledger_queue_size=_get_int(env, "LEDGER_QUEUE_SIZE", 10000),
+            ledger_rotate_mb=_get_float(env, "LEDGER_ROTATE_MB", 64.0),
+            ledger_transcripts=_get_bool(env, "LEDGER_TRANSCRIPTS", False),
+            scheduler_max_concurrency=_get_int(env, "SCHEDULER_MAX_CONCURRENCY", 16),
+            scheduler_reserved_interactive=_get_int(env, "SCHEDULER_RESERVED_INTERACTIVE", 4),
+            scheduler_interactive_weight=_get_float(env, "SCHEDULER_INTERACTIVE_WEIGHT", 4.0),
+            scheduler_batch_weight=_get_float(env, "SCHEDULER_BATCH_WEIGHT", 1.0),
+            scheduler_batch_idle_only=_get_bool(env, "SCHEDULER_BATCH_IDLE_ONLY", True),
+            scheduler_queue_timeout=_get_float(env, "SCHEDULER_QUEUE_TIMEOUT", 30.0),
+            tenants_file=env.get("TENANTS_FILE") or None,
+            ws_heartbeat_seconds=_get_float(env, "WS_HEARTBEAT_SECONDS", 20.0),
+            ws_session_ttl_seconds=_get_float(env, "WS_SESSION_TTL_SECONDS", 600.0),
+            ws_max_sessions=_get_int(env, "WS_MAX_SESSIONS", 10000),
+            ws_history_messages=_get_int(env, "WS_HISTORY_MESSAGES", 20),
+            ws_replay_frames=_get_int(env, "WS_REPLAY_FRAMES", 500),
+            widget_path=env.get("WIDGET_PATH", "chatbot/antigravity-widget.js") or None,
+            widget_loader_max_age=_get_int(env, "WIDGET_LOADER_MAX_AGE", 300),
+            compression_min_bytes=_get_int(env, "COMPRESSION_MIN_BYTES", 1000),
+            cors_origins=tuple(o.strip() for o in env.get("CORS_ORIGINS", "*").split(",")),
+            port=_get_int(env, "PORT", 8000),
+            admin_token=env.get("ADMIN_TOKEN") or None,
+            reload_warmup=_get_bool(env, "RELOAD_WARMUP", True),
+            reload_drain_timeout=_get_float(env, "RELOAD_DRAIN_TIMEOUT", 30.0),
+            profile_max_seconds=_get_float(env, "PROFILE_MAX_SECONDS", 60.0),
+            loop_monitor_interval=_get_float(env, "LOOP_MONITOR_INTERVAL", 0.1),
+            loop_block_threshold=_get_float(env, "LOOP_BLOCK_THRESHOLD", 0.25),
+            env=env
+        )
+    
+    @property
+    def api_keys(self) -> Dict[str, Optional[str]]:
+        """API keys by provider type."""
+        return {
+            "openai": self.openai_api_key,
+            "groq": self.groq_api_key,
+            "watsonx": self.watsonx_api_key,
+            # The local model needs no key; its path stands in so the
+            # provider is only created when a model is configured
+            "local": self.local_model_path
+        }
+    
+    def api_key_for(self, provider_type: str) -> Optional[str]:
+        """
+        Get the API key used to create a provider.
+        
+        Args:
+            provider_type: Provider type
+        
+        Returns:
+            API key, or None if not configured
+        """
+        if provider_type == "cascade":
+            # The strong tier's key is the default for both tiers
+            return self.api_keys.get(self.cascade_strong_provider)
+        return self.api_keys.get(provider_type)
+    
+    def tenant_api_key(self, tenant: TenantConfig) -> Optional[str]:
+        """
+        Get the API key for a tenant's own provider.
+        
+        Args:
+            tenant: Tenant configuration
+        
+        Returns:
+            The key from the tenant's api_key_env variable, else the key of its provider type
+        """
+        if tenant.api_key_env:
+            return self.env.get(tenant.api_key_env) or None
+        return self.api_key_for(tenant.provider or self.llm_provider)
+    
+    def provider_config(self) -> Dict:
+        """
+        Get the configuration passed to LLMProviderFactory.create_provider.
+        
+        Returns:
+            Provider configuration dictionary
+        """
+        return {
+            'OPENAI_MODEL': self.openai_model,
+            'GROQ_MODEL': self.groq_model,
+            'WATSONX_MODEL': self.watsonx_model,
+            'WATSONX_PROJECT_ID': self.watsonx_project_id,
+            'WATSONX_URL': self.watsonx_url,
+            'LOCAL_MODEL_PATH': self.local_model_path,
+            'LOCAL_SLOTS': self.local_slots,
+            'LOCAL_THREADS': self.local_threads,
+            'LOCAL_CONTEXT_SIZE': self.local_context_size,
+            'LOCAL_CHAT_FORMAT': self.local_chat_format,
+            'LOCAL_PROMPT_CACHE_MB': self.local_prompt_cache_mb,
+            'LOCAL_SLOT_TIMEOUT': self.local_slot_timeout,
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature,
+            'CASCADE_FAST_PROVIDER': self.cascade_fast_provider,
+            'CASCADE_FAST_MODEL': self.cascade_fast_model,
+            'CASCADE_STRONG_PROVIDER': self.cascade_strong_provider,
+            'CASCADE_STRONG_MODEL': self.cascade_strong_model,
+            'CASCADE_FAST_MAX_TOKENS': self.cascade_fast_max_tokens,
+            'CASCADE_MAX_MESSAGE_CHARS': self.cascade_max_message_chars,
+            'CASCADE_MAX_HISTORY': self.cascade_max_history,
+            'CASCADE_KEYWORDS': self.cascade_keywords,
+            'warmup_connections': self.warmup_connections,
+            'keepalive_expiry': self.keepalive_expiry,
+            'OPENAI_API_KEYS': self.openai_api_keys,
+            'GROQ_API_KEYS': self.groq_api_keys,
+            'KEY_COOLDOWN_SECONDS': self.key_cooldown_seconds,
+            # Cascade tiers and the shadow provider look up their own keys
+            'api_keys': self.api_keys
+        }
+    
+    def required_providers(self) -> List[str]:
+        """Get every concrete provider type these settings will instantiate."""
+        providers = [self.llm_provider]
+        if self.llm_provider == "cascade":
+            providers = [self.cascade_fast_provider, self.cascade_strong_provider]
+        if self.shadow_provider:
+            providers.append(self.shadow_provider)
+        return list(dict.fromkeys(providers))
+    
+    def validate(self) -> List[str]:
+        """
+        Validate the settings.
+        
+        Returns:
+            List of problems (empty if valid)
+        """
+        problems = []
+        
+        for provider in self.required_providers():
+            is_valid, missing = ConfigValidator.validate_provider_config(provider, env=self.env)
+            if not is_valid:
+                problems.append(f"{provider}: missing {', '.join(missing)}")
+            elif ConfigValidator.REQUIRED_VARS.get(provider):
+                problems.extend(ConfigValidator.validate_api_keys(ConfigValidator.REQUIRED_VARS[provider][0], env=self.env))
+        
+        if "local" in self.required_providers():
+            if self.local_model_path and not os.path.exists(self.local_model_path):
+                problems.append(f"LOCAL_MODEL_PATH does not exist: {self.local_model_path}")
+            if self.local_slots <= 0 or self.local_threads < 0 or self.local_context_size <= 0 or self.local_slot_timeout <= 0:
+                problems.append("LOCAL_SLOTS, LOCAL_CONTEXT_SIZE and LOCAL_SLOT_TIMEOUT must be positive and LOCAL_THREADS cannot be negative")
+        if self.key_cooldown_seconds < 0:
+            problems.append("KEY_COOLDOWN_SECONDS cannot be negative")
+        if self.max_tokens <= 0:
+            problems.append("MAX_TOKENS must be positive")
+        if self.adaptive_max_tokens and (self.adaptive_min_tokens <= 0 or self.adaptive_margin < 0 or self.adaptive_min_samples <= 0):
+            problems.append("ADAPTIVE_MIN_TOKENS and ADAPTIVE_MIN_SAMPLES must be positive and ADAPTIVE_MARGIN cannot be negative")
+        if not 0.0 <= self.temperature <= 2.0:
+            problems.append("TEMPERATURE must be between 0 and 2")
+        if not 0.0 <= self.shadow_sample_rate <= 1.0:
+            problems.append("SHADOW_SAMPLE_RATE must be between 0 and 1")
+        if self.knowledge_path and not os.path.exists(self.knowledge_path):
+            problems.append(f"KNOWLEDGE_PATH does not exist: {self.knowledge_path}")
+        if self.knowledge_embeddings and not self.openai_api_key:
+            problems.append("KNOWLEDGE_EMBEDDINGS requires OPENAI_API_KEY")
+        if self.heartbeat_interval and self.heartbeat_interval >= self.keepalive_expiry:
+            problems.append("HEARTBEAT_INTERVAL must be shorter than KEEPALIVE_EXPIRY")
+        if self.cache_enabled and (self.cache_ttl_seconds <= 0 or self.cache_max_entries <= 0 or self.cache_l1_entries <= 0):
+            problems.append("CACHE_TTL_SECONDS, CACHE_MAX_ENTRIES and CACHE_L1_ENTRIES must be positive")
+        if self.cache_enabled and self.near_duplicate_enabled:
+            if not 0 < self.near_duplicate_threshold <= 1:
+                problems.append("NEAR_DUPLICATE_THRESHOLD must be between 0 (exclusive) and 1")
+            if self.near_duplicate_max_entries <= 0:
+                problems.append("NEAR_DUPLICATE_MAX_ENTRIES must be positive")
+        if self.prefilter_enabled:
+            if min(self.prefilter_max_chars, self.prefilter_max_bytes) <= 0 or self.prefilter_max_links < 0:
+                problems.append("PREFILTER_MAX_CHARS and PREFILTER_MAX_BYTES must be positive and PREFILTER_MAX_LINKS cannot be negative")
+            if self.prefilter_rules_file:
+                try:
+                    load_rules(self.prefilter_rules_file)
+                except (OSError, ValueError) as e:
+                    problems.append(f"PREFILTER_RULES_FILE is invalid: {str(e)}")
+        if self.idempotency_ttl_seconds <= 0 or self.idempotency_max_keys <= 0:
+            problems.append("IDEMPOTENCY_TTL_SECONDS and IDEMPOTENCY_MAX_KEYS must be positive")
+        if self.ledger_path and min(self.ledger_batch_size, self.ledger_queue_size, self.ledger_flush_interval, self.ledger_rotate_mb) <= 0:
+            problems.append("LEDGER_BATCH_SIZE, LEDGER_QUEUE_SIZE, LEDGER_FLUSH_INTERVAL and LEDGER_ROTATE_MB must be positive")
+        if self.scheduler_max_concurrency > 0:
+            if not 0 <= self.scheduler_reserved_interactive < self.scheduler_max_concurrency:
+                problems.append("SCHEDULER_RESERVED_INTERACTIVE must be below SCHEDULER_MAX_CONCURRENCY")
+            if self.scheduler_interactive_weight <= 0 or self.scheduler_batch_weight <= 0:
+                problems.append("SCHEDULER_INTERACTIVE_WEIGHT and SCHEDULER_BATCH_WEIGHT must be positive")
+        if min(self.ws_heartbeat_seconds, self.ws_session_ttl_seconds, self.ws_max_sessions, self.ws_replay_frames) <= 0:
+            problems.append("WS_HEARTBEAT_SECONDS, WS_SESSION_TTL_SECONDS, WS_MAX_SESSIONS and WS_REPLAY_FRAMES must be positive")
+        if self.widget_path and not os.path.exists(self.widget_path):
+            problems.append(f"WIDGET_PATH does not exist: {self.widget_path}")
+        if self.compression_min_bytes < 0:
+            problems.append("COMPRESSION_MIN_BYTES cannot be negative")
+        if self.profile_max_seconds <= 0:
+            problems.append("PROFILE_MAX_SECONDS must be positive")
+        if self.loop_monitor_interval < 0 or self.loop_block_threshold <= 0:
+            problems.append("LOOP_MONITOR_INTERVAL cannot be negative and LOOP_BLOCK_THRESHOLD must be positive")
+        if self.ws_history_messages < 0:
+            problems.append("WS_HISTORY_MESSAGES cannot be negative")
+        if self.tenants_file:
+            try:
+                for tenant in load_tenants(self.tenants_file):
+                    if tenant.has_own_provider and not self.tenant_api_key(tenant):
+                        problems.append(f"Tenant '{tenant.id}': no API key for its provider")
+                    if tenant.knowledge_path and not os.path.exists(tenant.knowledge_path):
+                        problems.append(f"Tenant '{tenant.id}': knowledge_path does not exist: {tenant.knowledge_path}")
+            except (OSError, ValueError, TypeError) as e:
+                problems.append(f"TENANTS_FILE is invalid: {str(e)}")
+        
+        return problems
@@ -0,0 +1,116 @@
+"""
+Shadow traffic mirroring for candidate LLM providers
+Replays a sample of live chat requests against a second provider in the
+background so its latency, token usage and error rate can be compared
+with the primary provider before switching LLM_PROVIDER.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any
+from .base import BaseLLMProvider
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowMirror:
+    """
+    Fire-and-forget mirror of chat requests to a shadow provider.
+    
+    Mirrored calls run on a dedicated thread pool and never block or alter
+    the user's response. At most max_concurrency shadow calls are in flight;
+    a sampled request that finds no free slot is dropped, not queued.
+    """
+    
+    def __init__(
+        self,
+        provider: BaseLLMProvider,
+        sample_rate: float = 0.1,
+        max_concurrency: int = 2
+    ):
+        """
+        Initialize shadow mirror.
+        
+        Args:
+            provider: Candidate provider that receives mirrored traffic
+            sample_rate: Fraction of requests to mirror (0-1)
+            max_concurrency: Hard cap on concurrent shadow calls
+        """
+        self.provider = provider
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        self.max_concurrency = max(1, max_concurrency)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="shadow"
+        )
+        self.stats = {"mirrored": 0, "dropped_at_capacity": 0, "failed": 0}
+    
+    def maybe_mirror(self, messages: List[Dict[str, str]], **kwargs) -> bool:
+        """
+        Mirror a request to the shadow provider if it is sampled and a slot is free.
+        
+        Args:
+            messages: Conversation messages sent to the primary provider
+            **kwargs: Generation parameters sent to the primary provider
+        
+        Returns:
+            True if the request was mirrored, False otherwise
+        """
+        if random.random() >= self.sample_rate:
+            return False
+        
+        if not self._slots.acquire(blocking=False):
+            self.stats["dropped_at_capacity"] += 1
+            return False
+        
+        try:
+            future = self._executor.submit(self._run, list(messages), kwargs)
+        except RuntimeError:
+            # Executor already shut down
+            self._slots.release()
+            return False
+        
+        future.add_done_callback(lambda _: self._slots.release())
+        self.stats["mirrored"] += 1
+        return True
+    
+    def _run(self, messages: List[Dict[str, str]], kwargs: Dict[str, Any]):
+        """Run one shadow call; generate() records its metrics."""
+        try:
+            self.provider.generate(messages, source="shadow", **kwargs)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.warning(f"Shadow call to {self.provider.get_provider_name()} failed: {str(e)}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get mirroring counters and configuration."""
+        return {
+            "provider": self.provider.get_provider_name(),
+            "model": self.provider.model,
+            "sample_rate": self.sample_rate,
+            "max_concurrency": self.max_concurrency,
+            **self.stats
+        }
+    
+    def shutdown(self, timeout: float = 0.0) -> bool:
+        """
+        Stop accepting shadow calls, discard queued ones and wait for running ones.
+        
+        Args:
+            timeout: Maximum seconds to wait for running calls
+        
+        Returns:
+            True if no shadow call is still running
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        # Every call holds a slot until it finishes (cancelled ones release
+        # theirs right away), so holding all slots means none is running
+        deadline = time.monotonic() + timeout
+        for _ in range(self.max_concurrency):
+            if not self._slots.acquire(timeout=max(deadline - time.monotonic(), 0.0)):
+                return False
+        return True
@@ -0,0 +1,257 @@
+"""
+Multi-tenant configuration and isolation
+Tenants are sites that embed the widget (identified by a public widget id)
+or API clients (identified by an API key). Each tenant can have its own
+system prompt, provider and model, knowledge index, cache namespace,
+concurrency limit and rate limit, so one busy tenant cannot slow down (or
+see the content of) the others.
+"""
+
+import asyncio
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TENANT = "default"
+
+
+class TenantRateLimited(Exception):
+    """Raised when a tenant exceeds its request rate"""
+    
+    def __init__(self, tenant_id: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for tenant '{tenant_id}'")
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class TenantConfig:
+    """Configuration of one tenant, as read from TENANTS_FILE"""
+    id: str
+    widget_ids: Tuple[str, ...] = ()
+    api_keys: Tuple[str, ...] = ()
+    system_prompt: Optional[str] = None
+    provider: Optional[str] = None  # Provider type; defaults to LLM_PROVIDER
+    model: Optional[str] = None
+    api_key_env: Optional[str] = None  # Env var holding this tenant's provider key
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    max_concurrency: int = 4
+    rate_limit_per_minute: float = 60.0  # 0 disables rate limiting
+    burst: int = 10
+    cache_namespace: Optional[str] = None
+    knowledge_path: Optional[str] = None  # This tenant's own knowledge index (file or directory)
+    
+    @property
+    def namespace(self) -> str:
+        return self.cache_namespace or self.id
+    
+    @property
+    def has_own_provider(self) -> bool:
+        return bool(self.provider or self.model or self.api_key_env)
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TenantConfig":
+        """
+        Build a tenant from a JSON object.
+        
+        Raises:
+            ValueError: If the object has no id or unknown keys
+        """
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown tenant setting(s): {', '.join(sorted(unknown))}")
+        if not data.get("id"):
+            raise ValueError("Every tenant needs an 'id'")
+        values = dict(data)
+        for key in ("widget_ids", "api_keys"):
+            values[key] = tuple(values.get(key) or ())
+        return cls(**values)
+
+
+def load_tenants(path: str) -> List[TenantConfig]:
+    """
+    Read tenants from a JSON file: a list of tenant objects, or {"tenants": [...]}.
+    
+    Args:
+        path: TENANTS_FILE path
+    
+    Returns:
+        Tenant configurations
+    
+    Raises:
+        ValueError: If the file is malformed or ids, widget ids or API keys repeat
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("tenants", [])
+    if not isinstance(data, list):
+        raise ValueError("TENANTS_FILE must contain a list of tenants")
+    
+    tenants = [TenantConfig.from_dict(item) for item in data]
+    ids = [t.id for t in tenants]
+    if len(ids) != len(set(ids)):
+        raise ValueError("Tenant ids must be unique")
+    for attribute in ("widget_ids", "api_keys"):
+        values = [v for t in tenants for v in getattr(t, attribute)]
+        if len(values) != len(set(values)):
+            raise ValueError(f"Tenant {attribute} must be unique across tenants")
+    return tenants
+
+
+class TenantRegistry:
+    """Looks up the tenant of a request by widget id or API key"""
+    
+    def __init__(self, tenants: List[TenantConfig]):
+        """
+        Initialize registry.
+        
+        Args:
+            tenants: Tenant configurations; a tenant with id "default"
+                applies to requests that carry no tenant identifier
+        """
+        self.tenants = {t.id: t for t in tenants}
+        self._by_widget = {w: t for t in tenants for w in t.widget_ids}
+        self._by_api_key = {k: t for t in tenants for k in t.api_keys}
+        self.default = self.tenants.get(DEFAULT_TENANT) or TenantConfig(
+            id=DEFAULT_TENANT,
+            max_concurrency=0,
+            rate_limit_per_minute=0
+        )
+    
+    def __len__(self) -> int:
+        return len(self.tenants)
+    
+    def resolve(self, widget_id: Optional[str] = None, api_key: Optional[str] = None) -> Optional[TenantConfig]:
+        """
+        Find the tenant of a request.
+        
+        Args:
+            widget_id: Value of the X-Widget-Id header
+            api_key: Value of the X-API-Key header
+        
+        Returns:
+            The tenant; the default tenant if neither identifier is given;
+            None if an identifier is given but unknown
+        """
+        if api_key:
+            return self._by_api_key.get(api_key)
+        if widget_id:
+            return self._by_widget.get(widget_id)
+        return self.default
+
+
+class TokenBucket:
+    """Token-bucket rate limiter"""
+    
+    def __init__(self, rate_per_second: float, burst: int):
+        """
+        Initialize token bucket.
+        
+        Args:
+            rate_per_second: Sustained request rate
+            burst: Requests allowed at once after an idle period
+        """
+        self.rate = rate_per_second
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def try_acquire(self) -> float:
+        """
+        Take one token if available.
+        
+        Returns:
+            0 if a token was taken, otherwise seconds until one is available
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+@dataclass
+class TenantGate:
+    """Runtime limits and counters of one tenant"""
+    config: TenantConfig
+    bucket: Optional[TokenBucket] = None
+    semaphore: Optional[asyncio.Semaphore] = None
+    stats: Dict[str, int] = field(default_factory=lambda: {"requests": 0, "rate_limited": 0, "in_flight": 0})
+    
+    def check_rate(self):
+        """
+        Count a request against the rate limit.
+        
+        Raises:
+            TenantRateLimited: If the tenant is over its rate
+        """
+        self.stats["requests"] += 1
+        if self.bucket is None:
+            return
+        retry_after = self.bucket.try_acquire()
+        if retry_after > 0:
+            self.stats["rate_limited"] += 1
+            raise TenantRateLimited(self.config.id, retry_after)
+    
+    async def __aenter__(self):
+        """Wait for one of the tenant's concurrent provider call slots."""
+        if self.semaphore is not None:
+            await self.semaphore.acquire()
+        self.stats["in_flight"] += 1
+        return self
+    
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.stats["in_flight"] -= 1
+        if self.semaphore is not None:
+            self.semaphore.release()
+        return False
+
+
+class TenantGates:
+    """
+    Runtime gates by tenant id, kept across configuration reloads.
+    
+    A gate is rebuilt only when the tenant's limits change, so reloading
+    the tenants file does not reset rate limits or in-flight counts.
+    """
+    
+    def __init__(self):
+        self._gates: Dict[str, TenantGate] = {}
+    
+    def gate_for(self, config: TenantConfig) -> TenantGate:
+        """Get (or create) the gate for a tenant."""
+        gate = self._gates.get(config.id)
+        limits = (config.max_concurrency, config.rate_limit_per_minute, config.burst)
+        if gate is None or (gate.config.max_concurrency, gate.config.rate_limit_per_minute, gate.config.burst) != limits:
+            gate = TenantGate(
+                config=config,
+                bucket=TokenBucket(config.rate_limit_per_minute / 60.0, config.burst)
+                if config.rate_limit_per_minute > 0 else None,
+                semaphore=asyncio.Semaphore(config.max_concurrency) if config.max_concurrency > 0 else None,
+                stats=gate.stats if gate else {"requests": 0, "rate_limited": 0, "in_flight": 0}
+            )
+            self._gates[config.id] = gate
+        else:
+            gate.config = config
+        return gate
+    
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """Get request, rate-limit and in-flight counters by tenant."""
+        return {tenant_id: dict(gate.stats) for tenant_id, gate in self._gates.items()}
+
+
+def retry_after_header(seconds: float) -> str:
+    """Format a Retry-After value (whole seconds, at least 1)."""
+    return str(max(1, math.ceil(seconds)))
@@ -5,11 +5,20 @@ IBM WatsonX LLM Provider Implementation
 from typing import List, Dict, Optional
 from ibm_watson_machine_learning.foundation_models import Model
 from ibm_watson_machine_learning.metanames import GenTextParamsMetaNames as GenParams
-from .base import BaseLLMProvider
+from .base import BaseLLMProvider, GenerationResult
 import logging
 
 logger = logging.getLogger(__name__)
 
+# WatsonX stop reasons mapped to OpenAI-style finish reasons
+FINISH_REASONS = {
+    "eos_token": "stop",
+    "stop_sequence": "stop",
+    "max_tokens": "length",
+    "token_limit": "length",
+    "time_limit": "length"
+}
+
 
 class WatsonXProvider(BaseLLMProvider):
     """
@@ -58,13 +67,13 @@ class WatsonXProvider(BaseLLMProvider):
         else:
             self.model_instance = None
     
-    def generate_response(
+    def _generate(
         self,
         messages: List[Dict[str, str]],
         max_tokens: Optional[int] = None,
         temperature: Optional[float] = None,
         **kwargs
-    ) -> str:
+    ) -> GenerationResult:
         """
         Generate response using WatsonX API.
         
@@ -73,10 +82,10 @@ class WatsonXProvider(BaseLLMProvider):
             max_tokens: Maximum tokens in response
             temperature: Sampling temperature
             **kwargs: Additional WatsonX-specific parameters
-            
+        
         Returns:
-            Generated response text
-            
+            GenerationResult with the reported token counts and stop reason
+        
         Raises:
             Exception: If API call fails
         """
@@ -104,16 +113,23 @@ class WatsonXProvider(BaseLLMProvider):
                 GenParams.TOP_K: kwargs.get('top_k', 50),
             }
             
-            # Generate response
-            response = self.model_instance.generate_text(
+            # Generate response; generate() returns the raw payload with token counts
+            response = self.model_instance.generate(
                 prompt=prompt,
                 params=parameters
             )
+            output = response["results"][0]
+            reply = output.get("generated_text", "")
             
-            logger.info(f"WatsonX response received: {len(response)} characters")
-            
-            return response
+            logger.info(f"WatsonX response received: {len(reply)} characters")
             
+            return GenerationResult(
+                text=reply,
+                prompt_tokens=output.get("input_token_count"),
+                completion_tokens=output.get("generated_token_count"),
+                finish_reason=FINISH_REASONS.get(output.get("stop_reason"), output.get("stop_reason"))
+            )
+        
         except Exception as e:
             logger.error(f"WatsonX API error: {str(e)}")
             raise Exception(f"WatsonX API call failed: {str(e)}")
@@ -125,7 +141,7 @@ class WatsonXProvider(BaseLLMProvider):
         
         Args:
             messages: List of message dictionaries
-            
+        
         Returns:
             Formatted prompt string
         """
@@ -147,6 +163,12 @@ class WatsonXProvider(BaseLLMProvider):
         
         return '\n'.join(prompt_parts)
     
+    def check_health(self) -> None:
+        """Probe the API by fetching the model's details, which costs no tokens."""
+        if not self.model_instance:
+            raise Exception("WatsonX model not initialized. Check API key and project ID.")
+        self.model_instance.get_details()
+    
     def get_provider_name(self) -> str:
         """Get provider name."""
         return "WatsonX"
@@ -0,0 +1,310 @@
+"""
+Widget bundle delivery
+Builds a minified, content-hashed copy of the chat widget with gzip and
+Brotli variants once at startup, and serves it with strong ETags and
+immutable cache headers, so browsers and CDNs download each version once.
+"""
+
+import gzip
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+import logging
+
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_IDENTIFIER = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_$")
+_REGEX_AFTER = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw", "yield", "await"}
+_NO_NEWLINE_AFTER = set("{[(,;")
+_NO_NEWLINE_BEFORE = set("}]),;.")
+_TEMPLATE_INDENT = re.compile(r"[ \t\r]*\n\s*")
+
+
+def _skip_string(source: str, i: int) -> int:
+    """Index just past the quoted string starting at i."""
+    quote = source[i]
+    i += 1
+    while i < len(source) and source[i] != quote:
+        i += 2 if source[i] == "\\" else 1
+    return i + 1
+
+
+def _skip_template(source: str, i: int) -> int:
+    """Index just past the template literal starting at i, including ${...} expressions."""
+    i += 1
+    while i < len(source) and source[i] != "`":
+        if source[i] == "\\":
+            i += 2
+        elif source.startswith("${", i):
+            i = _skip_expression(source, i + 2)
+        else:
+            i += 1
+    return i + 1
+
+
+def _skip_expression(source: str, i: int) -> int:
+    """Index just past the } closing a template expression that starts at i."""
+    depth = 1
+    while i < len(source):
+        char = source[i]
+        if char in "'\"":
+            i = _skip_string(source, i)
+            continue
+        if char == "`":
+            i = _skip_template(source, i)
+            continue
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def _skip_regex(source: str, i: int) -> int:
+    """Index just past the regex literal (with flags) starting at i."""
+    i += 1
+    in_class = False
+    while i < len(source) and source[i] != "\n":
+        char = source[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "[":
+            in_class = True
+        elif char == "]":
+            in_class = False
+        elif char == "/" and not in_class:
+            i += 1
+            break
+        i += 1
+    while i < len(source) and source[i] in _IDENTIFIER:
+        i += 1
+    return i
+
+
+def minify_js(source: str) -> str:
+    """
+    Remove comments and redundant whitespace from JavaScript.
+    
+    Deliberately conservative: strings and regex literals are copied
+    verbatim, identifiers are not renamed, and line breaks are kept
+    wherever automatic semicolon insertion could depend on them. In
+    template literals (the widget's HTML and CSS) only line breaks plus
+    indentation are collapsed to a single line break, which HTML and CSS
+    treat the same.
+    
+    Args:
+        source: JavaScript source
+    
+    Returns:
+        Minified source
+    """
+    out = []
+    last = ""  # Last character emitted outside whitespace
+    word = ""  # Last identifier emitted, for regex detection after keywords
+    i = 0
+    
+    while i < len(source):
+        char = source[i]
+        
+        if char in " \t\r\n":
+            start = i
+            while i < len(source) and source[i] in " \t\r\n":
+                i += 1
+            following = source[i] if i < len(source) else ""
+            if "\n" in source[start:i]:
+                if last and last not in _NO_NEWLINE_AFTER and following not in _NO_NEWLINE_BEFORE:
+                    out.append("\n")
+            elif (last in _IDENTIFIER and following in _IDENTIFIER) or (last in "+-" and following in "+-"):
+                out.append(" ")
+            continue
+        
+        if source.startswith("//", i):
+            while i < len(source) and source[i] != "\n":
+                i += 1
+            continue
+        
+        if source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            i = len(source) if end < 0 else end + 2
+            continue
+        
+        if char in "'\"":
+            end = _skip_string(source, i)
+        elif char == "`":
+            end = _skip_template(source, i)
+            token = _TEMPLATE_INDENT.sub("\n", source[i:end])
+            out.append(token)
+            word, last, i = "", "`", end
+            continue
+        elif char == "/" and (not last or last in _REGEX_AFTER or word in _REGEX_KEYWORDS):
+            end = _skip_regex(source, i)
+        else:
+            end = i + 1
+            if char in _IDENTIFIER:
+                while end < len(source) and source[end] in _IDENTIFIER:
+                    end += 1
+        
+        token = source[i:end]
+        out.append(token)
+        word = token if char in _IDENTIFIER else ""
+        last = token[-1]
+        i = end
+    
+    return "".join(out).strip() + "\n"
+
+
+@dataclass
+class Asset:
+    """A static file held in memory with its precompressed variants"""
+    body: bytes
+    content_type: str
+    cache_control: str
+    etag: str
+    variants: Dict[str, bytes] = field(default_factory=dict)
+    
+    @classmethod
+    def build(cls, body: bytes, content_type: str, cache_control: str) -> "Asset":
+        """Hash a body and precompress it with every available encoding."""
+        asset = cls(
+            body=body,
+            content_type=content_type,
+            cache_control=cache_control,
+            etag=hashlib.sha256(body).hexdigest()[:16]
+        )
+        asset.variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli:
+            asset.variants["br"] = brotli.compress(body, quality=11, mode=brotli.MODE_TEXT)
+        return asset
+    
+    def response(self, accept_encoding: str = "", if_none_match: Optional[str] = None) -> Response:
+        """
+        Serve the best encoding the client accepts.
+        
+        Each encoding has its own strong ETag ("<hash>", "<hash>-gzip",
+        "<hash>-br"); a conditional request matching any of them gets 304.
+        
+        Args:
+            accept_encoding: Accept-Encoding request header
+            if_none_match: If-None-Match request header
+        
+        Returns:
+            The response
+        """
+        accepted = {
+            part.split(";")[0].strip()
+            for part in accept_encoding.lower().replace(" ", "").split(",")
+            if not part.endswith(";q=0")
+        }
+        encoding = next((e for e in ("br", "gzip") if e in accepted and e in self.variants), None)
+        etag = f'"{self.etag}-{encoding}"' if encoding else f'"{self.etag}"'
+        headers = {
+            "Cache-Control": self.cache_control,
+            "ETag": etag,
+            "Vary": "Accept-Encoding",
+            "Cross-Origin-Resource-Policy": "cross-origin"
+        }
+        
+        if if_none_match and (if_none_match.strip() == "*" or any(
+            tag.strip().removeprefix("W/").strip('"').startswith(self.etag)
+            for tag in if_none_match.split(",")
+        )):
+            return Response(status_code=304, headers=headers)
+        
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(
+            self.variants[encoding] if encoding else self.body,
+            media_type=self.content_type,
+            headers=headers
+        )
+
+
+EMBED_LOADER = """(function () {
+    var script = document.currentScript;
+    var origin = script ? new URL(script.src).origin : '';
+    var config = window.antigravityConfig || {};
+    if (!config.apiEndpoint) config.apiEndpoint = origin + '/api/chat';
+    if (!config.widgetId && script && script.dataset.widgetId) config.widgetId = script.dataset.widgetId;
+    window.antigravityConfig = config;
+    function load() {
+        var bundle = document.createElement('script');
+        bundle.src = origin + '/widget/%(bundle)s';
+        bundle.defer = true;
+        document.head.appendChild(bundle);
+    }
+    if (document.readyState === 'complete') {
+        load();
+    } else {
+        window.addEventListener('load', load);
+    }
+})();
+"""
+
+
+class WidgetBundle:
+    """
+    The widget script served from /widget/.
+    
+    The minified bundle is named after its content hash
+    (antigravity-widget.<hash>.js), so it can be cached forever. Pages embed
+    the small embed.js loader, which is cached briefly and points at the
+    current bundle; it loads the bundle after the host page has finished
+    loading.
+    """
+    
+    def __init__(self, source_path: str, loader_max_age: int = 300):
+        """
+        Build the bundle.
+        
+        Args:
+            source_path: Path of antigravity-widget.js
+            loader_max_age: Seconds browsers may cache embed.js
+        
+        Raises:
+            OSError: If the widget source cannot be read
+        """
+        with open(source_path, encoding="utf-8") as f:
+            source = f.read()
+        
+        minified = minify_js(source).encode("utf-8")
+        bundle = Asset.build(minified, "application/javascript; charset=utf-8", IMMUTABLE)
+        self.bundle_name = f"antigravity-widget.{bundle.etag}.js"
+        loader = Asset.build(
+            (EMBED_LOADER % {"bundle": self.bundle_name}).encode("utf-8"),
+            "application/javascript; charset=utf-8",
+            f"public, max-age={loader_max_age}"
+        )
+        self.assets: Dict[str, Asset] = {self.bundle_name: bundle, "embed.js": loader}
+        
+        logger.info(
+            f"Widget bundle {self.bundle_name}: {len(source.encode('utf-8'))} B source, "
+            f"{len(minified)} B minified, "
+            + ", ".join(f"{len(data)} B {encoding}" for encoding, data in bundle.variants.items())
+        )
+    
+    def get(self, name: str) -> Optional[Asset]:
+        """Look up an asset by file name."""
+        return self.assets.get(name)
+    
+    def get_stats(self) -> Dict:
+        """Get the bundle name and sizes per encoding."""
+        bundle = self.assets[self.bundle_name]
+        return {
+            "bundle": self.bundle_name,
+            "bytes": {"identity": len(bundle.body), **{e: len(d) for e, d in bundle.variants.items()}}
+        }
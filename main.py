@@ -1,17 +1,60 @@
 """
 FastAPI Chatbot Backend
 Provides API endpoint for chatbot widget to communicate with multiple LLM providers
-Supports: OpenAI, Groq, WatsonX (configurable via environment variables)
+Supports: OpenAI, Groq, WatsonX and a cheap-first cascade (configurable via environment variables)
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from llm_providers import LLMProviderFactory
-import os
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from typing_extensions import TypedDict
+from typing import Dict, List, Literal, Optional, Tuple
+from llm_providers import LLMProviderFactory, CascadeProvider, GenerationResult, LocalProvider, ValidatedMessages
+from llm_providers.cache import LRUCache, SQLiteCache, TwoLevelCache, make_cache_key, normalize_text
+from llm_providers.idempotency import IdempotencyConflict, IdempotencyStore, fingerprint
+from llm_providers.ledger import LedgerEvent, UsageLedger, estimate_cost
+from llm_providers.monitoring import monitor, EventLoopMonitor
+from llm_providers.connection import KeepAliveHeartbeat
+from llm_providers.health import HealthProber
+from llm_providers.knowledge import Document, KnowledgeIndex, openai_embedder
+from llm_providers.length_predictor import LengthPredictor
+from llm_providers.key_pool import KeyPool
+from llm_providers.near_duplicate import NearDuplicateIndex
+from llm_providers.prefilter import CANNED, DEFAULT_RULES, REJECT, GibberishModel, PreFilter, load_rules
+from llm_providers.profiling import MemoryProfiler, ProfilerBusy, SamplingProfiler, folded, measure, process_memory
+from llm_providers.reload import ProviderGeneration, ProviderManager, warm_up_generation
+from llm_providers.scheduler import BATCH, INTERACTIVE, PriorityScheduler, SchedulerTimeout
+from llm_providers.sessions import ChatSession, SessionStore
+from llm_providers.settings import Settings
+from llm_providers.tenants import (
+    DEFAULT_TENANT, TenantConfig, TenantGates, TenantRateLimited, TenantRegistry,
+    load_tenants, retry_after_header
+)
+from llm_providers.shadow import ShadowMirror
+from llm_providers.widget_bundle import WidgetBundle
+import asyncio
+import functools
+import hmac
+import json
+import signal
+import threading
+import time
 from dotenv import load_dotenv
 import logging
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
 # Load environment variables
 load_dotenv()
 
@@ -23,110 +66,987 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = "You are a helpful, friendly AI assistant embedded in a website chatbot. Provide concise, helpful responses."
+
+# Read and validate configuration once
+settings = Settings.from_env()
+for problem in settings.validate():
+    logger.warning(f"Configuration problem: {problem}")
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Chatbot API",
     description="Backend API for embeddable chatbot widget with multi-LLM support",
-    version="2.0.0"
+    version="2.0.0",
+    # orjson encodes responses several times faster than the standard library
+    default_response_class=ORJSONResponse if orjson else JSONResponse
 )
 
-# Configure CORS
-origins = os.getenv("CORS_ORIGINS", "*").split(",")
+# Configure CORS (applied at startup; changing CORS_ORIGINS needs a restart)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=origins,
+    allow_origins=list(settings.cors_origins),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let the widget read these (e.g. to honor Retry-After when backing off)
+    expose_headers=["Retry-After", "Idempotent-Replayed"],
 )
 
-# Initialize LLM Provider using Factory Pattern
-llm_provider = None
+# Compress large responses (metrics, knowledge results); Brotli when installed
+# and accepted by the client, gzip otherwise. Applied at startup.
+if settings.compression_min_bytes > 0:
+    if BrotliMiddleware:
+        app.add_middleware(
+            BrotliMiddleware,
+            quality=4,
+            minimum_size=settings.compression_min_bytes,
+            gzip_fallback=True
+        )
+    else:
+        app.add_middleware(GZipMiddleware, minimum_size=settings.compression_min_bytes, compresslevel=6)
 
-try:
-    provider_type = os.getenv("LLM_PROVIDER", "openai").lower()
-    
-    # Get provider-specific configuration
-    config = {
-        'OPENAI_MODEL': os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo'),
-        'GROQ_MODEL': os.getenv('GROQ_MODEL', 'llama3-70b-8192'),
-        'WATSONX_MODEL': os.getenv('WATSONX_MODEL', 'ibm/granite-13b-chat-v2'),
-        'WATSONX_PROJECT_ID': os.getenv('WATSONX_PROJECT_ID'),
-        'WATSONX_URL': os.getenv('WATSONX_URL', 'https://us-south.ml.cloud.ibm.com'),
-        'max_tokens': int(os.getenv('MAX_TOKENS', '500')),
-        'temperature': float(os.getenv('TEMPERATURE', '0.7'))
-    }
+
+# Background deep health probing; results are cached and read in constant time
+health_prober = HealthProber(
+    lambda: provider_manager.current.providers(),
+    interval=settings.health_probe_interval,
+    failure_threshold=settings.health_failure_threshold
+) if settings.health_probe_interval > 0 else None
+
+
+def build_providers(settings: Settings) -> ProviderGeneration:
+    """
+    Build the primary provider (and optional shadow mirror) using the Factory Pattern.
     
-    # Get API key based on provider type
-    if provider_type == 'openai':
-        api_key = os.getenv('OPENAI_API_KEY')
-    elif provider_type == 'groq':
-        api_key = os.getenv('GROQ_API_KEY')
-    elif provider_type == 'watsonx':
-        api_key = os.getenv('WATSONX_API_KEY')
-    else:
-        api_key = None
+    Args:
+        settings: Settings snapshot to build from
+    
+    Returns:
+        Unwarmed ProviderGeneration (provider is None if no API key is set)
+    
+    Raises:
+        Exception: If the primary provider cannot be created
+    """
+    provider_type = settings.llm_provider
+    config = settings.provider_config()
+    api_key = settings.api_key_for(provider_type)
+    
+    tenants, tenant_providers = build_tenant_providers(settings)
     
     if not api_key:
         logger.warning(f"API key not found for provider: {provider_type}")
-    else:
-        llm_provider = LLMProviderFactory.create_provider(
-            provider_type=provider_type,
-            api_key=api_key,
-            **config
-        )
-        logger.info(f"Successfully initialized {llm_provider.get_provider_name()} provider")
+        return ProviderGeneration(settings, None, tenants=tenants, tenant_providers=tenant_providers)
+    
+    llm_provider = LLMProviderFactory.create_provider(
+        provider_type=provider_type,
+        api_key=api_key,
+        **config
+    )
+    logger.info(f"Successfully initialized {llm_provider.get_provider_name()} provider")
+    
+    # Let the cascade skip a fast tier that the prober reports as failing
+    if isinstance(llm_provider, CascadeProvider) and health_prober:
+        llm_provider.health_check = health_prober.is_healthy
+    
+    # Optional shadow provider: mirrors a sample of chat traffic to a candidate
+    # provider so its latency can be compared before switching LLM_PROVIDER
+    shadow_mirror = None
+    
+    try:
+        if settings.shadow_provider:
+            shadow_provider = LLMProviderFactory.create_provider(
+                provider_type=settings.shadow_provider,
+                api_key=settings.api_key_for(settings.shadow_provider),
+                model=settings.shadow_model,
+                **config
+            )
+            shadow_mirror = ShadowMirror(
+                shadow_provider,
+                sample_rate=settings.shadow_sample_rate,
+                max_concurrency=settings.shadow_max_concurrency
+            )
+            logger.info(
+                f"Shadow mode enabled: mirroring {shadow_mirror.sample_rate:.0%} of requests "
+                f"to {shadow_provider.get_provider_name()}"
+            )
+    
+    except Exception as e:
+        logger.error(f"Failed to initialize shadow provider: {str(e)}")
+        shadow_mirror = None
+    
+    return ProviderGeneration(
+        settings,
+        llm_provider,
+        shadow=shadow_mirror,
+        tenants=tenants,
+        tenant_providers=tenant_providers
+    )
+
+
+def build_tenant_providers(settings: Settings) -> Tuple[TenantRegistry, dict]:
+    """
+    Load TENANTS_FILE and build the providers of tenants that do not use the primary.
+    
+    Tenants with the same provider type, model and key share one instance.
+    A tenant whose provider fails to build is mapped to None, so only that
+    tenant's requests fail.
+    
+    Args:
+        settings: Settings snapshot to build from
+    
+    Returns:
+        (tenant registry, tenant providers by tenant id)
+    """
+    if not settings.tenants_file:
+        return TenantRegistry([]), {}
+    
+    try:
+        tenants = TenantRegistry(load_tenants(settings.tenants_file))
+    except Exception as e:
+        logger.error(f"Failed to load tenants from {settings.tenants_file}: {str(e)}")
+        return TenantRegistry([]), {}
+    
+    config = settings.provider_config()
+    shared = {}
+    tenant_providers = {}
+    
+    for tenant in tenants.tenants.values():
+        if not tenant.has_own_provider:
+            continue
         
+        provider_type = tenant.provider or settings.llm_provider
+        api_key = settings.tenant_api_key(tenant)
+        overrides = {
+            key: value for key, value in
+            (("max_tokens", tenant.max_tokens), ("temperature", tenant.temperature))
+            if value is not None
+        }
+        identity = (provider_type, tenant.model, api_key, tuple(sorted(overrides.items())))
+        
+        try:
+            if identity not in shared:
+                if not api_key:
+                    raise ValueError(f"API key not found for provider: {provider_type}")
+                shared[identity] = LLMProviderFactory.create_provider(
+                    provider_type=provider_type,
+                    api_key=api_key,
+                    model=tenant.model,
+                    **{**config, **overrides}
+                )
+            tenant_providers[tenant.id] = shared[identity]
+        except Exception as e:
+            logger.error(f"Failed to initialize provider for tenant '{tenant.id}': {str(e)}")
+            tenant_providers[tenant.id] = None
+    
+    logger.info(f"Loaded {len(tenants)} tenant(s), {len(shared)} with their own provider")
+    return tenants, tenant_providers
+
+
+# Initialize LLM Provider; reloads swap it atomically via provider_manager
+provider_manager = ProviderManager(build_providers)
+
+try:
+    provider_manager.load(settings)
 except Exception as e:
     logger.error(f"Failed to initialize LLM provider: {str(e)}")
-    llm_provider = None
+    provider_manager.activate(ProviderGeneration(settings, None))
+
+
+# Optional local knowledge indexes, one per tenant: answer high-confidence FAQ
+# matches without a provider call and ground other answers in the tenant's own
+# content. KNOWLEDGE_PATH is the default tenant's; other tenants only see
+# their own knowledge_path and documents added for them.
+knowledge_indexes: Dict[str, KnowledgeIndex] = {}
+knowledge_lock = threading.Lock()
+
+def new_knowledge_index() -> KnowledgeIndex:
+    """An empty knowledge index using the configured embedder"""
+    return KnowledgeIndex(
+        embedder=openai_embedder(settings.openai_api_key) if settings.knowledge_embeddings else None
+    )
+
+def load_knowledge_index(tenant_id: str, path: str) -> KnowledgeIndex:
+    """Index a tenant's knowledge path; a failure leaves the tenant with an empty index"""
+    index = new_knowledge_index()
+    try:
+        index.load_path(path)
+        logger.info(f"Knowledge index for tenant '{tenant_id}' ready with {len(index)} document(s)")
+    except Exception as e:
+        logger.error(f"Failed to build knowledge index for tenant '{tenant_id}': {str(e)}")
+    return index
+
+def knowledge_index_for(tenant: Optional[TenantConfig]) -> Optional[KnowledgeIndex]:
+    """
+    Get a tenant's own knowledge index (None for no tenant means the default one).
+    
+    A tenant's knowledge_path is indexed on first use, so tenants added by
+    a reload get their index without a restart.
+    """
+    tenant_id = tenant.id if tenant else DEFAULT_TENANT
+    index = knowledge_indexes.get(tenant_id)
+    if index is not None or tenant is None or not tenant.knowledge_path:
+        return index
+    with knowledge_lock:
+        if tenant_id not in knowledge_indexes:
+            knowledge_indexes[tenant_id] = load_knowledge_index(tenant_id, tenant.knowledge_path)
+        return knowledge_indexes[tenant_id]
+
+if settings.knowledge_path:
+    knowledge_indexes[DEFAULT_TENANT] = load_knowledge_index(DEFAULT_TENANT, settings.knowledge_path)
+for _tenant in provider_manager.current.tenants.tenants.values():
+    knowledge_index_for(_tenant)
+
+# Optional response cache: per-process LRU over a SQLite file shared by all
+# workers (applied at startup; changing CACHE_* needs a restart)
+response_cache = None
+
+try:
+    if settings.cache_enabled:
+        response_cache = TwoLevelCache(
+            LRUCache(settings.cache_l1_entries, ttl=settings.cache_ttl_seconds),
+            SQLiteCache(
+                settings.cache_path,
+                max_entries=settings.cache_max_entries,
+                ttl=settings.cache_ttl_seconds
+            ) if settings.cache_path else None
+        )
+        logger.info(f"Response cache enabled ({settings.cache_path or 'in-process only'})")
+except Exception as e:
+    logger.error(f"Failed to initialize response cache: {str(e)}")
+    response_cache = None
+
+# Near-duplicate index: paraphrased opening questions reuse the cached
+# answer of an earlier wording (applied at startup)
+near_duplicates = NearDuplicateIndex(
+    capacity=settings.near_duplicate_max_entries,
+    threshold=settings.near_duplicate_threshold
+) if response_cache is not None and settings.near_duplicate_enabled else None
+
+# Idempotency-Key support: retried requests share one generation
+idempotency_store = IdempotencyStore(
+    max_entries=settings.idempotency_max_keys,
+    ttl=settings.idempotency_ttl_seconds
+)
+
+# Optional usage ledger: batched, compressed JSONL written off the request path
+usage_ledger = None
+
+try:
+    if settings.ledger_path:
+        usage_ledger = UsageLedger(
+            settings.ledger_path,
+            batch_size=settings.ledger_batch_size,
+            flush_interval=settings.ledger_flush_interval,
+            max_queue=settings.ledger_queue_size,
+            rotate_bytes=int(settings.ledger_rotate_mb * 1024 * 1024)
+        )
+except Exception as e:
+    logger.error(f"Failed to initialize usage ledger: {str(e)}")
+    usage_ledger = None
+
+# Priority scheduling: interactive chats keep reserved provider capacity
+# while batch jobs fill whatever is idle (applied at startup)
+scheduler = PriorityScheduler(
+    max_concurrency=settings.scheduler_max_concurrency,
+    reserved_interactive=settings.scheduler_reserved_interactive,
+    weights={
+        INTERACTIVE: settings.scheduler_interactive_weight,
+        BATCH: settings.scheduler_batch_weight
+    },
+    batch_idle_only=settings.scheduler_batch_idle_only,
+    queue_timeout=settings.scheduler_queue_timeout
+) if settings.scheduler_max_concurrency > 0 else None
+
+# Local pre-filter: junk, floods and injection attempts never reach a
+# provider (applied at startup)
+prefilter = None
+
+try:
+    if settings.prefilter_enabled:
+        prefilter = PreFilter(
+            max_chars=settings.prefilter_max_chars,
+            max_bytes=settings.prefilter_max_bytes,
+            max_links=settings.prefilter_max_links,
+            rules=list(DEFAULT_RULES) + (load_rules(settings.prefilter_rules_file) if settings.prefilter_rules_file else []),
+            gibberish=GibberishModel() if settings.prefilter_gibberish else None
+        )
+        logger.info(f"Pre-filter enabled with {len(prefilter.rules)} rule(s)")
+except Exception as e:
+    logger.error(f"Failed to initialize pre-filter: {str(e)}")
+    prefilter = None
+
+# Adaptive max_tokens: each request's budget follows the reply lengths seen
+# for similar questions instead of the static MAX_TOKENS (applied at startup)
+length_predictor = LengthPredictor(
+    margin=settings.adaptive_margin,
+    min_tokens=settings.adaptive_min_tokens,
+    min_samples=settings.adaptive_min_samples
+) if settings.adaptive_max_tokens else None
+
+# Per-tenant rate limits and concurrency, kept across reloads
+tenant_gates = TenantGates()
+
+# WebSocket chat sessions: server-side history and resumable output
+session_store = SessionStore(
+    ttl=settings.ws_session_ttl_seconds,
+    max_sessions=settings.ws_max_sessions,
+    history_messages=settings.ws_history_messages,
+    replay_frames=settings.ws_replay_frames
+)
+
+# Turns still generating; kept referenced so they outlive their connection
+socket_turns = set()
+
+# Minified, versioned widget script served from /widget/ (built at startup)
+widget_bundle = None
+
+try:
+    if settings.widget_path:
+        widget_bundle = WidgetBundle(settings.widget_path, loader_max_age=settings.widget_loader_max_age)
+except Exception as e:
+    logger.error(f"Failed to build widget bundle: {str(e)}")
+    widget_bundle = None
+
+# On-demand profilers behind /admin/profile; idle (and free) until requested
+cpu_profiler = SamplingProfiler(max_seconds=settings.profile_max_seconds)
+memory_profiler = MemoryProfiler()
+
+# Event-loop lag and thread-pool saturation; logs the stack of blocking callbacks
+loop_monitor = EventLoopMonitor(
+    interval=settings.loop_monitor_interval,
+    block_threshold=settings.loop_block_threshold
+) if settings.loop_monitor_interval > 0 else None
+
+# Readiness: the server reports ready only once startup warm-up has finished
+readiness = {"ready": False, "warm_up_error": None}
+
+# Optional heartbeat keeping pooled provider connections open while idle
+heartbeat = KeepAliveHeartbeat(
+    lambda: provider_manager.current.providers(),
+    interval=settings.heartbeat_interval
+) if settings.heartbeat_interval > 0 else None
+
+
+def warm_up_providers():
+    """Warm up the active providers at startup, then mark the server ready"""
+    try:
+        warm_up_generation(provider_manager.current)
+    except Exception as e:
+        readiness["warm_up_error"] = str(e)
+        logger.error(f"Provider warm-up failed: {str(e)}")
+    finally:
+        readiness["ready"] = True
+    
+    if health_prober:
+        health_prober.start()
+
+
+def reload_providers() -> ProviderGeneration:
+    """
+    Re-read .env and the environment, then hot-swap the providers.
+    
+    The new providers are built and warmed up before the swap; requests
+    already in flight finish on the old providers.
+    
+    Returns:
+        The newly active generation
+    
+    Raises:
+        ValueError: If the new configuration is invalid (the old providers stay active)
+    """
+    load_dotenv(override=True)
+    new_settings = Settings.from_env()
+    
+    problems = new_settings.validate()
+    if problems:
+        raise ValueError(f"Invalid configuration: {'; '.join(problems)}")
+    
+    return provider_manager.load(new_settings, warm_up=new_settings.reload_warmup)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Check the X-Admin-Token header against ADMIN_TOKEN"""
+    admin_token = provider_manager.current.settings.admin_token
+    if not admin_token:
+        raise HTTPException(
+            status_code=403,
+            detail="Admin endpoints are disabled. Set ADMIN_TOKEN to enable them."
+        )
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
 
 # Request/Response models
+class ChatMessage(TypedDict):
+    # A TypedDict validates to a plain dict, so history reaches the provider
+    # without building (and converting back) one model object per message
+    role: Literal["system", "user", "assistant"]
+    content: str
+
 class ChatRequest(BaseModel):
     message: str
-    conversation_history: list = []
+    conversation_history: List[ChatMessage] = []
+    priority: Literal["interactive", "batch"] = "interactive"
 
 class ChatResponse(BaseModel):
     reply: str
     success: bool
     error: str = None
 
+class KnowledgeDocument(BaseModel):
+    text: str
+    id: Optional[str] = None
+    title: Optional[str] = None
+    answer: Optional[str] = None
+
+class KnowledgeIngestRequest(BaseModel):
+    documents: List[KnowledgeDocument]
+    tenant: str = DEFAULT_TENANT
+
 @app.get("/")
 async def root():
-    """Health check endpoint"""
+    """Health check endpoint (503 until startup warm-up has finished)"""
+    llm_provider = provider_manager.current.provider
     provider_info = {
         "provider": llm_provider.get_provider_name() if llm_provider else "Not configured",
         "model": llm_provider.model if llm_provider else "N/A",
         "available": llm_provider.is_available() if llm_provider else False
     } if llm_provider else None
     
-    return {
-        "status": "online",
+    content = {
+        "status": "online" if readiness["ready"] else "warming_up",
         "message": "Chatbot API is running",
         "version": "2.0.0",
+        "ready": readiness["ready"],
+        "warm_up_error": readiness["warm_up_error"],
         "llm_provider": provider_info
     }
+    return app.router.default_response_class(content, status_code=200 if readiness["ready"] else 503)
+
+@app.get("/health/live")
+async def health_live():
+    """Liveness probe: the process is up and serving HTTP"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness probe served from cached background probe results"""
+    llm_provider = provider_manager.current.provider
+    ready = (
+        readiness["ready"]
+        and llm_provider is not None
+        and (health_prober is None or health_prober.is_healthy(llm_provider))
+    )
+    
+    content = {
+        "ready": ready,
+        "warmed_up": readiness["ready"],
+        "probes": health_prober.get_status() if health_prober else None
+    }
+    return app.router.default_response_class(content, status_code=200 if ready else 503)
+
+@app.get("/widget/{name}", include_in_schema=False)
+async def widget_asset(name: str, request: Request):
+    """Serve embed.js or the versioned widget bundle, precompressed and cacheable"""
+    asset = widget_bundle.get(name) if widget_bundle else None
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return asset.response(
+        request.headers.get("accept-encoding", ""),
+        request.headers.get("if-none-match")
+    )
 
 @app.get("/api/providers")
 async def list_providers():
     """List all supported providers"""
-    from llm_providers import LLMProviderFactory
+    llm_provider = provider_manager.current.provider
     return {
         "supported_providers": LLMProviderFactory.get_supported_providers(),
         "current_provider": llm_provider.get_provider_name() if llm_provider else None
     }
 
+@app.get("/api/metrics")
+async def metrics():
+    """Provider performance metrics, split by primary and shadow traffic"""
+    shadow_mirror = provider_manager.current.shadow
+    return {
+        "overall": monitor.get_stats(source="primary"),
+        "comparison": monitor.get_comparison(),
+        "shadow": shadow_mirror.get_stats() if shadow_mirror else None,
+        "cache": response_cache.get_stats() if response_cache else None,
+        "near_duplicates": near_duplicates.get_stats() if near_duplicates is not None else None,
+        "idempotency": idempotency_store.get_stats(),
+        "ledger": usage_ledger.get_stats() if usage_ledger else None,
+        "scheduler": scheduler.get_stats() if scheduler else None,
+        "tenants": tenant_metrics(),
+        "sessions": session_store.get_stats(),
+        "event_loop": loop_monitor.get_stats() if loop_monitor else None,
+        "max_tokens": length_predictor.get_stats() if length_predictor else None,
+        "local_model": local_model_metrics(),
+        "api_keys": api_key_metrics(),
+        "cascade": cascade_metrics(),
+        "prefilter": prefilter.get_stats() if prefilter else None
+    }
+
+def local_model_metrics() -> Optional[dict]:
+    """Slot occupancy and throughput of the local CPU model, if one is in use"""
+    active = provider_manager.current
+    providers = [active.provider, *active.tenant_providers.values()]
+    if active.shadow:
+        providers.append(active.shadow.provider)
+    for provider in providers:
+        for component in provider.components() if provider else ():
+            if isinstance(component, LocalProvider):
+                return component.get_stats()
+    return None
+
+def api_key_metrics() -> List[dict]:
+    """Per-key requests, rate-limit state and utilization of every provider's API key pool"""
+    active = provider_manager.current
+    providers = [active.provider, *active.tenant_providers.values()]
+    if active.shadow:
+        providers.append(active.shadow.provider)
+    pools = {}
+    for provider in providers:
+        for component in provider.components() if provider else ():
+            keys = getattr(component, "keys", None)
+            if isinstance(keys, KeyPool) and id(keys) not in pools:
+                pools[id(keys)] = {
+                    "provider": component.get_provider_name(),
+                    "model": component.model,
+                    "keys": keys.get_stats()
+                }
+    return list(pools.values())
+
+def cascade_metrics() -> List[dict]:
+    """Routing counters of every cascade in use"""
+    active = provider_manager.current
+    providers = [active.provider, *active.tenant_providers.values()]
+    if active.shadow:
+        providers.append(active.shadow.provider)
+    cascades = {}
+    for provider in providers:
+        for component in [provider, *provider.components()] if provider else ():
+            if isinstance(component, CascadeProvider) and id(component) not in cascades:
+                cascades[id(component)] = {
+                    "provider": component.get_provider_name(),
+                    "model": component.model,
+                    **component.get_stats()
+                }
+    return list(cascades.values())
+
+def tenant_metrics() -> dict:
+    """Latency and rate-limit counters per tenant"""
+    latency = monitor.get_tenant_stats()
+    limits = tenant_gates.get_stats()
+    return {
+        tenant_id: {"latency": latency.get(tenant_id), "limits": limits.get(tenant_id)}
+        for tenant_id in sorted(set(latency) | set(limits))
+    }
+
+@app.post("/admin/reload", dependencies=[Depends(require_admin)])
+async def admin_reload():
+    """Hot-reload provider configuration without dropping requests"""
+    try:
+        generation = await run_in_threadpool(reload_providers)
+    except Exception as e:
+        logger.error(f"Provider reload failed, keeping current providers: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Reload failed: {str(e)}")
+    
+    llm_provider = generation.provider
+    return {
+        "reloaded": True,
+        "generation": generation.version,
+        "provider": llm_provider.get_provider_name() if llm_provider else None,
+        "model": llm_provider.model if llm_provider else None
+    }
+
+@app.post("/admin/knowledge", dependencies=[Depends(require_admin)])
+async def admin_add_knowledge(request: KnowledgeIngestRequest):
+    """Add documents or FAQ entries to a tenant's knowledge index (the default tenant's unless given)"""
+    tenants = provider_manager.current.tenants
+    tenant = tenants.tenants.get(request.tenant)
+    if tenant is None and request.tenant != DEFAULT_TENANT:
+        raise HTTPException(status_code=404, detail=f"Unknown tenant: {request.tenant}")
+    
+    knowledge_index = knowledge_index_for(tenant or tenants.default)
+    if knowledge_index is None:
+        with knowledge_lock:
+            knowledge_index = knowledge_indexes.setdefault(request.tenant, new_knowledge_index())
+    
+    offset = len(knowledge_index)
+    documents = [
+        Document(
+            id=doc.id or f"admin#{offset + i}",
+            text=doc.text,
+            title=doc.title,
+            answer=doc.answer,
+            source="admin"
+        )
+        for i, doc in enumerate(request.documents)
+    ]
+    added = await run_in_threadpool(knowledge_index.add_documents, documents)
+    return {"tenant": request.tenant, "added": added, "total_documents": len(knowledge_index)}
+
+@app.get("/admin/profile/cpu", dependencies=[Depends(require_admin)])
+async def admin_profile_cpu(
+    seconds: float = 10.0,
+    interval_ms: float = 5.0,
+    include_idle: bool = False,
+    format: Literal["folded", "json"] = "folded"
+):
+    """
+    Sample every thread of this worker for a while.
+    
+    The default output is folded stacks, ready for flamegraph.pl or
+    speedscope; format=json returns the hottest stacks with counts.
+    """
+    try:
+        profile = await run_in_threadpool(cpu_profiler.profile, seconds, interval_ms / 1000, include_idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if format == "folded":
+        return PlainTextResponse(folded(profile["stacks"]))
+    return {
+        **{k: v for k, v in profile.items() if k != "stacks"},
+        "stacks": [{"stack": stack, "samples": count} for stack, count in profile["stacks"].most_common(200)]
+    }
+
+@app.post("/admin/profile/memory/start", dependencies=[Depends(require_admin)])
+async def admin_memory_start(frames: int = 10):
+    """Start tracing allocations with tracemalloc (slows the worker until stopped)"""
+    return memory_profiler.start(frames)
+
+@app.post("/admin/profile/memory/stop", dependencies=[Depends(require_admin)])
+async def admin_memory_stop():
+    """Stop tracing allocations"""
+    return memory_profiler.stop()
+
+@app.get("/admin/profile/memory", dependencies=[Depends(require_admin)])
+async def admin_memory_snapshot(
+    limit: int = 25,
+    group_by: Literal["lineno", "filename", "traceback"] = "lineno",
+    diff: bool = True
+):
+    """Top allocation sites, and growth since the previous snapshot"""
+    if not memory_profiler.tracing:
+        raise HTTPException(status_code=409, detail="Memory tracing is off; POST /admin/profile/memory/start first")
+    return await run_in_threadpool(memory_profiler.snapshot, limit, group_by, diff)
+
+@app.get("/admin/debug/event-loop", dependencies=[Depends(require_admin)])
+async def admin_debug_event_loop():
+    """Event-loop lag and thread-pool stats, with the stacks of recent stalls"""
+    if not loop_monitor:
+        raise HTTPException(status_code=404, detail="Event loop monitor is disabled (LOOP_MONITOR_INTERVAL=0)")
+    return loop_monitor.get_stats(include_stacks=True)
+
+@app.get("/admin/debug/sizes", dependencies=[Depends(require_admin)])
+async def admin_debug_sizes(deep: bool = False, name: Optional[List[str]] = Query(None)):
+    """Entry counts of in-process caches and queues; deep=true also estimates their memory"""
+    counts = {
+        "monitor_history": len(monitor.requests),
+        "response_cache": response_cache.get_stats() if response_cache else None,
+        "idempotency_keys": len(idempotency_store),
+        "sessions": session_store.get_stats(),
+        "socket_turns": len(socket_turns),
+        "scheduler": scheduler.get_stats() if scheduler else None,
+        "ledger": usage_ledger.get_stats() if usage_ledger else None,
+        "knowledge_documents": {tenant_id: len(index) for tenant_id, index in knowledge_indexes.items()},
+        "tenant_gates": len(tenant_gates.get_stats())
+    }
+    result = {"process": await run_in_threadpool(process_memory), "counts": counts}
+    
+    if deep:
+        structures = {
+            "monitor_history": monitor.requests,
+            "response_cache_l1": response_cache.l1 if response_cache else None,
+            "idempotency": idempotency_store,
+            "sessions": session_store,
+            "scheduler": scheduler,
+            "knowledge_indexes": knowledge_indexes,
+            "tenant_gates": tenant_gates,
+            "widget_bundle": widget_bundle
+        }
+        result["deep"] = await run_in_threadpool(measure, structures, name)
+    return result
+
+async def _reload_on_signal():
+    """Handle SIGHUP by reloading providers in a worker thread"""
+    logger.info("SIGHUP received, reloading provider configuration")
+    try:
+        await run_in_threadpool(reload_providers)
+    except Exception as e:
+        logger.error(f"Provider reload failed, keeping current providers: {str(e)}")
+
+@app.on_event("startup")
+async def startup():
+    """Start provider warm-up and heartbeat, and install the SIGHUP reload handler"""
+    # Warm up in the background so the server can answer readiness probes meanwhile
+    asyncio.ensure_future(run_in_threadpool(warm_up_providers))
+    if heartbeat:
+        heartbeat.start()
+    if usage_ledger:
+        usage_ledger.start()
+    if loop_monitor:
+        loop_monitor.start()
+    
+    if hasattr(signal, "SIGHUP"):
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(
+                signal.SIGHUP,
+                lambda: asyncio.ensure_future(_reload_on_signal())
+            )
+        except (NotImplementedError, RuntimeError):
+            logger.info("SIGHUP reload not available in this event loop")
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop background work, close providers and flush the usage ledger"""
+    if heartbeat:
+        heartbeat.stop()
+    if loop_monitor:
+        loop_monitor.stop()
+    if health_prober:
+        health_prober.stop()
+    provider_manager.close()
+    if usage_ledger:
+        usage_ledger.close()
+
+def build_messages(
+    message: str,
+    history: Optional[List[ChatMessage]],
+    settings: Settings,
+    system_prompt: str = SYSTEM_PROMPT,
+    tenant: Optional[TenantConfig] = None
+) -> Tuple[Optional[str], Optional[ValidatedMessages]]:
+    """
+    Build the provider prompt for a chat message.
+    
+    High-confidence FAQ matches in the tenant's own knowledge index are
+    answered directly; otherwise matching passages are added to the prompt
+    for grounding. Tenants without an index get neither. The
+    widget appends the current message to its history before posting, so a
+    trailing history entry equal to the message is dropped.
+    
+    Args:
+        message: Current user message
+        history: Prior conversation messages from the client (already validated)
+        settings: Settings of the active provider generation
+        system_prompt: The tenant's system prompt
+        tenant: The tenant (None for the default tenant)
+    
+    Returns:
+        (answer, None) for a knowledge answer, otherwise (None, messages)
+    """
+    messages = [
+        {
+            "role": "system",
+            "content": system_prompt
+        }
+    ]
+    
+    knowledge_index = knowledge_index_for(tenant)
+    if knowledge_index is not None:
+        hits = knowledge_index.search(message, settings.knowledge_top_k)
+        top = hits[0] if hits else None
+        
+        if top and top.document.answer and top.confidence >= settings.knowledge_answer_threshold:
+            logger.info(f"Answered from knowledge index: {top.document.id} ({top.confidence:.2f})")
+            return top.document.answer, None
+        
+        passages = [
+            f"Q: {hit.document.text}\nA: {hit.document.answer}" if hit.document.answer else hit.document.text
+            for hit in hits if hit.confidence >= settings.knowledge_min_confidence
+        ]
+        if passages:
+            messages.append({
+                "role": "system",
+                "content": "Use the following information from this website when it is relevant:\n\n"
+                + "\n\n".join(f"[{i + 1}] {p}" for i, p in enumerate(passages))
+            })
+    
+    history = list(history or [])
+    if history and history[-1] == {"role": "user", "content": message}:
+        history.pop()
+    messages.extend(history)
+    
+    messages.append({
+        "role": "user",
+        "content": message
+    })
+    return None, ValidatedMessages(messages)
+
+def response_cache_key(
+    llm_provider,
+    messages: list,
+    settings: Settings,
+    tenant: Optional[TenantConfig] = None
+) -> str:
+    """Cache key for a prompt in the tenant's namespace; user text is normalized so trivial variants share an entry"""
+    return make_cache_key(
+        tenant.namespace if tenant else DEFAULT_TENANT,
+        llm_provider.get_provider_name(),
+        llm_provider.model,
+        [
+            {**m, "content": normalize_text(str(m.get("content", "")))} if m.get("role") == "user" else m
+            for m in messages
+        ],
+        max_tokens=tenant.max_tokens if tenant and tenant.max_tokens is not None else settings.max_tokens,
+        temperature=tenant.temperature if tenant and tenant.temperature is not None else settings.temperature
+    )
+
+def near_duplicate_context(
+    llm_provider,
+    messages: list,
+    settings: Settings,
+    tenant: Optional[TenantConfig] = None
+) -> Optional[str]:
+    """
+    Key of everything but the question that shapes an opening answer, or None mid-conversation.
+    
+    Retrieved passages are left out: they follow from the question, so
+    paraphrases may retrieve slightly different ones and still match.
+    """
+    if any(m.get("role") != "system" for m in messages[:-1]):
+        return None
+    return response_cache_key(llm_provider, messages[:1], settings, tenant)
+
+def generate_reply(
+    llm_provider,
+    messages: list,
+    tenant: Optional[TenantConfig] = None,
+    max_tokens: Optional[int] = None,
+    **kwargs
+) -> GenerationResult:
+    """Call the provider (runs in a worker thread); max_tokens overrides the tenant's. The provider records its metrics."""
+    return llm_provider.generate(
+        messages,
+        max_tokens=max_tokens or (tenant.max_tokens if tenant else None),
+        temperature=tenant.temperature if tenant else None,
+        tenant=tenant.id if tenant else DEFAULT_TENANT,
+        **kwargs
+    )
+
+def stream_reply(
+    llm_provider,
+    messages: list,
+    tenant: Optional[TenantConfig] = None,
+    max_tokens: Optional[int] = None,
+    on_delta=None
+) -> GenerationResult:
+    """Stream a reply from the provider, passing each delta to on_delta (runs in a worker thread)"""
+    return llm_provider.generate(
+        messages,
+        max_tokens=max_tokens or (tenant.max_tokens if tenant else None),
+        temperature=tenant.temperature if tenant else None,
+        on_delta=on_delta or (lambda piece: None),
+        tenant=tenant.id if tenant else DEFAULT_TENANT
+    )
+
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(
+    request: ChatRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None),
+    x_widget_id: Optional[str] = Header(None),
+    x_api_key: Optional[str] = Header(None)
+):
     """
     Handle chat requests from the widget
     
+    The tenant is identified by the X-API-Key or X-Widget-Id header (the
+    default tenant if neither is sent) and is subject to its rate limit.
+    Requests carrying an Idempotency-Key header are generated once: a retry
+    with the same key waits for the in-flight result or replays the stored
+    response (marked with an Idempotent-Replayed header), without being
+    rate checked again.
+    
     Args:
         request: ChatRequest containing user message and conversation history
-        
+        response: Outgoing response (for headers)
+        idempotency_key: Optional client-generated key identifying this request
+        x_widget_id: Public widget id of the embedding site
+        x_api_key: API key of an API client
+    
     Returns:
         ChatResponse with AI-generated reply
     """
+    tenant = provider_manager.current.tenants.resolve(x_widget_id, x_api_key)
+    if tenant is None:
+        raise HTTPException(status_code=403, detail="Unknown widget id or API key")
+    
+    def check_rate():
+        try:
+            tenant_gates.gate_for(tenant).check_rate()
+        except TenantRateLimited as e:
+            raise HTTPException(
+                status_code=429,
+                detail=str(e),
+                headers={"Retry-After": retry_after_header(e.retry_after)}
+            )
+    
+    if not idempotency_key:
+        check_rate()
+        return await _leased_chat(request, tenant)
+    
+    if len(idempotency_key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be at most 255 characters")
+    
+    # A retry of a request already admitted replays (or joins) it without
+    # counting against the rate limit again; only new keys are rate checked
+    try:
+        result, replayed = await idempotency_store.run(
+            f"{tenant.id}:{idempotency_key}",
+            fingerprint(request.model_dump_json()),
+            lambda: _leased_chat(request, tenant),
+            should_store=lambda result: result.success,
+            admit=check_rate
+        )
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+async def _leased_chat(request: ChatRequest, tenant: TenantConfig, on_delta=None) -> ChatResponse:
+    """Serve a chat request on the provider generation active when it arrives, and record it in the ledger"""
+    event = LedgerEvent(priority=request.priority, tenant=tenant.id)
+    started = time.time()
+    with provider_manager.lease() as active:
+        response = await _chat(request, active, event, tenant, on_delta)
+    
+    if usage_ledger:
+        event.latency_ms = (time.time() - started) * 1000
+        event.success = response.success
+        event.error = response.error
+        if event.source == "llm" and event.model:
+            event.cost_usd = estimate_cost(event.model, event.prompt_tokens, event.completion_tokens)
+        if active.settings.ledger_transcripts:
+            event.message = request.message
+            event.reply = response.reply
+        usage_ledger.record(event)
+    
+    return response
+
+async def _chat(
+    request: ChatRequest,
+    active: ProviderGeneration,
+    event: LedgerEvent,
+    tenant: TenantConfig,
+    on_delta=None
+) -> ChatResponse:
+    """
+    Serve a chat request for a tenant on a pinned provider generation, filling in its ledger event.
+    
+    With on_delta, the provider reply is streamed and each text delta is
+    passed to on_delta from the worker thread as it arrives.
+    """
+    llm_provider = active.provider_for(tenant)
+    shadow_mirror = active.shadow
+    
     try:
         # Validate LLM provider
         if not llm_provider:
@@ -142,38 +1062,130 @@ async def chat(request: ChatRequest):
                 detail="Message cannot be empty"
             )
         
-        logger.info(f"Received chat request: {request.message[:50]}... (Provider: {llm_provider.get_provider_name()})")
+        # Reject or answer junk locally, before any provider work
+        if prefilter:
+            verdict = prefilter.check(request.message, [m["content"] for m in request.conversation_history])
+            if verdict.action == REJECT:
+                raise HTTPException(status_code=verdict.status, detail=verdict.reason)
+            if verdict.action == CANNED:
+                event.source = "filter"
+                return ChatResponse(reply=verdict.reply, success=True)
         
-        # Prepare conversation history
-        messages = [
-            {
-                "role": "system",
-                "content": "You are a helpful, friendly AI assistant embedded in a website chatbot. Provide concise, helpful responses."
-            }
-        ]
+        logger.info(
+            f"Received chat request: {request.message[:50]}... "
+            f"(Tenant: {tenant.id}, Provider: {llm_provider.get_provider_name()})"
+        )
+        event.provider = llm_provider.get_provider_name()
+        event.model = llm_provider.model
         
-        # Add conversation history if provided
-        if request.conversation_history:
-            messages.extend(request.conversation_history)
+        # Answer from the knowledge index, or build the prompt (grounded when possible)
+        answer, messages = await run_in_threadpool(
+            build_messages,
+            request.message,
+            request.conversation_history,
+            active.settings,
+            tenant.system_prompt or SYSTEM_PROMPT,
+            tenant
+        )
+        if answer is not None:
+            event.source = "knowledge"
+            return ChatResponse(reply=answer, success=True)
         
-        # Add current user message
-        messages.append({
-            "role": "user",
-            "content": request.message
-        })
+        # Serve repeated requests from the response cache
+        cache_key = None
+        near_context = None
+        if response_cache:
+            cache_key = response_cache_key(llm_provider, messages, active.settings, tenant)
+            cached = await run_in_threadpool(response_cache.get, cache_key)
+            if cached is not None:
+                logger.info(f"Served reply from cache: {cached[:50]}...")
+                event.source = "cache"
+                return ChatResponse(reply=cached, success=True)
+            
+            # An opening question may be a paraphrase of one answered before
+            if near_duplicates is not None:
+                near_context = near_duplicate_context(llm_provider, messages, active.settings, tenant)
+            if near_context:
+                match = await run_in_threadpool(near_duplicates.lookup, request.message, near_context)
+                cached = await run_in_threadpool(response_cache.get, match[0]) if match else None
+                if cached is not None:
+                    logger.info(f"Served reply for a near-duplicate question ({match[1]:.2f}): {cached[:50]}...")
+                    event.source = "cache"
+                    return ChatResponse(reply=cached, success=True)
+        
+        ceiling = tenant.max_tokens if tenant.max_tokens is not None else active.settings.max_tokens
+        budget = length_predictor.predict(
+            request.message,
+            len(request.conversation_history),
+            ceiling
+        ) if length_predictor else None
+        max_tokens = budget.max_tokens if budget else None
+        
+        # Mirror to the shadow provider with the same generation parameters
+        # (never affects this response)
+        if shadow_mirror:
+            shadow_mirror.maybe_mirror(
+                messages,
+                max_tokens=max_tokens or ceiling,
+                temperature=tenant.temperature if tenant.temperature is not None else active.settings.temperature,
+                tenant=tenant.id
+            )
+        
+        # Generate response using LLM provider, off the event loop. The tenant's
+        # own concurrency limit applies first, so a busy tenant queues behind
+        # itself instead of taking every shared slot.
+        generate = functools.partial(stream_reply, on_delta=on_delta) if on_delta else generate_reply
+        
+        async def run_generation(fn, limit: Optional[int]) -> GenerationResult:
+            async with tenant_gates.gate_for(tenant):
+                if scheduler:
+                    async with scheduler.async_slot(request.priority):
+                        return await run_in_threadpool(fn, llm_provider, messages, tenant, limit)
+                return await run_in_threadpool(fn, llm_provider, messages, tenant, limit)
+        
+        result = await run_generation(generate, max_tokens)
+        event.prompt_tokens = result.prompt_tokens
+        event.completion_tokens = result.completion_tokens
+        cut_short = length_predictor.observe(
+            budget,
+            result.completion_tokens,
+            # Only trust the finish reason when the provider reported one
+            truncated=result.truncated if result.finish_reason else None
+        ) if budget else False
         
-        # Generate response using LLM provider
-        reply = llm_provider.generate_response(messages)
+        # Never hand out a reply cut short by an adaptive budget: regenerate it
+        # once at the configured ceiling, on a cascade's strong tier. The retry
+        # is not streamed; the final reply replaces whatever deltas were
+        # already sent.
+        if cut_short:
+            logger.info(f"Regenerating a reply cut short at {budget.max_tokens} tokens with max_tokens={budget.ceiling}")
+            regenerate = generate_reply
+            if isinstance(llm_provider, CascadeProvider):
+                regenerate = functools.partial(generate_reply, strong_only=True)
+            result = await run_generation(regenerate, budget.ceiling)
+            event.prompt_tokens += result.prompt_tokens
+            event.completion_tokens += result.completion_tokens
+        reply = result.text
+        event.provider = result.provider
+        event.model = result.model
         
-        logger.info(f"Generated reply: {reply[:50]}... from {llm_provider.get_provider_name()}")
+        logger.info(f"Generated reply: {reply[:50]}... from {result.provider} ({result.model})")
+        
+        if cache_key and reply:
+            await run_in_threadpool(response_cache.set, cache_key, reply)
+            if near_context:
+                await run_in_threadpool(near_duplicates.add, request.message, near_context, cache_key)
         
         return ChatResponse(
             reply=reply,
             success=True
         )
-        
+    
     except HTTPException:
         raise
+    except SchedulerTimeout as e:
+        logger.warning(f"Chat request shed: {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         logger.error(f"Error processing chat request: {str(e)}")
         return ChatResponse(
@@ -182,12 +1194,214 @@ async def chat(request: ChatRequest):
             error=str(e)
         )
 
+@app.websocket("/ws/chat")
+async def chat_socket(
+    websocket: WebSocket,
+    widget_id: Optional[str] = None,
+    api_key: Optional[str] = None,
+    session_id: Optional[str] = None,
+    last_seq: int = 0
+):
+    """
+    Chat over a persistent WebSocket connection.
+    
+    The conversation history lives on the server, so each turn sends only
+    the new message, and replies are streamed as deltas. Every frame the
+    server sends for a session carries a sequence number; a client that
+    reconnects with its session_id and the last seq it received gets the
+    frames it missed, including the rest of a reply generated while it was
+    away.
+    
+    Client frames:
+        {"type": "message", "id": "...", "message": "...", "priority": "interactive", "history": [...]}
+        {"type": "ping"} / {"type": "pong"}
+    
+    "history" is optional and only used while the session has none, so a
+    client that kept the conversation (e.g. across a page reload after the
+    session expired) can continue it on a new session.
+    
+    Server frames:
+        {"type": "ready", "session_id": "...", "seq": n, "resumed": bool, "heartbeat": seconds}
+        {"type": "history", "messages": [...]}  (resume gap: rebuild from history)
+        {"type": "delta", "id": "...", "text": "...", "seq": n}
+        {"type": "done", "id": "...", "reply": "...", "success": bool, "error": ..., "seq": n}
+        {"type": "error", "id": "...", "status": code, "detail": "...", "seq": n}
+        {"type": "ping"} / {"type": "pong"}
+    
+    Args:
+        websocket: The connection
+        widget_id: Public widget id of the embedding site
+        api_key: API key of an API client
+        session_id: Session to resume
+        last_seq: Highest sequence number received on the resumed session
+    """
+    tenant = provider_manager.current.tenants.resolve(
+        widget_id or websocket.headers.get("x-widget-id"),
+        api_key or websocket.headers.get("x-api-key")
+    )
+    if tenant is None:
+        await websocket.close(code=1008, reason="Unknown widget id or API key")
+        return
+    
+    session = session_store.get(session_id, tenant.id) if session_id else None
+    resumed = session is not None
+    if session is None:
+        session = session_store.create(tenant.id)
+    
+    await websocket.accept()
+    outbox: "asyncio.Queue[dict]" = asyncio.Queue()
+    heartbeat_seconds = provider_manager.current.settings.ws_heartbeat_seconds
+    outbox.put_nowait({
+        "type": "ready",
+        "session_id": session.id,
+        "seq": session.seq,
+        "resumed": resumed,
+        "heartbeat": heartbeat_seconds
+    })
+    if resumed:
+        missed = session.replay(last_seq)
+        if missed is None:
+            outbox.put_nowait({"type": "history", "messages": list(session.history)})
+        else:
+            session_store.stats["replayed_frames"] += len(missed)
+            for frame in missed:
+                outbox.put_nowait(frame)
+    session.attach(outbox)
+    
+    last_seen = [time.monotonic()]
+    sender = asyncio.ensure_future(_socket_sender(websocket, outbox))
+    pinger = asyncio.ensure_future(_socket_heartbeat(websocket, outbox, last_seen, heartbeat_seconds))
+    
+    try:
+        while True:
+            text = await websocket.receive_text()
+            last_seen[0] = time.monotonic()
+            try:
+                frame = json.loads(text)
+                kind = frame.get("type")
+            except (ValueError, AttributeError):
+                outbox.put_nowait({"type": "error", "status": 400, "detail": "Frames must be JSON objects"})
+                continue
+            
+            if kind == "ping":
+                outbox.put_nowait({"type": "pong"})
+            elif kind == "message":
+                _start_socket_turn(session, tenant, frame)
+            elif kind != "pong":
+                outbox.put_nowait({"type": "error", "status": 400, "detail": f"Unknown frame type: {kind}"})
+    except WebSocketDisconnect:
+        pass
+    except RuntimeError as e:
+        # Closed by the heartbeat while waiting for a frame
+        logger.info(f"WebSocket session {session.id} closed: {str(e)}")
+    finally:
+        session.detach(outbox)
+        sender.cancel()
+        pinger.cancel()
+
+def _start_socket_turn(session: ChatSession, tenant: TenantConfig, frame: dict):
+    """Validate a message frame and generate its reply in a task that outlives the connection"""
+    message_id = str(frame.get("id") or "")
+    if message_id and message_id in session.seen_ids:
+        # Resent after a reconnect; the reply is already in the replay buffer
+        return
+    
+    history = list(session.history)
+    seeded = not history and isinstance(frame.get("history"), list) and bool(frame["history"])
+    if seeded:
+        history = frame["history"][-session.history.maxlen:] if session.history.maxlen else []
+    
+    try:
+        request = ChatRequest(
+            message=frame.get("message"),
+            conversation_history=history,
+            priority=frame.get("priority") or INTERACTIVE
+        )
+    except ValidationError as e:
+        session.emit({"type": "error", "id": message_id, "status": 422, "detail": str(e)})
+        return
+    
+    if session.busy:
+        session.emit({"type": "error", "id": message_id, "status": 409, "detail": "A reply is still in progress"})
+        return
+    
+    try:
+        tenant_gates.gate_for(tenant).check_rate()
+    except TenantRateLimited as e:
+        session.emit({
+            "type": "error",
+            "id": message_id,
+            "status": 429,
+            "detail": str(e),
+            "retry_after": int(retry_after_header(e.retry_after))
+        })
+        return
+    
+    if seeded:
+        session.history.extend(request.conversation_history)
+    if message_id:
+        session.seen_ids.append(message_id)
+    session.busy = True
+    task = asyncio.ensure_future(_socket_turn(session, tenant, request, message_id))
+    socket_turns.add(task)
+    task.add_done_callback(socket_turns.discard)
+
+async def _socket_turn(session: ChatSession, tenant: TenantConfig, request: ChatRequest, message_id: str):
+    """Generate one reply for a WebSocket session, streaming deltas into its frame buffer"""
+    loop = asyncio.get_running_loop()
+    
+    def on_delta(text: str):
+        loop.call_soon_threadsafe(session.emit, {"type": "delta", "id": message_id, "text": text})
+    
+    try:
+        response = await _leased_chat(request, tenant, on_delta)
+        if response.success:
+            session.add_turn(request.message, response.reply)
+        session.emit({
+            "type": "done",
+            "id": message_id,
+            "reply": response.reply,
+            "success": response.success,
+            "error": response.error
+        })
+    except HTTPException as e:
+        frame = {"type": "error", "id": message_id, "status": e.status_code, "detail": e.detail}
+        if e.headers and "Retry-After" in e.headers:
+            frame["retry_after"] = int(e.headers["Retry-After"])
+        session.emit(frame)
+    finally:
+        session.busy = False
+
+async def _socket_sender(websocket: WebSocket, outbox: "asyncio.Queue[dict]"):
+    """Write queued frames to the connection"""
+    try:
+        while True:
+            await websocket.send_text(json.dumps(await outbox.get()))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.info(f"WebSocket send failed: {str(e)}")
+
+async def _socket_heartbeat(websocket: WebSocket, outbox: "asyncio.Queue[dict]", last_seen: list, interval: float):
+    """Ping the client every interval and close the connection if it stops answering"""
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            if time.monotonic() - last_seen[0] > 2 * interval:
+                logger.info("Closing WebSocket after missed heartbeats")
+                await websocket.close(code=4000, reason="Heartbeat timeout")
+                return
+            outbox.put_nowait({"type": "ping"})
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.info(f"WebSocket heartbeat stopped: {str(e)}")
+
 if __name__ == "__main__":
     import uvicorn
-    port = int(os.getenv("PORT", "8000"))
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
-        port=port,
+        port=settings.port,
         reload=True
     )
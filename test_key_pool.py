@@ -0,0 +1,122 @@
+"""
+Tests for API key pool failover
+Pins the 429 handling of KeyPool against the real OpenAI and Groq SDK
+clients, using httpx.MockTransport in place of the network.
+"""
+
+import httpx
+import pytest
+from groq import Groq
+from openai import OpenAI
+
+from llm_providers.key_pool import KeyPool
+
+SDKS = [OpenAI, Groq]
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "test-model",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "hello"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+}
+
+
+def make_pool(sdk, keys, handlers, max_retries=2):
+    """
+    Build a KeyPool whose clients answer from handlers instead of the network.
+    
+    Args:
+        sdk: SDK client class (OpenAI or Groq)
+        keys: API keys, in pool order
+        handlers: Per key, a function mapping an httpx.Request to an httpx.Response
+        max_retries: SDK retries per call
+    
+    Returns:
+        (pool, hits) where hits counts the HTTP requests each key received
+    """
+    hits = {key: 0 for key in keys}
+    
+    def make_client(key, http_client):
+        def handle(request):
+            hits[key] += 1
+            return handlers[key](request)
+        # Keep the pool's client (and its response hook); only swap the network
+        http_client._transport = httpx.MockTransport(handle)
+        return sdk(api_key=key, http_client=http_client, max_retries=max_retries)
+    
+    return KeyPool(keys, make_client, cooldown=10.0), hits
+
+
+def create(client):
+    return client.chat.completions.create(model="test-model", messages=[{"role": "user", "content": "hi"}])
+
+
+def rate_limited(retry_after="30"):
+    return lambda request: httpx.Response(
+        429,
+        headers={"retry-after": retry_after},
+        json={"error": {"message": "Rate limit reached", "type": "requests"}}
+    )
+
+
+def ok(request):
+    return httpx.Response(200, json=COMPLETION)
+
+
+@pytest.mark.parametrize("sdk", SDKS)
+def test_429_fails_over_to_the_next_key_without_sdk_retry(sdk):
+    key_a, key_b = "sk-aaaaaaaaaaaaaaaa1111", "sk-bbbbbbbbbbbbbbbb2222"
+    pool, hits = make_pool(sdk, [key_a, key_b], {key_a: rate_limited(), key_b: ok})
+    # Ties go to the least recently used key; make key A the first choice
+    pool.keys[1].last_used = 1.0
+    
+    reply = pool.call(create)
+    
+    assert reply.choices[0].message.content == "hello"
+    assert hits == {key_a: 1, key_b: 1}
+    stats = {s["key"]: s for s in pool.get_stats()}
+    a, b = stats["#1 ...1111"], stats["#2 ...2222"]
+    assert a["rate_limited"] == 1 and 25 < a["cooldown_seconds"] <= 30
+    assert b["rate_limited"] == 0 and b["cooldown_seconds"] == 0
+    assert a["in_flight"] == b["in_flight"] == 0
+
+
+@pytest.mark.parametrize("sdk", SDKS)
+def test_cooling_key_is_skipped(sdk):
+    key_a, key_b = "sk-aaaaaaaaaaaaaaaa1111", "sk-bbbbbbbbbbbbbbbb2222"
+    pool, hits = make_pool(sdk, [key_a, key_b], {key_a: rate_limited(), key_b: ok})
+    pool.keys[1].last_used = 1.0
+    pool.call(create)
+    
+    pool.call(create)
+    
+    assert hits == {key_a: 1, key_b: 2}
+
+
+@pytest.mark.parametrize("sdk", SDKS)
+def test_single_key_keeps_sdk_retries(sdk):
+    key = "sk-aaaaaaaaaaaaaaaa1111"
+    responses = iter([rate_limited("0.01"), rate_limited("0.01"), ok])
+    pool, hits = make_pool(sdk, [key], {key: lambda request: next(responses)(request)})
+    
+    reply = pool.call(create)
+    
+    assert reply.choices[0].message.content == "hello"
+    assert hits == {key: 3}
+    assert pool.get_stats()[0]["rate_limited"] == 2
+
+
+@pytest.mark.parametrize("sdk", SDKS)
+def test_429_is_raised_once_every_key_is_rate_limited(sdk):
+    key_a, key_b = "sk-aaaaaaaaaaaaaaaa1111", "sk-bbbbbbbbbbbbbbbb2222"
+    pool, hits = make_pool(sdk, [key_a, key_b], {key_a: rate_limited(), key_b: rate_limited("0.01")})
+    
+    with pytest.raises(Exception) as error:
+        pool.call(create)
+    
+    assert getattr(error.value, "status_code", None) == 429
+    # Key B is the last usable key, so its 429 goes through the SDK's own retries
+    assert sorted(hits.values()) == [1, 3]
+    assert all(s["in_flight"] == 0 for s in pool.get_stats())
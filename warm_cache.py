@@ -0,0 +1,211 @@
+"""
+Response cache pre-warming from historical transcripts
+Streams a JSONL transcript file, finds the most frequent opening questions
+and generates replies for them through the configured provider, so the
+first hour after a deploy is served from the cache.
+
+Each line may be a logged chat request ({"message", "conversation_history"}),
+a message list ({"messages": [...]}) or a bare {"question": ...}; use
+--field to read the question from another key.
+
+Usage:
+    python warm_cache.py transcripts.jsonl --top 200 --budget 100000 --concurrency 4
+"""
+
+import argparse
+import json
+import sys
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Optional, Tuple
+
+from llm_providers.cache import normalize_text
+from llm_providers.monitoring import estimate_tokens
+
+
+def opening_question(record: Dict, field: Optional[str] = None) -> Optional[str]:
+    """
+    Extract the opening user question from a transcript record.
+    
+    Args:
+        record: Parsed JSONL record
+        field: Explicit key holding the question
+    
+    Returns:
+        Question text, or None if the record is not a conversation opener
+    """
+    if field:
+        value = record.get(field)
+        return value if isinstance(value, str) else None
+    
+    message = record.get("message")
+    if isinstance(message, str):
+        history = [m for m in record.get("conversation_history") or [] if isinstance(m, dict)]
+        # The widget appends the current message to its history before posting
+        if history and history[-1] == {"role": "user", "content": message}:
+            history.pop()
+        return None if any(m.get("role") == "user" for m in history) else message
+    
+    messages = record.get("messages")
+    if isinstance(messages, list):
+        for m in messages:
+            if isinstance(m, dict) and m.get("role") == "user" and isinstance(m.get("content"), str):
+                return m["content"]
+        return None
+    
+    for key in ("question", "query", "prompt"):
+        if isinstance(record.get(key), str):
+            return record[key]
+    return None
+
+
+def count_questions(
+    lines: Iterable[str],
+    field: Optional[str] = None,
+    max_tracked: int = 100000
+) -> Tuple[Counter, Dict[str, str], int]:
+    """
+    Count normalized opening questions in a stream of JSONL lines.
+    
+    Memory stays bounded: once more than max_tracked distinct questions are
+    held, questions seen only once are dropped.
+    
+    Args:
+        lines: JSONL lines
+        field: Explicit key holding the question
+        max_tracked: Maximum distinct questions kept in memory
+    
+    Returns:
+        (counts by normalized question, first raw wording of each, total openers)
+    """
+    counts: Counter = Counter()
+    wording: Dict[str, str] = {}
+    total = 0
+    
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(record, dict):
+            continue
+        
+        question = opening_question(record, field)
+        if not question or not question.strip():
+            continue
+        
+        key = normalize_text(question)
+        counts[key] += 1
+        wording.setdefault(key, question.strip())
+        total += 1
+        
+        if len(counts) > max_tracked:
+            for rare in [k for k, c in counts.items() if c == 1]:
+                del counts[rare]
+                del wording[rare]
+    
+    return counts, wording, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-warm the response cache from transcripts")
+    parser.add_argument("path", help="JSONL transcript file")
+    parser.add_argument("--field", help="Key holding the question (default: auto-detect)")
+    parser.add_argument("--top", type=int, default=200, help="Number of most frequent questions to warm")
+    parser.add_argument("--min-count", type=int, default=2, help="Skip questions asked fewer times")
+    parser.add_argument("--budget", type=int, default=100000, help="Approximate token budget for warm-up calls")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent provider calls")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be warmed without calling the provider")
+    args = parser.parse_args()
+    
+    # Import the app for its configured provider, cache and prompt building
+    import main as app
+    
+    llm_provider = app.provider_manager.current.provider
+    settings = app.provider_manager.current.settings
+    if app.response_cache is None:
+        sys.exit("Response cache is disabled; set CACHE_ENABLED=true (and CACHE_PATH to a shared file)")
+    if llm_provider is None:
+        sys.exit("LLM provider not configured. Please set LLM_PROVIDER and corresponding API key in .env file")
+    
+    with open(args.path, encoding="utf-8") as f:
+        counts, wording, total = count_questions(f, args.field)
+    
+    candidates = [(q, c) for q, c in counts.most_common(args.top) if c >= args.min_count]
+    print(f"Opening questions: {total} ({len(counts)} distinct); warming top {len(candidates)}")
+    
+    outcome = Counter()
+    covered = 0
+    used_tokens = 0
+    reserved_tokens = 0
+    pending = {}
+    
+    def settle(done):
+        nonlocal covered, used_tokens, reserved_tokens
+        for future in done:
+            key, count, prompt_tokens, reservation = pending.pop(future)
+            reserved_tokens -= reservation
+            try:
+                result = future.result()
+            except Exception as e:
+                outcome["failed"] += 1
+                used_tokens += prompt_tokens
+                print(f"  failed: {str(e)}")
+                continue
+            app.response_cache.set(key, result.text)
+            used_tokens += result.total_tokens
+            outcome["warmed"] += 1
+            covered += count
+    
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency), thread_name_prefix="warm") as executor:
+        for question, count in candidates:
+            answer, messages = app.build_messages(wording[question], [], settings)
+            if answer is not None:
+                outcome["knowledge"] += 1
+                covered += count
+                continue
+            
+            key = app.response_cache_key(llm_provider, messages, settings)
+            if app.response_cache.contains(key):
+                outcome["already_cached"] += 1
+                covered += count
+                continue
+            
+            prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+            reservation = prompt_tokens + settings.max_tokens
+            if used_tokens + reserved_tokens + reservation > args.budget:
+                outcome["over_budget"] += 1
+                continue
+            if args.dry_run:
+                outcome["would_warm"] += 1
+                continue
+            
+            while len(pending) >= max(1, args.concurrency):
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                settle(done)
+            
+            reserved_tokens += reservation
+            future = executor.submit(app.generate_reply, llm_provider, messages)
+            pending[future] = (key, count, prompt_tokens, reservation)
+        
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            settle(done)
+    
+    print(f"Warmed:           {outcome['warmed']}" + (f" (dry run: {outcome['would_warm']} would be)" if args.dry_run else ""))
+    print(f"Already cached:   {outcome['already_cached']}")
+    print(f"Knowledge answer: {outcome['knowledge']}")
+    print(f"Failed:           {outcome['failed']}")
+    print(f"Over budget:      {outcome['over_budget']}")
+    print(f"Tokens used:      ~{used_tokens} of {args.budget}")
+    if total:
+        print(f"Coverage:         {covered / total:.1%} of opening questions ({covered}/{total})")
+    
+    app.provider_manager.close()
+
+
+if __name__ == "__main__":
+    main()